@@ -0,0 +1,27 @@
+import json
+import sys
+from time import perf_counter
+
+_collected = None  # Results are also appended here while collect() is active, used by python -m benchmarks
+
+
+def timed(func, *args, **kwargs) -> float:
+    """Returns the wall time in seconds of a single func(*args, **kwargs) call."""
+    start = perf_counter()
+    func(*args, **kwargs)
+    return perf_counter() - start
+
+
+def report(name: str, seconds: float, **params):
+    """Writes a benchmark result to stdout as a single JSON line."""
+    result = dict(name=name, seconds=round(seconds, 6), **params)
+    if _collected is not None:
+        _collected.append(result)
+    sys.stdout.write(json.dumps(result) + '\n')
+    sys.stdout.flush()
+
+
+def collect(results: list):
+    """Also append every result reported from now on to results, None to stop"""
+    global _collected
+    _collected = results
@@ -0,0 +1,90 @@
+"""Runs the benchmark suite and writes every result, with details of the environment, to a JSON file.
+
+Every benchmark runs against in-process data or the local stand-in server in tests/server.py so no network is used.
+Compare the results of two runs e.g. two releases with benchmarks.compare.
+
+Usage:
+    python -m benchmarks [--quick] [--output results.json] [benchmark ...]
+
+Example:
+    python -m benchmarks --output 0.3.0.json
+    python -m benchmarks --quick --output quick.json bulk objects_all user
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime as dt
+
+from benchmarks import collect
+
+# benchmark -> kwargs passed to its main with --quick, for a fast smoke run
+SUITE = {
+    'bulk': dict(sizes=(100, 1000), concurrency=(10, 100)),
+    'runtime': dict(calls=50),
+    'instrumentation': dict(requests=1000),
+    'coalesce': dict(requests=500, unique=(10, 100)),
+    'objects_all': dict(sizes=(1000, 10000)),
+    'cache': dict(records=20000),
+    'models': dict(records=20000, per_record_session_records=1000),
+    'query': dict(records=100000),
+    'user': dict(commands=200, services=10, permissions=500),
+    'echo': dict(records=20000),
+    'table': dict(sizes=(1000, 10000), mdv_max_rows=1000),
+    'render': dict(renders=50),
+    'import': dict(repeat=2),
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(quick: bool) -> dict:
+    from double_click.versions import installed_version
+
+    return dict(created=str(dt.utcnow()), quick=quick, commit=git_commit(),
+                double_click=installed_version('double_click'), python=platform.python_version(),
+                platform=platform.platform(), cpu_count=os.cpu_count())
+
+
+def run(benchmarks: list, quick: bool = False) -> dict:
+    """Runs each benchmark in SUITE, returning dict(environment, results)"""
+    results = []
+    for benchmark in benchmarks:
+        module = importlib.import_module(f'benchmarks.bench_{benchmark}')
+        collected = []
+        collect(collected)
+        try:
+            module.main(**(SUITE[benchmark] if quick else {}))
+        finally:
+            collect(None)
+        results.extend(dict(benchmark=benchmark, **result) for result in collected)
+    return dict(environment=environment(quick), results=results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Runs the double_click benchmarks')
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark', help=f'Default: all of {", ".join(SUITE)}')
+    parser.add_argument('--quick', action='store_true', help='Run with smaller inputs')
+    parser.add_argument('--output', default='benchmark_results.json', help='Default: benchmark_results.json')
+    args = parser.parse_args(argv)
+    unknown = [benchmark for benchmark in args.benchmarks if benchmark not in SUITE]
+    if unknown:
+        parser.error(f'Unknown benchmark {", ".join(unknown)}, choose from {", ".join(SUITE)}')
+
+    suite = run(args.benchmarks or list(SUITE), args.quick)
+    with open(args.output, 'w') as f:
+        f.write(json.dumps(suite, indent=2))
+    sys.stderr.write(f'{len(suite["results"])} results written to {args.output}\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""Compares the thread executor and aiohttp transports for GeneralSession.bulk_get
+
+Usage:
+    python -m benchmarks.bench_bulk
+"""
+from benchmarks import report, timed
+from double_click.request import GeneralSession
+from tests.server import StandInServer
+
+
+def main(sizes=(100, 1000, 10000), concurrency=(10, 50, 500)):
+    with StandInServer() as server:
+        for size in sizes:
+            request_list = [(f'{server.url}/bench', dict(params=dict(idx=idx))) for idx in range(size)]
+            for max_concurrency in concurrency:
+                for async_transport in (False, True):
+                    with GeneralSession(disable_progress_bar=True, max_concurrency=max_concurrency,
+                                        async_transport=async_transport) as session:
+                        seconds = timed(session.bulk_get, request_list)
+                    report('bulk_get', seconds, requests=size, max_concurrency=max_concurrency,
+                           transport='aiohttp' if async_transport else 'threads')
+
+
+if __name__ == '__main__':
+    main()
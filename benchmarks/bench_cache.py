@@ -0,0 +1,59 @@
+"""Compares loading a large Model cache written as indented json (double_click < 0.3.0) against FileCache
+and looking up single records by loading the full cache against reading them from the cache index
+
+Usage:
+    python -m benchmarks.bench_cache
+"""
+import json
+import os
+import tempfile
+
+from benchmarks import report, timed
+from double_click.cache import FileCache
+
+
+def make_content(records):
+    return [dict(id=idx, name=f'device_{idx}', room=f'room_{idx % 50}', commands=['on', 'off', 'dim'],
+                 online=bool(idx % 3), brightness=idx % 100 / 100, parent=None) for idx in range(records)]
+
+
+def legacy_load(path):
+    with open(path) as f:
+        return json.loads(f.read())
+
+
+def full_load_lookups(cache, key, identifiers):
+    for identifier in identifiers:
+        {item['name']: item for item in cache.get(key, 1)}.get(identifier)
+
+
+def index_lookups(cache, key, identifiers):
+    for identifier in identifiers:
+        with cache.index(key, 1) as index:
+            index.get(identifier)
+
+
+def main(records=400000, lookups=5):
+    content = make_content(records)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        path = os.path.join(cache_dir, 'legacy')
+        with open(path, 'w') as f:
+            f.write(json.dumps(content, indent=2))
+        report('cache_load_legacy_json', timed(legacy_load, path), records=records, bytes=os.path.getsize(path))
+
+        for compress_level in (0, 1):
+            cache, key = FileCache(compress_level=compress_level), os.path.join(cache_dir, f'cache_{compress_level}')
+            write_seconds = timed(cache.set, key, content)
+            report('cache_set_file_cache', write_seconds, records=records, compress_level=compress_level,
+                   bytes=os.path.getsize(key))
+            report('cache_load_file_cache', timed(cache.get, key, 1), records=records, compress_level=compress_level)
+
+        cache, key = FileCache(), os.path.join(cache_dir, 'indexed')
+        report('cache_set_file_cache_indexed', timed(cache.set, key, content, 'name'), records=records)
+        identifiers = [f'device_{idx}' for idx in range(0, records, records // lookups)]
+        for name, func in (('full_load', full_load_lookups), ('index', index_lookups)):
+            report(f'cache_lookup_{name}', timed(func, cache, key, identifiers), records=records, lookups=lookups)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""Compares bulk_get of a request_list with many duplicate requests with and without coalesce_requests
+
+Usage:
+    python -m benchmarks.bench_coalesce
+"""
+from benchmarks import report, timed
+from double_click.request import GeneralSession
+from tests.server import StandInServer
+
+
+def main(requests=2000, unique=(10, 100, 1000), delay=0.01):
+    with StandInServer() as server:
+        for unique_requests in unique:
+            request_list = [f'{server.url}/bench/{idx % unique_requests}?delay={delay}' for idx in range(requests)]
+            for async_transport in (False, True):
+                transport = 'aiohttp' if async_transport else 'threads'
+                for coalesce in (False, True):
+                    with GeneralSession(disable_progress_bar=True, async_transport=async_transport,
+                                        max_concurrency=100, coalesce_requests=coalesce) as session:
+                        hits = len(server.hits)
+                        seconds = timed(session.bulk_get, request_list)
+                    report('bulk_get_coalesced' if coalesce else 'bulk_get', seconds, requests=requests,
+                           unique=unique_requests, transport=transport, sent=len(server.hits) - hits)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Compares the time and peak memory of echo for a large list written to stdout in one str (echo(output))
+against encoding it incrementally (echo(output, stream=True)) and as NDJSON (echo(output, ndjson=True))
+
+stdout is redirected to os.devnull while echo runs.
+
+Usage:
+    python -m benchmarks.bench_echo
+"""
+import os
+import tracemalloc
+from contextlib import redirect_stdout
+
+from benchmarks import report, timed
+from benchmarks.bench_cache import make_content
+from double_click.utils import echo
+
+
+def peak_bytes(func, *args, **kwargs) -> int:
+    """Peak bytes allocated while func(*args, **kwargs) runs"""
+    tracemalloc.start()
+    func(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main(records=200000):
+    content = make_content(records)
+    results = []
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for name, kwargs in (('echo', {}), ('echo_stream', dict(stream=True)), ('echo_ndjson', dict(ndjson=True))):
+            results.append((name, timed(echo, content, **kwargs), peak_bytes(echo, content, **kwargs)))
+
+    for name, seconds, peak in results:
+        report(name, seconds, records=records, peak_bytes=peak)
+
+
+if __name__ == '__main__':
+    main()
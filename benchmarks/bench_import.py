@@ -0,0 +1,48 @@
+"""Measures the import time of double_click with python -X importtime
+
+Each statement is run in a new interpreter. The reported time is the cumulative import time of every module
+the statement imported that isn't already imported when the interpreter starts.
+
+Usage:
+    python -m benchmarks.bench_import
+"""
+import subprocess
+import sys
+
+from benchmarks import report
+
+STATEMENTS = (
+    'import double_click',
+    'from double_click import echo, User',
+    'from double_click import GeneralSession',
+    'from double_click import Model',
+)
+
+
+def top_level_imports(statement: str) -> dict:
+    """Returns dict(module=cumulative microseconds) of each module imported directly by statement or at startup"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            check=True, stderr=subprocess.PIPE, universal_newlines=True).stderr
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        if not module.startswith('  '):  # Nested imports are included in the cumulative time of their parent
+            imports[module.strip()] = int(cumulative)
+    return imports
+
+
+def import_seconds(statement: str) -> float:
+    startup = top_level_imports('pass')
+    imports = top_level_imports(statement)
+    return sum(microseconds for module, microseconds in imports.items() if module not in startup) / 1000000
+
+
+def main(repeat=5):
+    for statement in STATEMENTS:
+        report('import', min(import_seconds(statement) for _ in range(repeat)), statement=statement)
+
+
+if __name__ == '__main__':
+    main()
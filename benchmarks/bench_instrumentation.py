@@ -0,0 +1,28 @@
+"""Measures the overhead of GeneralSession.instrumentation on bulk requests to the local stand-in server
+
+Usage:
+    python -m benchmarks.bench_instrumentation
+"""
+from benchmarks import report, timed
+from double_click.instrumentation import Instrumentation
+from double_click.request import GeneralSession
+from tests.server import StandInServer
+
+
+def main(requests=5000, max_concurrency=20):
+    with StandInServer() as server:
+        request_list = [f'{server.url}/item'] * requests
+        for instrumented in (False, True):
+            instrumentation = Instrumentation() if instrumented else None
+            with GeneralSession(disable_progress_bar=True, max_concurrency=max_concurrency,
+                                instrumentation=instrumentation) as session:
+                session.bulk_get(request_list[:100])  # Warm up the connection pool
+                report('bulk_get_instrumentation', timed(session.bulk_get, request_list), requests=requests,
+                       instrumented=instrumented)
+                if instrumentation:
+                    total = instrumentation.summary()['requests'][0]['phases']['total']
+                    report('bulk_get_instrumented_latency', total['p50'], p95=total['p95'], p99=total['p99'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Compares the time and memory of building Model objects for a large collection
+
+    per_record_session: A Model per record, each creating its own GeneralSession (double_click < 0.3.0)
+    shared_session: A Model per record sharing one session, Model.objects_all()
+    lazy_collection: A ModelCollection, Model.objects_all(lazy=True)
+
+Usage:
+    python -m benchmarks.bench_models
+"""
+import gc
+import tracemalloc
+
+from benchmarks import report, timed
+from benchmarks.bench_cache import make_content
+from double_click.models import Model, ModelCollection
+
+
+class SmartDevice(Model):
+    _obj_identifier = 'name'
+
+
+def per_record_session(content):
+    return [SmartDevice(**record) for record in content]
+
+
+def shared_session(content):
+    return list(ModelCollection(SmartDevice, content))
+
+
+def lazy_collection(content):
+    return ModelCollection(SmartDevice, content)
+
+
+def retained_bytes(func, content) -> int:
+    """Bytes allocated by func(content) that are still in use while its result is held"""
+    gc.collect()
+    tracemalloc.start()
+    result = func(content)
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def main(records=200000, per_record_session_records=5000):
+    """per_record_session is run with fewer records, at 200k records it takes minutes"""
+    for name, func, count in (('per_record_session', per_record_session, per_record_session_records),
+                              ('shared_session', shared_session, records),
+                              ('lazy_collection', lazy_collection, records)):
+        content = make_content(count)
+        gc.collect()
+        report(f'models_{name}', timed(func, content), records=count, bytes=retained_bytes(func, content))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Times Model.objects_all against the local stand-in server with a cold cache (every page requested from the API),
+a warm file cache, and a memoized result
+
+Usage:
+    python -m benchmarks.bench_objects_all
+"""
+import json
+import os
+import tempfile
+
+from benchmarks import report, timed
+from benchmarks.bench_cache import make_content
+from double_click.cache import MemoryCache
+from double_click.models import Model
+from double_click.pagination import PageNumberPaginator
+from double_click.request import GeneralSession
+from tests.server import StandInServer
+
+
+def paginated_route(content, page_size):
+    """Pre-encodes every page so the server isn't the bottleneck"""
+    pages = [json.dumps(dict(count=len(content), results=content[idx:idx + page_size])).encode('utf-8')
+             for idx in range(0, len(content), page_size)] or [json.dumps(dict(count=0, results=[])).encode('utf-8')]
+
+    def route(handler, query, body):
+        return 200, {'Content-Type': 'application/json'}, pages[int(query.get('page', 1)) - 1]
+    return route
+
+
+def main(sizes=(1000, 10000, 100000), page_size=100):
+    with tempfile.TemporaryDirectory() as cache_dir, StandInServer() as server, \
+            GeneralSession(disable_progress_bar=True) as session:
+        for records in sizes:
+            server.routes['/devices'] = paginated_route(make_content(records), page_size)
+
+            class SmartDevice(Model):
+                _obj_identifier = 'name'
+                _paginator = PageNumberPaginator()
+                _cache_key = os.path.join(cache_dir, f'devices_{records}')
+                _memo = MemoryCache()
+
+            kwargs = dict(url=f'{server.url}/devices', session=session)
+            for name in ('cold', 'warm', 'memo'):
+                if name != 'memo':
+                    SmartDevice._memo.clear()
+                if name == 'cold':
+                    SmartDevice._cache_backend.delete(SmartDevice._cache_key)
+                report(f'objects_all_{name}', timed(SmartDevice.objects_all, **kwargs), records=records,
+                       page_size=page_size)
+
+
+if __name__ == '__main__':
+    main()
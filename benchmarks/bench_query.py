@@ -0,0 +1,50 @@
+"""Compares filtering and sorting a large cached collection with list comprehensions over Model objects
+against ModelCollection.filter/order_by, with and without numpy
+
+Usage:
+    python -m benchmarks.bench_query
+"""
+from unittest import mock
+
+from benchmarks import report, timed
+from benchmarks.bench_cache import make_content
+from double_click import models
+from double_click.models import Model, ModelCollection
+
+
+class SmartDevice(Model):
+    _obj_identifier = 'name'
+
+
+def list_comprehension(devices):
+    matches = [device for device in devices if device.brightness >= 0.5 and device.room == 'room_7']
+    return [device.id for device in sorted(matches, key=lambda device: device.id, reverse=True)]
+
+
+def collection_query(collection):
+    return collection.filter(brightness__gte=0.5, room='room_7').order_by('-id').values_list('id', flat=True)
+
+
+def main(records=1000000):
+    content = make_content(records)
+    devices = None
+
+    def build_models():
+        nonlocal devices
+        devices = list(ModelCollection(SmartDevice, content))
+
+    report('query_build_models', timed(build_models), records=records)
+    report('query_list_comprehension', timed(list_comprehension, devices), records=records)
+    del devices
+
+    report('query_build_collection', timed(ModelCollection, SmartDevice, content), records=records)
+    for numpy in (models.load_numpy(), False):
+        with mock.patch.object(models, 'numpy', numpy):
+            collection = ModelCollection(SmartDevice, content)
+            collection_query(collection)  # Builds the numpy arrays
+            report('query_collection', timed(collection_query, collection), records=records,
+                   numpy=bool(numpy))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Compares rendering the same markdown message repeatedly with mdv against the memoized render_md,
+and the first render in a new process with and without the render_md disk cache
+
+Usage:
+    python -m benchmarks.bench_render
+"""
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import report, timed
+from double_click import utils
+
+MESSAGE = '#Unable to find the requested resource'
+NEW_PROCESS = 'from double_click import utils; utils.MD_CACHE_DIR = sys.argv[1]; ' \
+              'utils.render_md(sys.argv[2], disk_cache=sys.argv[3] == "1")'
+
+
+def mdv_renders(renders):
+    for _ in range(renders):
+        utils.mdv(md=MESSAGE, theme=utils.CLI_THEME, c_theme=utils.CLI_THEME)
+
+
+def memoized_renders(renders):
+    for _ in range(renders):
+        utils.render_md(MESSAGE)
+
+
+def new_process_render(cache_dir, disk_cache):
+    subprocess.run([sys.executable, '-c', f'import sys; {NEW_PROCESS}', cache_dir, MESSAGE, str(int(disk_cache))],
+                   check=True)
+
+
+def main(renders=200):
+    utils.mdv(md=MESSAGE)  # Import mdv before timing
+    report('render_mdv', timed(mdv_renders, renders), renders=renders)
+    report('render_md_memoized', timed(memoized_renders, renders), renders=renders)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        new_process_render(cache_dir, True)  # Fill the disk cache
+        for disk_cache in (False, True):
+            report('render_md_new_process', timed(new_process_render, cache_dir, disk_cache), disk_cache=disk_cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Compares many small bulk calls reusing the session runtime against a new event loop and pool per call
+
+Usage:
+    python -m benchmarks.bench_runtime
+"""
+import asyncio
+
+from benchmarks import report, timed
+from double_click.request import GeneralSession
+from tests.server import StandInServer
+
+
+def per_call_loop(session, request_list, calls):
+    for _ in range(calls):
+        loop = asyncio.new_event_loop()
+        session.bulk_get(request_list, loop=loop)
+        loop.close()
+
+
+def session_runtime(session, request_list, calls):
+    for _ in range(calls):
+        session.bulk_get(request_list)
+
+
+def main(calls=200, requests_per_call=5):
+    with StandInServer() as server:
+        request_list = [f'{server.url}/bench'] * requests_per_call
+        for async_transport in (False, True):
+            transport = 'aiohttp' if async_transport else 'threads'
+            for name, func in (('per_call_loop', per_call_loop), ('session_runtime', session_runtime)):
+                with GeneralSession(disable_progress_bar=True, async_transport=async_transport) as session:
+                    seconds = timed(func, session, request_list, calls)
+                report(f'bulk_get_{name}', seconds, calls=calls, requests_per_call=requests_per_call,
+                       transport=transport)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Compares rendering a large table as markdown with mdv, echo(generate_md_table_str(...)),
+against generate_table_str and streaming it with echo_table.
+
+mdv is only timed up to mdv_max_rows rows, it takes minutes for 100k.
+stdout is redirected to os.devnull while rendering.
+
+Usage:
+    python -m benchmarks.bench_table
+"""
+import os
+from contextlib import redirect_stdout
+
+from benchmarks import report, timed
+from benchmarks.bench_cache import make_content
+from double_click.markdown import generate_md_table_str, generate_table_str
+from double_click.utils import echo, echo_table
+
+HEADERS = ['name', 'room', 'online', 'brightness']
+
+
+def mdv_table(rows):
+    echo(f'#Devices\n{generate_md_table_str(rows, HEADERS)}')
+
+
+def streamed_table(rows):
+    echo_table(iter(rows), HEADERS, sample_size=1000, max_width=120)
+
+
+def main(sizes=(10000, 100000), mdv_max_rows=10000):
+    results = []
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for records in sizes:
+            rows = [[item[key] for key in HEADERS] for item in make_content(records)]
+            results.append(('table_md_str', timed(generate_md_table_str, rows, HEADERS), records))
+            if records <= mdv_max_rows:
+                results.append(('table_md_mdv', timed(mdv_table, rows), records))
+            results.append(('table_str', timed(generate_table_str, rows, HEADERS, None, 120), records))
+            results.append(('table_echo_stream', timed(streamed_table, rows), records))
+
+    for name, seconds, records in results:
+        report(name, seconds, rows=records)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Compares resolving the visibility of every command of a 1k command CLI
+
+    legacy_hide: The has_access implementation of double_click < 0.3.0, once per command
+    hide: User.hide once per command
+    hide_many: A single User.hide_many call
+
+Usage:
+    python -m benchmarks.bench_user
+"""
+from benchmarks import report, timed
+from double_click.user import User
+
+
+def legacy_has_access(user, requires=None, match_all=False, **kwargs):
+    access = user.access
+    while kwargs:
+        key_hits = [key for key in kwargs.keys() if key in access.keys()]
+        if len(key_hits) != 1:
+            return False
+        access = access[key_hits[0]].get(kwargs.pop(key_hits[0]))
+        if access is None:
+            return False
+
+    auth_list = [k for k in access.keys()]
+    if requires is None:
+        return True
+    for _, value in access.items():
+        if isinstance(value, list):
+            auth_list += value
+    if match_all:
+        return all(authed in auth_list for authed in requires)
+    return any(authed in auth_list for authed in requires)
+
+
+def make_user(services, permissions):
+    access = dict(service={
+        f'service_{service}': dict(permissions=[f'permission_{idx}' for idx in range(permissions)],
+                                   roles=['Viewer', 'Manager'])
+        for service in range(services)
+    })
+    return User(username='bench', access=access)
+
+
+def make_checks(commands, services, permissions):
+    return [([f'permission_{(idx * 7) % (permissions * 2)}', 'Admin'], bool(idx % 2),
+             dict(service=f'service_{idx % services}'))
+            for idx in range(commands)]
+
+
+def main(commands=1000, services=20, permissions=2000):
+    checks = make_checks(commands, services, permissions)
+    for name, func in (
+        ('legacy_hide', lambda user: [not legacy_has_access(user, r, m, **k) for r, m, k in checks]),
+        ('hide', lambda user: [user.hide(r, m, **k) for r, m, k in checks]),
+        ('hide_many', lambda user: user.hide_many(checks)),
+    ):
+        report(f'user_{name}', timed(func, make_user(services, permissions)), commands=commands,
+               services=services, permissions=permissions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Compares two result files written by python -m benchmarks, flagging regressions.
+
+Results are matched by benchmark, name, and params. seconds and any memory metric are compared.
+Exits with status 1 if any metric regressed by more than --threshold.
+
+Usage:
+    python -m benchmarks.compare baseline.json current.json [--threshold 0.2]
+"""
+import argparse
+import json
+import sys
+
+from double_click.utils import echo_table
+
+METRICS = ('seconds', 'bytes', 'peak_bytes', 'p95', 'p99')
+MIN_SECONDS = 0.001  # Changes smaller than this are noise
+
+
+def load(path: str) -> dict:
+    """Returns dict(key -> result) where key identifies the result across runs"""
+    with open(path) as f:
+        results = json.loads(f.read())['results']
+    keyed = {}
+    for result in results:
+        params = {k: v for k, v in result.items() if k not in METRICS + ('benchmark', 'name')}
+        keyed[(result['benchmark'], result['name'], json.dumps(params, sort_keys=True))] = result
+    return keyed
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2) -> list:
+    """Returns a row per metric of each result in both baseline and current
+
+    :param baseline: load() of the baseline results
+    :param current: load() of the current results
+    :param threshold: Fraction a metric can increase by before it is a regression
+    :return: list(list(benchmark, name, params, metric, baseline, current, change, regression))
+    """
+    rows = []
+    for key in baseline.keys() & current.keys():
+        for metric in METRICS:
+            before, after = baseline[key].get(metric), current[key].get(metric)
+            if before is None or after is None:
+                continue
+
+            change = (after - before) / before if before else 0.0
+            noise = metric not in ('bytes', 'peak_bytes') and abs(after - before) < MIN_SECONDS
+            rows.append([*key, metric, before, after, change, change > threshold and not noise])
+    return sorted(rows, key=lambda row: row[:4])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.compare', description=__doc__.split('\n')[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Fraction a metric can increase by before it is a regression. Default: 0.2')
+    args = parser.parse_args(argv)
+
+    baseline, current = load(args.baseline), load(args.current)
+    rows = compare(baseline, current, args.threshold)
+    echo_table(([benchmark, name, params, metric, before, after, f'{change:+.1%}', 'REGRESSION' if regression else '']
+                for benchmark, name, params, metric, before, after, change, regression in rows),
+               ['benchmark', 'name', 'params', 'metric', 'baseline', 'current', 'change', 'status'], max_width=0)
+
+    for label, keys in (('Only in baseline', baseline.keys() - current.keys()),
+                        ('Only in current', current.keys() - baseline.keys())):
+        for benchmark, name, params in sorted(keys):
+            sys.stdout.write(f'{label}: {benchmark} {name} {params}\n')
+
+    regressions = sum(row[-1] for row in rows)
+    sys.stdout.write(f'{regressions} regressions in {len(rows)} metrics\n')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
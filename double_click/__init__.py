@@ -1,17 +1,46 @@
-import os
+"""Everything is imported on first use (PEP 562) so `import double_click` doesn't slow down CLI startup.
 
-try:
-    width, height = os.get_terminal_size()
-    os.environ.setdefault('width', str(width))
-    os.environ.setdefault('LINES', str(height))
-except OSError:
-    os.environ.setdefault('width', "0")
-    os.environ.setdefault('LINES', "0")
+Slow dependencies e.g. requests, mdv (and through it Markdown and Pygments), dateutil, distutils, colored, and sqlite3
+are imported by the functions that use them for the same reason.
+"""
+import importlib
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from double_click.utils import display_version, echo, echo_table, update_package, ensure_latest_package
+    from double_click.request import GeneralSession, UserSession
+    from double_click.markdown import generate_md_bullet_str, generate_md_code_str, generate_md_table_str, \
+        generate_table_str
+    from double_click.models import Model, ModelAuth
+    from double_click.user import User
 
-from double_click.utils import display_version, echo, update_package, ensure_latest_package
-from double_click.request import GeneralSession, UserSession
-from double_click.markdown import generate_md_bullet_str, generate_md_code_str, generate_md_table_str
-from double_click.models import Model, ModelAuth
-from double_click.user import User
+_LAZY_ATTRIBUTES = {
+    'display_version': 'double_click.utils',
+    'echo': 'double_click.utils',
+    'echo_table': 'double_click.utils',
+    'update_package': 'double_click.utils',
+    'ensure_latest_package': 'double_click.utils',
+    'GeneralSession': 'double_click.request',
+    'UserSession': 'double_click.request',
+    'generate_md_bullet_str': 'double_click.markdown',
+    'generate_md_code_str': 'double_click.markdown',
+    'generate_md_table_str': 'double_click.markdown',
+    'generate_table_str': 'double_click.markdown',
+    'Model': 'double_click.models',
+    'ModelAuth': 'double_click.models',
+    'User': 'double_click.user',
+}
+__all__ = list(_LAZY_ATTRIBUTES)
 
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,373 @@
+import json
+import marshal
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from time import monotonic
+
+MAGIC = b'DCCACHE'
+MARSHAL = b'm'
+JSON = b'j'
+INDEX_TYPES = (str, int, float, bytes)
+
+
+class CacheIndex:
+    """Read only view of the index FileCache writes next to a cache, mapping each identifier to its record.
+
+    Single records and the list of identifiers are read without loading the full cache.
+    Use as a context manager or call close when done.
+    """
+
+    def __init__(self, connection):
+        """:param connection: sqlite3.Connection to the index"""
+        self._connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def get(self, identifier, default=None):
+        """Returns the record for identifier or default if it isn't in the cache"""
+        row = self._connection.execute('SELECT record FROM records WHERE identifier = ?', (identifier,)).fetchone()
+        return FileCache.loads(row[0]) if row else default
+
+    def identifiers(self) -> list:
+        """Returns every identifier in the order it first appears in the cache"""
+        return [row[0] for row in self._connection.execute('SELECT identifier FROM records ORDER BY position')]
+
+
+class FileCache:
+    """Default Model cache backend, storing each cache key as a file on disk.
+
+    Content is serialized with marshal, a compact binary format that loads roughly twice as fast as json.
+    Content marshal can't serialize falls back to json. Set compress_level (1-9) to also zlib compress the file.
+    Files are written to a temp file and renamed into place so a concurrent read never sees a partial write.
+    Files written by older versions of double_click (indented json) can still be read.
+
+    If set is called with index_key, a SQLite index of the records by index_key is written to `<key>.idx`, see index.
+    """
+
+    def __init__(self, compress_level: int = 0):
+        self.compress_level = compress_level
+
+    @staticmethod
+    def path(key: str) -> Path:
+        return Path(os.path.expanduser(key))
+
+    def age(self, key: str):
+        """Seconds since the cache was last set or None if it doesn't exist
+
+        :param key:
+        :return: float or None
+        """
+        try:
+            return time.time() - os.path.getmtime(self.path(key))
+        except OSError:
+            return None
+
+    def is_fresh(self, key: str, ttl: float) -> bool:
+        """
+        :param key:
+        :param ttl: Minutes the cache is valid for after being set
+        :return: bool
+        """
+        age = self.age(key)
+        return age is not None and age <= ttl * 60
+
+    def get(self, key: str, ttl: float = None):
+        """Returns the cached content or None if it doesn't exist, is older than ttl, or can't be read
+
+        :param key:
+        :param ttl: Minutes the cache is valid for after being set. None to ignore age.
+        :return: Cached content or None
+        """
+        if ttl is not None and not self.is_fresh(key, ttl):
+            return None
+
+        try:
+            with open(self.path(key), 'rb') as f:
+                return self.loads(f.read())
+        except (OSError, ValueError, EOFError, TypeError, zlib.error):
+            return None
+
+    def set(self, key: str, content, index_key: str = None):
+        """
+        :param key:
+        :param content:
+        :param index_key: If set, content must be a list of dicts and an index of the dicts by index_key is written
+        """
+        path = self.path(key)
+        os.makedirs(path.parent, exist_ok=True)
+        self._write(path, self.dumps(content))
+        if index_key is not None:
+            self._write_index(path, content, index_key)
+
+    def delete(self, key: str):
+        path = self.path(key)
+        for file_path in (path, self.meta_path(path)):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+        self.delete_index(path)
+
+    def touch(self, key: str):
+        """Resets the age of the cache without rewriting it e.g. after the API reports it hasn't changed"""
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def meta_path(path: Path) -> Path:
+        return path.with_name(f'{path.name}.meta')
+
+    def get_meta(self, key: str) -> dict:
+        """Returns the metadata saved with set_meta e.g. the ETag of the response the cache was built from
+
+        :param key:
+        :return: dict or None
+        """
+        try:
+            with open(self.meta_path(self.path(key))) as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def set_meta(self, key: str, meta: dict):
+        path = self.meta_path(self.path(key))
+        os.makedirs(path.parent, exist_ok=True)
+        self._write(path, json.dumps(meta).encode('utf-8'))
+
+    @staticmethod
+    def lock_path(path: Path) -> Path:
+        return path.with_name(f'{path.name}.lock')
+
+    def lock(self, key: str, timeout: float = 600) -> bool:
+        """Creates a lock file for key so only one process refreshes the cache at a time.
+
+        :param key:
+        :param timeout: Seconds after which a lock is considered abandoned, e.g. the process was killed, and is replaced
+        :return: True if the lock was acquired, False if another process holds it
+        """
+        path = self.lock_path(self.path(key))
+        os.makedirs(path.parent, exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) < timeout:
+                        return False
+                    os.remove(path)
+                except FileNotFoundError:  # Released since
+                    pass
+                continue
+
+            with os.fdopen(fd, 'w') as f:
+                f.write(str(os.getpid()))
+            return True
+        return False
+
+    def unlock(self, key: str):
+        try:
+            os.remove(self.lock_path(self.path(key)))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def index_path(path: Path) -> Path:
+        return path.with_name(f'{path.name}.idx')
+
+    def index(self, key: str, ttl: float = None):
+        """Returns a CacheIndex for the cache or None if the cache has no valid index or is older than ttl.
+
+        An index is only valid for the exact cache file it was written with.
+        set always writes a new file so if the cache has since been replaced, e.g. by a custom _cache_set,
+        None is returned.
+
+        :param key:
+        :param ttl: Minutes the cache is valid for after being set. None to ignore age.
+        :return: CacheIndex or None
+        """
+        import sqlite3
+
+        path = self.path(key)
+        if ttl is not None and not self.is_fresh(key, ttl):
+            return None
+
+        try:
+            stat = os.stat(path)
+            connection = sqlite3.connect(f'{self.index_path(path).absolute().as_uri()}?mode=ro', uri=True)
+        except (OSError, sqlite3.Error):
+            return None
+
+        try:
+            row = connection.execute('SELECT cache_inode, cache_size FROM meta').fetchone()
+        except sqlite3.Error:
+            row = None
+        if row != (stat.st_ino, stat.st_size):
+            connection.close()
+            return None
+        return CacheIndex(connection)
+
+    def _write_index(self, path: Path, content: list, index_key: str):
+        """Writes the index for the cache file at path. Called after the cache file is written."""
+        import sqlite3
+
+        index_path = self.index_path(path)
+        records = {}
+        for item in content:
+            identifier = item.get(index_key)
+            if not isinstance(identifier, INDEX_TYPES):  # e.g. None or a list, which can't be looked up
+                records = None
+                break
+            records[identifier] = item  # Same as objects_all(as_dict=True), the last record with an identifier wins
+
+        if records is None:
+            self.delete_index(path)
+            return
+
+        stat = os.stat(path)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{index_path.name}.', suffix='.tmp')
+        os.close(fd)
+        try:
+            connection = sqlite3.connect(tmp_path)
+            try:
+                connection.execute('PRAGMA journal_mode = OFF')
+                connection.execute('PRAGMA synchronous = OFF')
+                connection.execute('CREATE TABLE meta (cache_inode INTEGER, cache_size INTEGER)')
+                connection.execute('INSERT INTO meta VALUES (?, ?)', (stat.st_ino, stat.st_size))
+                connection.execute('CREATE TABLE records (position INTEGER PRIMARY KEY, identifier, record BLOB)')
+                connection.executemany(
+                    'INSERT INTO records VALUES (?, ?, ?)',
+                    ((position, identifier, self.dumps(item, compress=False))
+                     for position, (identifier, item) in enumerate(records.items()))
+                )
+                # Faster than inserting into an existing index
+                connection.execute('CREATE UNIQUE INDEX records_identifier ON records (identifier)')
+                connection.commit()
+            finally:
+                connection.close()
+            os.replace(tmp_path, index_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def delete_index(self, path: Path):
+        try:
+            os.remove(self.index_path(path))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        """Atomically replaces the file at path with data"""
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def dumps(self, content, compress: bool = True) -> bytes:
+        try:
+            serializer, data = MARSHAL, marshal.dumps(content)
+        except ValueError:  # Content contains a type marshal doesn't support
+            serializer, data = JSON, json.dumps(content, separators=(',', ':')).encode('utf-8')
+
+        if compress and self.compress_level:
+            return MAGIC + serializer + b'z' + zlib.compress(data, self.compress_level)
+        return MAGIC + serializer + b'-' + data
+
+    @staticmethod
+    def loads(data: bytes):
+        if not data.startswith(MAGIC):
+            return json.loads(data)  # Written by double_click < 0.3.0
+
+        header_end = len(MAGIC) + 2
+        serializer, compressed = data[len(MAGIC):header_end - 1], data[header_end - 1:header_end]
+        data = memoryview(data)[header_end:]
+        if compressed == b'z':
+            data = zlib.decompress(data)
+        return marshal.loads(data) if serializer == MARSHAL else json.loads(bytes(data))
+
+
+class MemoryCache:
+    """Thread safe, in process LRU cache with a TTL. Used by Model to memoize query results.
+
+    :param maxsize: Max number of entries, the least recently used entry is evicted when exceeded
+    :param ttl: Seconds an entry is valid for. None for no expiry.
+    """
+
+    def __init__(self, maxsize: int = 64, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self) -> dict:
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions, size=len(self._entries))
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            if entry is not None:  # Expired
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        """
+        :param key: Any hashable value
+        :param value:
+        :param ttl: Overrides self.ttl for this entry
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (None if ttl is None else monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_matching(self, match):
+        """Deletes every entry with a key where match(key) is True
+
+        :param match: function(key) -> bool
+        """
+        with self._lock:
+            for key in [key for key in self._entries if match(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
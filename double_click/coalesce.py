@@ -0,0 +1,122 @@
+import asyncio
+import concurrent.futures
+import copy
+import threading
+
+COALESCE_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+
+def _freeze(value):
+    """Converts request kwargs to a hashable value, raising TypeError if it contains something that can't be hashed"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    hash(value)
+    return value
+
+
+class RequestCoalescer:
+    """Collapses identical requests made by the bulk calls of a GeneralSession into a single request.
+
+    Used when coalesce_requests is set. A request is identical if the method, url, and request kwargs match.
+    The first one is sent and every identical request made while it is in flight,
+    by the same bulk call or a concurrent one, waits for it and receives a copy of its response.
+    Only safe methods (COALESCE_METHODS) are coalesced and never with stream=True.
+
+    Within a bulk call the responses of the last batch_memo_size requests are also kept,
+    so an identical request later in request_list isn't sent again.
+
+    hits: Requests answered with the response of another request
+    misses: Requests that were sent
+    """
+    batch_memo_size = 1024
+
+    def __init__(self, methods=COALESCE_METHODS):
+        self.methods = frozenset(method.upper() for method in methods)
+        self.hits = 0
+        self.misses = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def as_dict(self) -> dict:
+        return dict(hits=self.hits, misses=self.misses)
+
+    def key(self, method: str, request_obj):
+        """Returns a hashable key identifying the request or None if it can't be coalesced"""
+        if method not in self.methods or request_obj.request_kwargs.get('stream'):
+            return None
+        try:
+            return method, request_obj.url, _freeze(request_obj.request_kwargs)
+        except TypeError:  # e.g. a file in the request kwargs
+            return None
+
+    def join(self, key, loop: asyncio.AbstractEventLoop, threaded: bool):
+        """Returns tuple(concurrent.futures.Future the response will be set on, True if the caller must send it).
+
+        Followers wait on the future of the request in flight. If that request is made on another event loop,
+        by coroutines that only run while that loop does, it isn't joined and (None, False) is returned
+        so a bulk call never waits on one that is paused.
+
+        :param key: See key()
+        :param loop: The event loop of the calling bulk call
+        :param threaded: True if the caller's request is made in a worker thread, independent of its event loop
+        """
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                shared = concurrent.futures.Future()
+                self._in_flight[key] = (shared, loop, threaded)
+                self.misses += 1
+                return shared, True
+
+            shared, leader_loop, leader_threaded = in_flight
+            if leader_threaded or leader_loop is loop:
+                return shared, False
+            return None, False
+
+    def release(self, key, shared: concurrent.futures.Future, response=None):
+        """Fans out the response of the request sent for key to every follower.
+
+        If the request is going to be retried (response.retry_delay is set) it stays in flight
+        and followers wait for the response of the retry, which is released with the same shared future.
+        If it failed for good or was cancelled followers get None and send their own request.
+        """
+        if getattr(response, 'retry_delay', None) is not None:
+            return
+        with self._lock:
+            if self._in_flight.get(key, (None, ))[0] is shared:
+                del self._in_flight[key]
+            if not shared.done():  # Released by the worker thread and when the bulk call is closed
+                shared.set_result(response)
+
+    @staticmethod
+    def wait(shared: concurrent.futures.Future, loop: asyncio.AbstractEventLoop) -> asyncio.Future:
+        """Returns an asyncio.Future on loop with the result of shared.
+
+        Unlike asyncio.wrap_future cancelling it doesn't cancel shared, which other requests may be waiting on.
+        """
+        waiter = loop.create_future()
+
+        def set_result(result):
+            if not waiter.done():
+                waiter.set_result(result)
+
+        def on_done(future):
+            try:
+                loop.call_soon_threadsafe(set_result, future.result())
+            except RuntimeError:  # The loop was closed, the bulk call that was waiting has ended
+                pass
+
+        shared.add_done_callback(on_done)
+        return waiter
+
+    def fan_out(self, response):
+        """Returns a copy of response for a follower, marked with response.coalesced = True"""
+        with self._lock:
+            self.hits += 1
+        clone = copy.copy(response)
+        for attr, value in response.__dict__.items():  # Keep attributes set by double_click e.g. request_kwargs
+            clone.__dict__.setdefault(attr, value)
+        clone.coalesced = True
+        return clone
@@ -0,0 +1,132 @@
+import threading
+from collections import deque
+from datetime import datetime as dt, timezone
+from email.utils import parsedate_to_datetime
+from time import monotonic
+
+
+def retry_after_seconds(response) -> float:
+    """Parses the Retry-After header of a response into seconds. Returns 0 if the header is missing or invalid.
+
+    :param response: requests.Response
+    :return: float
+    """
+    retry_after = response.headers.get('Retry-After') if response.headers else None
+    if not retry_after:
+        return 0
+
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError, IndexError):
+        return 0
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - dt.now(timezone.utc)).total_seconds(), 0)
+
+
+class ConcurrencyController:
+    """Decides how many requests GeneralSession.bulk_* keeps in flight.
+
+    The base class keeps a fixed limit and only pauses new requests when a response has a Retry-After header.
+    Set as GeneralSession.concurrency_controller or pass concurrency_controller=... to a bulk call.
+    """
+    throughput_window = 5  # Seconds of completed requests used to calculate throughput
+
+    def __init__(self, limit: int = None):
+        self._limit = limit
+        self._paused_until = 0
+        self._completed = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        """The current max number of requests in flight. None means no limit beyond max_concurrency."""
+        return self._limit
+
+    @property
+    def throughput(self) -> float:
+        """Completed requests per second over the last throughput_window seconds."""
+        with self._lock:
+            self._trim(monotonic())
+            if len(self._completed) < 2:
+                return float(len(self._completed))
+            elapsed = self._completed[-1] - self._completed[0]
+            return len(self._completed) / elapsed if elapsed else float(len(self._completed))
+
+    def wait_time(self) -> float:
+        """Seconds to wait before sending another request."""
+        return max(self._paused_until - monotonic(), 0)
+
+    def _trim(self, now: float):
+        while self._completed and self._completed[0] < now - self.throughput_window:
+            self._completed.popleft()
+
+    def on_response(self, response, latency: float):
+        """Called by the bulk engine each time a request completes.
+
+        :param response: requests.Response
+        :param latency: Seconds from the request being sent to the response being returned
+        """
+        now = monotonic()
+        with self._lock:
+            self._completed.append(now)
+            self._trim(now)
+            retry_after = retry_after_seconds(response)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            self._update(response, latency, now)
+
+    def _update(self, response, latency: float, now: float):
+        pass
+
+
+class AIMDConcurrency(ConcurrencyController):
+    """Additive increase, multiplicative decrease concurrency limit.
+
+    The limit grows by `increase` each time a full window of requests completes with stable latency
+    and is multiplied by `decrease` on a 429, 5xx, failed request (666), or latency rising above
+    `latency_tolerance` times the lowest observed latency (ignoring increases smaller than `latency_slack` seconds).
+    Decreases happen at most once per smoothed latency so a burst of errors from a single window doesn't collapse
+    the limit.
+    """
+
+    def __init__(self, initial: int = 10, min_limit: int = 1, max_limit: int = 500, increase: int = 1,
+                 decrease: float = 0.5, latency_tolerance: float = 2.0, latency_slack: float = 0.05):
+        super().__init__(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.latency_slack = latency_slack
+        self._successes = 0
+        self._smoothed_latency = None
+        self._min_latency = None
+        self._last_decrease = 0
+
+    def _update(self, response, latency: float, now: float):
+        if self._smoothed_latency is None:
+            self._smoothed_latency = self._min_latency = latency
+        else:
+            self._smoothed_latency += (latency - self._smoothed_latency) * 0.2
+            self._min_latency = min(latency, self._min_latency + (self._smoothed_latency - self._min_latency) * 0.01)
+
+        status_code = response.status_code or 666
+        max_latency = max(self._min_latency * self.latency_tolerance, self._min_latency + self.latency_slack)
+        congested = status_code == 429 or status_code >= 500 or self._smoothed_latency > max_latency
+
+        if congested:
+            self._successes = 0
+            if now - self._last_decrease >= self._smoothed_latency:
+                self._last_decrease = now
+                self._limit = max(int(self._limit * self.decrease), self.min_limit)
+        else:
+            self._successes += 1
+            if self._successes >= self._limit:
+                self._successes = 0
+                self._limit = min(self._limit + self.increase, self.max_limit)
@@ -0,0 +1,198 @@
+import atexit
+import json
+import math
+import threading
+from time import perf_counter
+from urllib.parse import urlsplit
+
+PHASES = ('queue_wait', 'auth', 'connect', 'ttfb', 'download', 'total', 'json_decode')
+_active = threading.local()
+
+
+def start_timings(queue_wait: float = None) -> dict:
+    """Starts collecting the phase timings of the request made by the current thread, see add_timing"""
+    timings = {} if queue_wait is None else dict(queue_wait=queue_wait)
+    _active.timings = timings
+    return timings
+
+
+def stop_timings():
+    _active.timings = None
+
+
+def active_timings():
+    """The timings of the request being made by the current thread or None if it isn't instrumented"""
+    return getattr(_active, 'timings', None)
+
+
+def add_timing(phase: str, seconds: float):
+    """Adds seconds to phase of the request being made by the current thread, if it is instrumented.
+
+    Used for work done deep in the stack e.g. opening a connection in the transport adapter.
+    """
+    timings = getattr(_active, 'timings', None)
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0) + seconds
+
+
+class Histogram:
+    """Log-linear histogram of durations using constant memory regardless of the number of values added.
+
+    Values are counted in buckets 2 ** (1 / BUCKETS_PER_DOUBLING) wide so percentiles are within ~2%.
+    Not thread safe, Instrumentation adds values under its lock.
+    """
+    BUCKETS_PER_DOUBLING = 16
+    MIN_VALUE = 1e-6
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        bucket = int(math.log2(max(seconds, self.MIN_VALUE) / self.MIN_VALUE) * self.BUCKETS_PER_DOUBLING)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent: float) -> float:
+        """The value percent (0 - 100) of values are less than or equal to"""
+        if not self.count:
+            return 0.0
+
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.MIN_VALUE * 2 ** ((bucket + 0.5) / self.BUCKETS_PER_DOUBLING), self.max)
+        return self.max
+
+    def as_dict(self) -> dict:
+        return dict(count=self.count, mean=self.sum / self.count if self.count else 0.0,
+                    p50=self.percentile(50), p95=self.percentile(95), p99=self.percentile(99), max=self.max)
+
+
+class RequestEvent:
+    """A single attempt of a request made by an instrumented GeneralSession, passed to Instrumentation callbacks.
+
+    timings maps phase -> seconds for each phase that applied to the request:
+        queue_wait: Waiting for a bulk worker thread or, with async_transport, a connection slot
+        auth: Refreshing auth before or after the request, including waiting on a refresh made by another request
+        connect: Opening a new connection, DNS + TCP + TLS. Missing if an open connection was reused
+        ttfb: Time to the response headers, excluding connect
+        download: Reading the response body
+        total: The full attempt including auth and retrying after a 401
+    """
+    __slots__ = ('method', 'url', 'host', 'status_code', 'attempt', 'timings', 'exception')
+
+    def __init__(self, method: str, url: str, host: str, status_code: int, attempt: int, timings: dict,
+                 exception: Exception = None):
+        self.method = method
+        self.url = url
+        self.host = host
+        self.status_code = status_code
+        self.attempt = attempt
+        self.timings = timings
+        self.exception = exception
+
+    def as_dict(self) -> dict:
+        return dict(method=self.method, url=self.url, host=self.host, status_code=self.status_code,
+                    attempt=self.attempt, timings=self.timings,
+                    exception=None if self.exception is None else repr(self.exception))
+
+
+class Instrumentation:
+    """Collects the timings of every request made by a GeneralSession with `instrumentation` set.
+
+    Each attempt of a request produces a RequestEvent, passed to every callback and aggregated into
+    a Histogram per host, HTTP verb, and phase. Time spent in Response.json is recorded as json_decode.
+    Recording an event takes a few microseconds so it can be left on in production.
+    Callbacks are called in the thread that made the request, they should be fast and not raise.
+
+    :param callbacks: list(callable(RequestEvent))
+    :param export_path: Write summary() as JSON to this path when the process exits
+    """
+
+    def __init__(self, callbacks: list = None, export_path: str = None):
+        self.callbacks = list(callbacks or [])
+        self.export_path = export_path
+        self._stats = {}
+        self._lock = threading.Lock()
+        if export_path:
+            atexit.register(self.export)
+
+    def _host_stats(self, host: str, method: str) -> dict:
+        """Must be called under self._lock"""
+        key = (host, method)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = dict(statuses={}, phases={})
+        return stats
+
+    def _add(self, host: str, method: str, timings: dict, status: str = None):
+        with self._lock:
+            stats = self._host_stats(host, method)
+            if status is not None:
+                stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+            phases = stats['phases']
+            for phase, seconds in timings.items():
+                histogram = phases.get(phase)
+                if histogram is None:
+                    histogram = phases[phase] = Histogram()
+                histogram.add(seconds)
+
+    def record(self, method: str, url: str, response, attempt: int, timings: dict, exception: Exception = None):
+        """Records an attempt of a request. Called by GeneralSession and AsyncTransport.
+
+        :param method: HTTP verb e.g. GET
+        :param url:
+        :param response: requests.Response of the attempt
+        :param attempt: Number of retries made before this attempt
+        :param timings: phase -> seconds, see RequestEvent. total is required
+        :param exception: Exception raised by the attempt, if any
+        """
+        host = urlsplit(url).netloc
+        event = RequestEvent(method, url, host, response.status_code, attempt, timings, exception)
+        self._add(host, method, timings, str(response.status_code))
+
+        json_decode = response.json
+
+        def timed_json(**kwargs):
+            start = perf_counter()
+            try:
+                return json_decode(**kwargs)
+            finally:
+                self._add(host, method, dict(json_decode=perf_counter() - start))
+
+        response.json = timed_json
+        for callback in self.callbacks:
+            callback(event)
+
+    def summary(self) -> dict:
+        """Returns the aggregated stats e.g.
+            {"requests": [{"host": "api.com", "method": "GET", "count": 2, "statuses": {"200": 2},
+                           "phases": {"total": {"count": 2, "mean": 0.1, "p50": 0.1, "p95": 0.1, ...}, ...}}]}
+        """
+        with self._lock:
+            requests = []
+            for (host, method), stats in sorted(self._stats.items()):
+                phases = stats['phases']
+                requests.append(dict(
+                    host=host, method=method, count=sum(stats['statuses'].values()),
+                    statuses=dict(stats['statuses']),
+                    phases={phase: phases[phase].as_dict() for phase in PHASES if phase in phases}
+                ))
+        return dict(requests=requests)
+
+    def export(self, path: str = None):
+        """Writes summary() as JSON to path, defaults to export_path"""
+        with open(path or self.export_path, 'w') as f:
+            f.write(json.dumps(self.summary(), indent=2))
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
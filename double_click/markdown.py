@@ -1,3 +1,9 @@
+import os
+from itertools import islice, zip_longest
+
+ELLIPSIS = '\u2026'
+
+
 def generate_md_table_str(row_list: list, headers: list) -> str:
     """Creates a markdown compatible table returned as a string
 
@@ -5,13 +11,98 @@ def generate_md_table_str(row_list: list, headers: list) -> str:
     :param headers:
     :return: formatted markdown string
     """
-    table_output = f"\n| {' | '.join([header.title() for header in headers])} | \n"
-    table_output += f"| {' | '.join(['---' for _ in headers])} | \n"
+    lines = [f"| {' | '.join([header.title() for header in headers])} | ",
+             f"| {' | '.join(['---' for _ in headers])} | "]
+    lines.extend(f"| {' | '.join([str(col) for col in row])} | " for row in row_list)
+    return '\n\n' + '\n'.join(lines) + '\n\n'
+
+
+def _terminal_width() -> int:
+    """The width env var set by set_terminal_size_env, 0 if unknown"""
+    from double_click.utils import set_terminal_size_env
+
+    set_terminal_size_env()
+    try:
+        return int(os.environ['width'])
+    except ValueError:
+        return 0
+
+
+def _fit_widths(widths: list, max_width: int) -> list:
+    """Narrows the widest columns until a table with the column widths fits in max_width"""
+    available = max_width - (3 * len(widths) + 1)  # Borders and padding, | a | b |
+    if not max_width or sum(widths) <= available:
+        return widths
+
+    low, high = 1, max(widths)  # Binary search for the largest column width cap that fits
+    while low < high:
+        cap = (low + high + 1) // 2
+        if sum(min(width, cap) for width in widths) <= available:
+            low = cap
+        else:
+            high = cap - 1
+    return [min(width, low) for width in widths]
+
+
+def _fit(cell: str, width: int, right: bool) -> str:
+    if len(cell) > width:
+        return cell[:width - 1] + ELLIPSIS
+    return cell.rjust(width) if right else cell.ljust(width)
+
 
-    for row in row_list:
-        table_output += f"| {' | '.join([str(col) for col in row])} | \n"
+def iter_table_lines(row_list, headers: list, sample_size: int = None, max_width: int = None):
+    """Yields each line of a table with aligned columns, for display in the terminal without mdv.
 
-    return f"\n{table_output}\n"
+    Column widths fit the widest value of each column and numeric columns are right aligned.
+    If the table is wider than max_width, the widest columns are narrowed and values that don't fit are truncated.
+
+    :param row_list: Iterable of rows e.g. a list(list()) or a generator
+    :param headers: List of the column headers
+    :param sample_size: Compute the column widths from the first sample_size rows, any later row is formatted
+        as it is read instead of the whole row_list being held in memory. Default: All rows
+    :param max_width: Max line length. Default: The width of the terminal, 0 to never truncate
+    :return: generator(str)
+    """
+    rows = iter(row_list)
+    sample = list(rows if sample_size is None else islice(rows, sample_size))
+    headers = [str(header).title() for header in headers]
+    columns = []
+    right = []
+    for idx, column in enumerate(zip_longest(*sample, fillvalue='')):
+        right.append(all(type(value) in (int, float) for value in column))
+        column = list(map(str, column))
+        if any('\n' in cell for cell in column):
+            column = [cell.replace('\n', ' ') for cell in column]
+        columns.append(column)
+    headers += [''] * (len(columns) - len(headers))
+    right += [False] * (len(headers) - len(right))
+
+    widths = [max(len(header), *map(len, column)) if column else len(header)
+              for header, column in zip_longest(headers, columns, fillvalue=[])]
+    widths = _fit_widths(widths, _terminal_width() if max_width is None else max_width)
+    layout = list(zip(widths, right))
+
+    yield f"| {' | '.join(_fit(header, width, False) for header, width in zip(headers, widths))} |"
+    yield f"| {' | '.join('-' * width for width in widths)} |"
+    for cells in zip(*columns):
+        yield f"| {' | '.join([_fit(cell, width, right) for cell, (width, right) in zip(cells, layout)])} |"
+    for row in rows:
+        cells = (str(value).replace('\n', ' ') for value in row)
+        yield f"| {' | '.join([_fit(cell, width, right) for cell, (width, right) in zip(cells, layout)])} |"
+
+
+def generate_table_str(row_list, headers: list, sample_size: int = None, max_width: int = None) -> str:
+    """Creates a table with aligned columns returned as a string, see iter_table_lines
+
+    Much faster than rendering generate_md_table_str with mdv for large tables.
+
+    :param row_list:
+    :param headers:
+    :param sample_size:
+    :param max_width:
+    :return: formatted table string
+    """
+    return '\n'.join(iter_table_lines(row_list, headers, sample_size, max_width)) + '\n'
 
 
 def generate_md_bullet_str(bullet_list: list) -> str:
@@ -1,11 +1,14 @@
-import json
-import math
-import os
-from datetime import datetime as dt, timedelta
-from pathlib import Path
+import operator
+import threading
+from collections.abc import Sequence
+from datetime import datetime as dt, timezone
 
+from double_click.cache import FileCache, MemoryCache
+from double_click.pagination import PageError, PageNumberPaginator, Paginator
 from double_click.request import GeneralSession, UserSession
 
+numpy = None  # Imported by load_numpy on first use, False if it isn't installed
+
 
 class ModelAuth:
 
@@ -15,14 +18,315 @@ class ModelAuth:
         self.kwargs = kwargs
     
 
+_MISSING = object()
+_NUMERIC_TYPES = (bool, int, float)
+
+
+def load_numpy():
+    """Imports numpy on first use so it doesn't slow down import double_click. Returns None if it isn't installed."""
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as numpy_module
+        except ImportError:
+            numpy_module = False
+        numpy = numpy_module
+    return numpy or None
+
+
+def _not_none(func):
+    return lambda value, arg: value is not None and value is not _MISSING and func(value, arg)
+
+
+LOOKUPS = {
+    'exact': lambda value, arg: value == arg,
+    'ne': lambda value, arg: value != arg,
+    'in': lambda value, arg: value in arg,
+    'gt': _not_none(operator.gt),
+    'gte': _not_none(operator.ge),
+    'lt': _not_none(operator.lt),
+    'lte': _not_none(operator.le),
+    'contains': _not_none(lambda value, arg: arg in value),
+    'icontains': _not_none(lambda value, arg: arg.lower() in value.lower()),
+    'startswith': _not_none(lambda value, arg: value.startswith(arg)),
+    'isnull': lambda value, arg: (value is None or value is _MISSING) == arg,
+}
+NUMPY_LOOKUPS = {
+    'exact': operator.eq,
+    'ne': operator.ne,
+    'in': lambda array, arg: numpy.isin(array, list(arg)),
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+
+def _parse_lookup(lookup: str) -> tuple:
+    """'age__gte' -> ('age', 'gte'), 'age' -> ('age', 'exact')"""
+    key, _, lookup_type = lookup.rpartition('__')
+    if key and lookup_type in LOOKUPS:
+        return key, lookup_type
+    return lookup, 'exact'
+
+
+def _vectorizable(array, arg, lookup_type: str) -> bool:
+    """If the lookup can be evaluated on the numpy array, comparing numbers to numbers or strings to strings"""
+    if array is None or lookup_type not in NUMPY_LOOKUPS:
+        return False
+    arg_types = str if array.dtype.kind == 'U' else _NUMERIC_TYPES
+    if lookup_type == 'in':
+        return all(isinstance(value, arg_types) for value in arg)
+    return isinstance(arg, arg_types)
+
+
+def _sort_key(value):
+    """Sorts None and missing values first"""
+    if value is None or value is _MISSING:
+        return False, 0
+    return True, value
+
+
+class _Columns:
+    """Records stored as one list per key instead of one dict per record. Shared by ModelCollection slices."""
+    __slots__ = ('identifier_key', 'data', 'length', '_positions', '_arrays')
+
+    def __init__(self, records: list, identifier_key=None):
+        keys = {}
+        for record in records:
+            keys.update(dict.fromkeys(record))
+        self.identifier_key = identifier_key
+        self.data = {key: [record.get(key, _MISSING) for record in records] for key in keys}
+        self.length = len(records)
+        self._positions = None
+        self._arrays = {}
+
+    def record(self, position: int) -> dict:
+        return {key: column[position] for key, column in self.data.items() if column[position] is not _MISSING}
+
+    def column(self, key) -> list:
+        column = self.data.get(key)
+        if column is None:
+            return [None] * self.length
+        return [None if value is _MISSING else value for value in column]
+
+    def array(self, key):
+        """Returns the column as a numpy array if numpy is installed and every value is a number or every value is
+        a string, otherwise None. Arrays are created on first use and reused.
+        """
+        if load_numpy() is None:
+            return None
+        if key not in self._arrays:
+            column = self.data.get(key)
+            array = None
+            if column and (all(type(value) in _NUMERIC_TYPES for value in column)
+                           or all(type(value) is str for value in column)):
+                array = numpy.array(column)
+                if array.dtype.kind not in 'biufU':  # e.g. ints too large for int64
+                    array = None
+            self._arrays[key] = array
+        return self._arrays[key]
+
+    def filter(self, rows, key, lookup_type: str, arg):
+        """Returns the rows where the value of key matches the lookup"""
+        if lookup_type == 'exact' and arg is None:
+            lookup_type, arg = 'isnull', True
+        elif lookup_type == 'in':
+            arg = list(arg)
+
+        array = self.array(key) if lookup_type in NUMPY_LOOKUPS else None
+        if _vectorizable(array, arg, lookup_type):
+            mask = NUMPY_LOOKUPS[lookup_type](array, arg)
+            if isinstance(rows, range) and rows == range(self.length):
+                return numpy.flatnonzero(mask)
+            rows = numpy.asarray(rows, dtype=numpy.intp)
+            return rows[mask[rows]]
+
+        column = self.data.get(key) or [_MISSING] * self.length
+        if numpy and isinstance(rows, numpy.ndarray):
+            rows = rows.tolist()  # Indexing a list by numpy ints is slow
+        if lookup_type == 'in':
+            try:
+                arg = frozenset(arg)
+            except TypeError:  # Unhashable values
+                pass
+
+        if isinstance(rows, range) and rows == range(self.length):
+            if lookup_type == 'exact':
+                return [position for position, value in enumerate(column) if value == arg]
+            elif lookup_type == 'in':
+                return [position for position, value in enumerate(column) if value in arg]
+        elif lookup_type == 'exact':
+            return [position for position in rows if column[position] == arg]
+        elif lookup_type == 'in':
+            return [position for position in rows if column[position] in arg]
+
+        test = LOOKUPS[lookup_type]
+        return [position for position in rows if test(column[position], arg)]
+
+    def order_by(self, rows, key, descending: bool = False):
+        """Returns the rows sorted by the value of key. The sort is stable so rows can be sorted by several keys."""
+        array = self.array(key)
+        if array is not None:
+            rows = numpy.asarray(rows, dtype=numpy.intp)
+            if not descending:
+                return rows[numpy.argsort(array[rows], kind='stable')]
+            # Stable sort of the reversed rows, reversed, keeps equal values in their original order
+            rows = rows[::-1]
+            return rows[numpy.argsort(array[rows], kind='stable')][::-1]
+
+        column = self.data.get(key) or [_MISSING] * self.length
+        return sorted(rows, key=lambda position: _sort_key(column[position]), reverse=descending)
+
+    @property
+    def positions(self) -> dict:
+        """identifier -> position of the last record with the identifier, same as objects_all(as_dict=True)"""
+        if self._positions is None:
+            self._positions = {identifier: position
+                               for position, identifier in enumerate(self.column(self.identifier_key))}
+        return self._positions
+
+
+class ModelCollection(Sequence):
+    """Read only, compact collection of Model objects returned by Model.objects_all(lazy=True).
+
+    Records are stored by column instead of as a dict per record.
+    Model objects are only created when accessed and all of them share the session of the collection.
+    Slicing, filter, and order_by return a new collection without copying the records.
+    If numpy is installed filter and order_by on numbers and strings are vectorized.
+    """
+    __slots__ = ('model_cls', 'kwargs', '_columns', '_rows')
+
+    def __init__(self, model_cls, records: list = None, kwargs: dict = None, columns: _Columns = None, rows=None):
+        """
+        :param model_cls: The Model class
+        :param records: list(dict)
+        :param kwargs: Passed to every Model object e.g. url and session
+        """
+        kwargs = dict(kwargs or {})
+        if not isinstance(kwargs.get('session', model_cls._session), GeneralSession):
+            kwargs['session'] = GeneralSession(disable_progress_bar=False)
+
+        self.model_cls = model_cls
+        self.kwargs = kwargs
+        self._columns = columns if columns is not None else _Columns(records or [], model_cls._obj_identifier)
+        self._rows = rows if rows is not None else range(self._columns.length)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self._with_rows(self._rows[idx])
+        return self._model(self._rows[idx])
+
+    def __iter__(self):
+        for position in self._rows:
+            yield self._model(position)
+
+    def __repr__(self):
+        return f'<ModelCollection {self.model_cls.__name__}: {len(self)} objects>'
+
+    def _model(self, position: int):
+        return self.model_cls(**{**self._columns.record(position), **self.kwargs})
+
+    def bind(self, kwargs: dict):
+        """Returns a collection of the same records passing kwargs to every Model object instead.
+        Keeps the session of this collection if kwargs doesn't have one.
+        """
+        kwargs = {'session': self.kwargs['session'], **kwargs}
+        return ModelCollection(self.model_cls, kwargs=kwargs, columns=self._columns, rows=self._rows)
+
+    def _with_rows(self, rows):
+        return ModelCollection(self.model_cls, kwargs=self.kwargs, columns=self._columns, rows=rows)
+
+    def filter(self, **lookups):
+        """Returns a collection of the records matching every lookup.
+
+        Lookups are key=value or key__<lookup>=value where lookup is one of
+        exact, ne, in, gt, gte, lt, lte, contains, icontains, startswith, isnull
+        e.g. collection.filter(room='kitchen', brightness__gte=0.5, name__in=['tv', 'lamp'])
+
+        :param lookups:
+        :return: ModelCollection
+        """
+        rows = self._rows
+        for lookup, arg in lookups.items():
+            key, lookup_type = _parse_lookup(lookup)
+            rows = self._columns.filter(rows, key, lookup_type, arg)
+        return self._with_rows(rows)
+
+    def order_by(self, *keys):
+        """Returns a collection sorted by keys, prefix a key with - to sort descending e.g. order_by('room', '-id')
+
+        :param keys:
+        :return: ModelCollection
+        """
+        rows = self._rows
+        for key in reversed(keys):
+            rows = self._columns.order_by(rows, key.lstrip('-'), descending=key.startswith('-'))
+        return self._with_rows(rows)
+
+    def values_list(self, *keys, flat: bool = False) -> list:
+        """Returns a tuple of the values of keys for every record, or a list of the values if flat and a single key
+
+        :param keys:
+        :param flat:
+        :return: list
+        """
+        if flat:
+            if len(keys) != 1:
+                raise ValueError('flat=True requires a single key')
+            return self.values(keys[0])
+        return list(zip(*(self.values(key) for key in keys)))
+
+    def records(self):
+        """Yields each record as a dict"""
+        for position in self._rows:
+            yield self._columns.record(position)
+
+    def values(self, key) -> list:
+        """Returns the value of key for every record, None if a record doesn't have key"""
+        column = self._columns.column(key)
+        if isinstance(self._rows, range) and len(self._rows) == self._columns.length:
+            return column
+        return [column[position] for position in self._rows]
+
+    def identifiers(self) -> list:
+        """Returns every unique _obj_identifier in the order it first appears"""
+        return list(dict.fromkeys(self.values(self.model_cls._obj_identifier)))
+
+    def get_record(self, identifier, default=None):
+        """Returns the record with the _obj_identifier as a dict or default if there isn't one"""
+        position = self._columns.positions.get(identifier)
+        if position is None or position not in self._rows:
+            return default
+        return self._columns.record(position)
+
+    def by_identifier(self) -> dict:
+        """Returns dict(obj_identifier=record) of every record, same as Model.objects_all(as_dict=True)"""
+        return dict(zip(self.values(self.model_cls._obj_identifier), self.records()))
+
+
 class Model:
     # This could be a double_click.UserSession or double_click.GeneralSession object
     _session: GeneralSession = None  # Define a class that inherits from Model to set a default session type
     _url: str = None
     _ttl = 120
+    _max_stale = None  # Minutes past _ttl an expired cache is returned while it is refreshed in the background
+    _served_stale = False  # Set by _cache_retrieve if it returned an expired cache, which isn't memoized
     _cache_key = None
     _obj_identifier: any
     _auth: ModelAuth = ModelAuth(None, False)
+    _paginator: Paginator = PageNumberPaginator()
+    _cache_backend = FileCache()
+    _delta_param: str = None  # Param the API filters changed objects by e.g. 'updated_since'. See Model.refresh
+    _deleted_key: str = None  # Key of a changed object that is set if it was deleted e.g. 'is_deleted'
+    # Set if the ETag or Last-Modified of the first page changes when any object changes, not just the first page's
+    _validate_collection = False
+    _refresh_process = True  # Refresh a stale cache in a detached process, see Model._refresh_in_background
+    _first_response = None
+    _memo: MemoryCache = MemoryCache()  # Shared by every Model in the process. None to disable
 
     def __init__(self, **kwargs):
         self._url = kwargs.pop('url', self._url)
@@ -30,7 +334,6 @@ class Model:
         if not isinstance(self._session, UserSession) and not isinstance(self._session, GeneralSession):
             self._session = GeneralSession(disable_progress_bar=False)
 
-        self._as_dict = kwargs
         for key, value in kwargs.items():
             setattr(self, key, value)
 
@@ -42,40 +345,133 @@ class Model:
     def objects_identifier(cls, **kwargs) -> list:
         """Returns a list of values, primarily used for passing in click.Choice(Model.objects_keys())
 
+        If the results aren't memoized but the cache is valid, the identifiers are read from the cache index
+        without loading the full cache.
+
         :param kwargs:
         :return: list
         """
-        model = cls.objects_all(as_dict=True, **kwargs)
-        return list(model.keys())
+        collection = cls._memo_get(kwargs)
+        if collection is None:
+            index = cls(**kwargs)._cache_index()
+            if index is not None:
+                with index:
+                    return index.identifiers()
+
+        return (collection or cls._query(**kwargs)).identifiers()
 
     @classmethod
-    def objects_all(cls, as_dict: bool = False, **kwargs):
+    def objects_all(cls, as_dict: bool = False, lazy: bool = False, **kwargs):
         """Returns all hits as a list of Model objects or dict(obj_identifier=item_as_dict).
 
+        Results are memoized in _memo so repeated calls in the same process don't reload the cache.
+
         :param as_dict: If true (default False), the response will be a dict instead of a list of models
+        :param lazy: If true (default False), the response will be a ModelCollection
+            that only creates each Model object when it is accessed
         :param kwargs:
         :return:
         """
+        collection = cls._query(**kwargs)
+        if as_dict:
+            return collection.by_identifier()
+        elif lazy:
+            return collection
+        else:
+            return list(collection)
+
+    @classmethod
+    def objects_filter(cls, **lookups):
+        """Returns a ModelCollection of the hits matching every lookup, see ModelCollection.filter.
+
+        url and session are passed to the Model the same as the other objects_* methods.
+
+        :param lookups:
+        :return: ModelCollection
+        """
+        kwargs = {key: lookups.pop(key) for key in ('url', 'session') if key in lookups}
+        return cls._query(**kwargs).filter(**lookups)
+
+    @classmethod
+    def objects_iter(cls, **kwargs):
+        """Yields every hit as a Model object.
+
+        If the cache is valid the hits come from the cache. Otherwise, they are streamed from the API page by page
+        without being cached, so a large collection never needs to be held in memory.
+
+        :param kwargs:
+        :return: generator(Model)
+        """
+        collection = cls._memo_get(kwargs)
+        if collection is not None:
+            yield from collection
+            return
+
         model = cls(**kwargs)
         content = model._cache_retrieve()
-        if not content:
-            content = model.refresh()
+        if content is None:
+            content = model._api_iter() if model._has_access() else []
 
-        if as_dict:
-            return {item.get(model._obj_identifier): item for item in content}
-        else:
-            return [cls(**{**model, **kwargs}) for model in content]
+        kwargs = {'session': model._session, **kwargs}
+        for item in content:
+            yield cls(**{**item, **kwargs})
 
     @classmethod
     def objects_get(cls, key, **kwargs):
         """Returns a Model object matching the provided key.
 
+        If the results aren't memoized but the cache is valid, the object is read from the cache index
+        without loading the full cache.
+
         :param key:
         :param kwargs:
         :return: cls
         """
-        model_dict = cls.objects_all(as_dict=True)
-        return cls(**{**model_dict.get(key, {}), **kwargs})
+        collection = cls._memo_get(kwargs)
+        if collection is None:
+            index = cls(**kwargs)._cache_index()
+            if index is not None:
+                with index:
+                    return cls(**{**index.get(key, {}), **kwargs})
+
+        record = (collection or cls._query(**kwargs)).get_record(key, {})
+        return cls(**{**record, **kwargs})
+
+    @classmethod
+    def _memo_key(cls, kwargs: dict) -> tuple:
+        session = kwargs.get('session', cls._session)
+        if not isinstance(session, GeneralSession):
+            session = None  # Each Model creates its own session
+        return cls, kwargs.get('url', cls._url), session
+
+    @classmethod
+    def _memo_get(cls, kwargs: dict):
+        """Returns the memoized ModelCollection bound to kwargs or None"""
+        if cls._memo is None:
+            return None
+        collection = cls._memo.get(cls._memo_key(kwargs))
+        return collection.bind(kwargs) if collection is not None else None
+
+    @classmethod
+    def _query(cls, **kwargs):
+        """Returns the memoized results, retrieving them from the cache or api if they aren't memoized
+
+        :param kwargs:
+        :return: ModelCollection
+        """
+        collection = cls._memo_get(kwargs)
+        if collection is not None:
+            return collection
+
+        model = cls(**kwargs)
+        content = model._cache_retrieve()
+        if not content:
+            content = model.refresh()
+
+        collection = ModelCollection(cls, content, kwargs={'session': model._session, **kwargs})
+        if content and cls._memo is not None and not model._served_stale:  # Memoized when the refresh is done
+            cls._memo.set(cls._memo_key(kwargs), collection)
+        return collection
 
     def get(self, attr, default=None):
         """Perform a safe lookup on an instance of the Model with the ability to provide a default if attr not set.
@@ -91,58 +487,267 @@ class Model:
 
     def _cache_retrieve(self) -> list:
         """Protected method to retrieve model responses from cache.
-        :return: list(requests.Response)
+        If _max_stale is set, a cache less than _max_stale minutes past _ttl is returned and refreshed in the background.
+        :return: list(dict) or None if the cache is not set or older than _ttl (+ _max_stale) minutes
         """
-        min_age = dt.now() - timedelta(minutes=self._ttl)
-        cache_key = Path(os.path.expanduser(self._cache_key))
-        if os.path.exists(cache_key) and dt.fromtimestamp(os.path.getmtime(cache_key)) < min_age:
-            with open(cache_key) as config:
-                return json.loads(config.read())
+        if not self._cache_key:
+            return None
+
+        content = self._cache_backend.get(self._cache_key, self._ttl)
+        if content is None and self._max_stale is not None:
+            content = self._cache_backend.get(self._cache_key, self._ttl + self._max_stale)
+            if content is not None:
+                self._served_stale = True
+                self._refresh_in_background()
+        return content
+
+    def _cache_index(self):
+        """Protected method to retrieve the index of the cache by _obj_identifier.
+        :return: CacheIndex or None if the cache is not set, older than _ttl minutes, or has no index
+        """
+        if not self._cache_key:
+            return None
+
+        index = self._cache_backend.index(self._cache_key, self._ttl)
+        if index is None and self._max_stale is not None:
+            index = self._cache_backend.index(self._cache_key, self._ttl + self._max_stale)
+            if index is not None:
+                self._refresh_in_background()
+        return index
 
     def _cache_set(self, content):
         """Called by Model.refresh if _cache_key is not None. Protected method that sets cache content.
 
         :param content:
         """
-        cache_key = Path(os.path.expanduser(self._cache_key))
-        os.makedirs(os.path.dirname(cache_key), exist_ok=True)
-        with open(cache_key, 'w') as config:
-            config.write(json.dumps(content, indent=2))
+        self._cache_backend.set(self._cache_key, content, index_key=self._obj_identifier)
+
+    def _api_iter(self, first_response=None):
+        """Protected method that yields each Model object from the api in order using _paginator.
+        :param first_response: The response of _paginator.first_page if it has already been requested
+        :return: generator(dict)
+        """
+        if first_response is None:
+            first_response = self._paginator.first_page(self._session, self._url)
+        self._first_response = first_response  # Used by refresh to save the ETag and Last-Modified headers
+        return self._paginator.iter_results(self._session, self._url, first_response=first_response)
 
     def _api_retrieve(self) -> list:
         """Protected method that retrieves all Model objects from the api.
-        :return: list(requests.Response)
+        :return: list(dict)
         """
-        page = 1
-        response = self._session.get(self._url, params=dict(page=page))
-        if response.status_code >= 400:
-            return []
+        return list(self._api_iter())
+
+    def _refresh_in_background(self):
+        """Protected method that refreshes the cache in the background.
+        A lock file prevents other threads and processes from refreshing the same cache at the same time.
+
+        If _refresh_process is set the refresh runs in a detached process, see _refresh_args,
+        so the command exits as soon as it is done instead of waiting on the download.
+        Otherwise, or if the model can't be recreated in another process, it runs in a thread that isn't a daemon
+        so the process waits for the refresh to finish before exiting.
+        :return: subprocess.Popen, threading.Thread, or None if the cache is already being refreshed
+        """
+        if not self._cache_backend.lock(self._cache_key):
+            return None
+
+        refresh_args = self._refresh_args() if self._refresh_process else None
+        if refresh_args is not None:
+            try:
+                return _start_refresh_process(refresh_args)
+            except OSError:
+                pass
+
+        def _refresh():
+            try:
+                with self._session.progress_bar_disabled():  # Don't draw over the output of the foreground command
+                    self.refresh()
+            finally:
+                self._cache_backend.unlock(self._cache_key)
+
+        thread = threading.Thread(target=_refresh, name=f'double_click-refresh-{type(self).__name__}')
+        thread.start()
+        return thread
+
+    def _refresh_args(self):
+        """Protected method returning what a new process needs to refresh the cache, see _refresh_in_process.
 
-        content = response.json()
-        results = content.get('results', [])
-        count = content.get('count')
+        :return: dict or None if the model or its session can't be recreated in another process
+            e.g. the class isn't importable, or a UserSession or custom auth is used
+        """
+        session = self._session
+        if not _importable(type(self)) or not _importable(type(session)) or isinstance(session, UserSession):
+            return None
+        if session.auth is not None and not isinstance(session.auth, tuple):
+            return None
+
+        cookies = [dict(name=cookie.name, value=cookie.value, domain=cookie.domain, path=cookie.path)
+                   for cookie in session.cookies]
+        return dict(model=[type(self).__module__, type(self).__qualname__], url=self._url, cache_key=self._cache_key,
+                    session=[type(session).__module__, type(session).__qualname__], headers=dict(session.headers),
+                    params=session.params, cookies=cookies, auth=session.auth, proxies=session.proxies,
+                    verify=session.verify)
 
-        if len(results) < count:
-            remaining_pages = math.ceil(count/len(results)) + 2  # account for 1 indexed val with page 1 complete
-            request_list = [(self._url, dict(params=dict(page=page))) for page in range(2, remaining_pages)]
-            responses = self._session.bulk_get(request_list)
-            for response in responses:
-                if response.status_code < 400:
-                    content = response.json()
-                    results += content.get('results', [])
+    def _has_access(self) -> bool:
+        if isinstance(self._session, UserSession):
+            return self._session.user.has_access(requires=self._auth.requires,
+                                                 match_all=self._auth.match_all,
+                                                 **self._auth.kwargs)
+        return True
 
-        return results
+    def _api_delta(self, since: str):
+        """Protected method that retrieves the objects changed since the last refresh using _delta_param.
+        :param since: ISO 8601 time of the last refresh
+        :return: list(dict) or None if any page failed
+        """
+        params = {self._delta_param: since}
+        response = self._paginator.first_page(self._session, self._url, params=params)
+        try:
+            return list(self._paginator.iter_results(self._session, self._url, params=params,
+                                                     first_response=response, strict=True))
+        except PageError:  # Changes on the failed page would be lost, refresh everything instead
+            return None
+
+    def _merge_delta(self, content: list, changes: list) -> list:
+        """Protected method that merges the changed objects into the cached content by _obj_identifier.
+        Changed objects replace the cached object, new objects are added to the end,
+        and objects where _deleted_key is set are removed.
+
+        :param content: The cached content
+        :param changes: The objects returned by _api_delta
+        :return: list(dict)
+        """
+        by_identifier = {item.get(self._obj_identifier): item for item in content}
+        for item in changes:
+            if self._deleted_key and item.get(self._deleted_key):
+                by_identifier.pop(item.get(self._obj_identifier), None)
+            else:
+                by_identifier[item.get(self._obj_identifier)] = item
+        return list(by_identifier.values())
 
     def refresh(self) -> list:
         """Syncs the local file with the service
+
+        If the cache was set by a previous refresh, only what changed is retrieved when possible:
+        * If _delta_param is set, objects changed since the last refresh are merged into the cache.
+        * If _validate_collection is set and the API returned an ETag or Last-Modified header,
+          a conditional request is made for the first page and a 304 Not Modified response keeps the cache as is.
         """
-        if isinstance(self._session, UserSession) and not self._session.user.has_access(requires=self._auth.requires,
-                                                                                        match_all=self._auth.match_all,
-                                                                                        **self._auth.kwargs):
+        if not self._has_access():
             return []
 
-        content = self._api_retrieve()
+        try:
+            return self._sync()
+        finally:  # After the cache is written so a query made during the refresh can't memoize the old content
+            if self._memo is not None:
+                self._memo.delete_matching(lambda memo_key: memo_key[0] is type(self))
+
+    def _sync(self) -> list:
+        """Protected method called by refresh that retrieves the objects from the api and writes them to the cache.
+        :return: list(dict)
+        """
+        synced_at = dt.now(timezone.utc).isoformat()
+        cache_meta = self._cache_backend.get_meta(self._cache_key) if self._cache_key else None
+        cache_meta = cache_meta or {}
+        has_validators = self._validate_collection and (cache_meta.get('etag') or cache_meta.get('last_modified'))
+        cached = self._cache_backend.get(self._cache_key) if self._delta_param or has_validators else None
+        first_response = None
+        if cached:
+            if self._delta_param and cache_meta.get('synced_at'):
+                changes = self._api_delta(cache_meta['synced_at'])
+                if changes is not None:
+                    content = self._merge_delta(cached, changes)
+                    if content:
+                        self._cache_set(content)
+                        self._cache_backend.set_meta(self._cache_key, dict(cache_meta, synced_at=synced_at))
+                    return content
+
+            headers = {}
+            if cache_meta.get('etag'):
+                headers['If-None-Match'] = cache_meta['etag']
+            if cache_meta.get('last_modified'):
+                headers['If-Modified-Since'] = cache_meta['last_modified']
+            if headers and self._validate_collection:
+                first_response = self._paginator.first_page(self._session, self._url, headers=headers)
+                if first_response.status_code == 304:
+                    self._cache_backend.touch(self._cache_key)
+                    self._cache_backend.set_meta(self._cache_key, dict(cache_meta, synced_at=synced_at))
+                    return cached
+                elif first_response.status_code >= 400:
+                    first_response = None
+
+        self._first_response = None
+        content = self._api_retrieve() if first_response is None else list(self._api_iter(first_response))
         if content and self._cache_key:
             self._cache_set(content)
+            response_headers = self._first_response.headers if self._first_response is not None else {}
+            self._cache_backend.set_meta(self._cache_key, dict(synced_at=synced_at,
+                                                               etag=response_headers.get('ETag'),
+                                                               last_modified=response_headers.get('Last-Modified')))
         return content
 
+
+def _importable(cls) -> bool:
+    return cls.__module__ != '__main__' and '<locals>' not in cls.__qualname__
+
+
+def _import(module: str, qualname: str):
+    import importlib
+
+    obj = importlib.import_module(module)
+    for name in qualname.split('.'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _start_refresh_process(refresh_args: dict):
+    """Starts a detached python -m double_click.models process that refreshes the cache, see Model._refresh_args.
+
+    refresh_args are written to stdin so session headers and cookies aren't visible in the process list.
+    :return: subprocess.Popen
+    """
+    import json
+    import os
+    import subprocess
+    import sys
+
+    kwargs = dict(stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, close_fds=True)
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+
+    python_path = os.pathsep.join(path or os.getcwd() for path in sys.path)  # The model imports as it does here
+    process = subprocess.Popen([sys.executable, '-m', 'double_click.models'],
+                               env=dict(os.environ, PYTHONPATH=python_path), **kwargs)
+    with process.stdin:
+        process.stdin.write(json.dumps(refresh_args, default=str).encode('utf-8'))
+    return process
+
+
+def _refresh_in_process(refresh_args: dict):
+    """Recreates the model and its session from Model._refresh_args, refreshes the cache, then releases its lock"""
+    model_cls = _import(*refresh_args['model'])
+    try:
+        session = _import(*refresh_args['session'])(disable_progress_bar=True)
+        session.headers.clear()
+        session.headers.update(refresh_args['headers'])
+        session.params = refresh_args['params']
+        for cookie in refresh_args['cookies']:
+            session.cookies.set(**cookie)
+        session.auth = tuple(refresh_args['auth']) if refresh_args['auth'] else None
+        session.proxies = refresh_args['proxies']
+        session.verify = refresh_args['verify']
+
+        model = model_cls(url=refresh_args['url'], session=session)
+        model._cache_key = refresh_args['cache_key']
+        model.refresh()
+    finally:
+        model_cls._cache_backend.unlock(refresh_args['cache_key'])
+
+
+if __name__ == '__main__':
+    import json
+    import sys
+
+    _refresh_in_process(json.loads(sys.stdin.read()))
@@ -0,0 +1,151 @@
+import math
+
+
+class PageError(Exception):
+    """Raised by Paginator.iter_results(strict=True) if a page couldn't be retrieved"""
+
+    def __init__(self, response):
+        super().__init__(f'Failed to retrieve page {response.url} - {response.status_code}')
+        self.response = response
+
+
+class Paginator:
+    """Retrieves every result from a paginated API endpoint. Used by Model._api_iter
+
+    Results are yielded in page order as soon as the pages before them have been retrieved,
+    so a collection never needs to be held in memory all at once.
+    """
+    results_key = 'results'
+
+    def __init__(self, results_key: str = None):
+        self.results_key = results_key or self.results_key
+
+    def page_results(self, content) -> list:
+        """Returns the results from the content of a page
+
+        :param content: The json decoded page
+        :return: list
+        """
+        if isinstance(content, list):
+            return content
+        return content.get(self.results_key) or []
+
+    def first_page(self, session, url: str, params: dict = None, headers: dict = None):
+        """Requests the first page. Used by Model.refresh to make a conditional request e.g. If-None-Match.
+
+        :param session: GeneralSession
+        :param url: URL of the first page
+        :param params: Params sent with every page request
+        :param headers: Headers sent with the first page request
+        :return: requests.Response
+        """
+        return session.get(url, params=params or {}, headers=headers)
+
+    def iter_results(self, session, url: str, params: dict = None, first_response=None, strict: bool = False):
+        """Yields each result across all pages
+
+        :param session: GeneralSession
+        :param url: URL of the first page
+        :param params: Params sent with every page request
+        :param first_response: The response of first_page if it has already been requested
+        :param strict: Raise PageError if a page fails instead of skipping its results
+        :return: generator(dict)
+        """
+        raise NotImplementedError
+
+
+class PageNumberPaginator(Paginator):
+    """For APIs that return a total count and accept a page number e.g. {"count": 1000, "results": [...]}
+
+    The first page is used to calculate the number of pages,
+    the remaining pages are retrieved concurrently, `window` pages at a time.
+    """
+    page_param = 'page'
+    count_key = 'count'
+    window = 25
+
+    def __init__(self, page_param: str = None, count_key: str = None, window: int = None, **kwargs):
+        super().__init__(**kwargs)
+        self.page_param = page_param or self.page_param
+        self.count_key = count_key or self.count_key
+        self.window = window or self.window
+
+    def first_page(self, session, url: str, params: dict = None, headers: dict = None):
+        return super().first_page(session, url, {**(params or {}), self.page_param: 1}, headers)
+
+    def iter_results(self, session, url: str, params: dict = None, first_response=None, strict: bool = False):
+        params = params or {}
+        response = first_response or self.first_page(session, url, params)
+        if response.status_code >= 400:
+            if strict:
+                raise PageError(response)
+            return
+
+        content = response.json()
+        results = self.page_results(content)
+        count = (content.get(self.count_key) if isinstance(content, dict) else None) or 0
+        yield from results
+        if not results or len(results) >= count:
+            return
+
+        pages = math.ceil(count / len(results))
+        progress_bar = session.progress_bar(pages)
+        progress_bar.update()
+        try:
+            for first_page in range(2, pages + 1, self.window):
+                batch = range(first_page, min(first_page + self.window, pages + 1))
+                request_list = [(url, dict(params={**params, self.page_param: page})) for page in batch]
+                completed = {}
+                next_idx = 0
+                for idx, response in session.bulk_iter_get(request_list, with_index=True, window=self.window,
+                                                            disable_progress_bar=True):
+                    progress_bar.update()
+                    if response.status_code >= 400 and strict:
+                        raise PageError(response)
+                    completed[idx] = self.page_results(response.json()) if response.status_code < 400 else []
+                    while next_idx in completed:  # Keep page order
+                        yield from completed.pop(next_idx)
+                        next_idx += 1
+        finally:
+            progress_bar.close()
+
+
+class CursorPaginator(Paginator):
+    """For APIs that link to the next page e.g. {"next": "https://...?cursor=abc", "results": [...]}
+
+    `next_key` can be a URL or a cursor sent as `cursor_param` on the next request.
+    If the response has no `next_key` the next link of the Link header is used.
+    Each page depends on the previous one so pages are retrieved one at a time.
+    """
+    next_key = 'next'
+    cursor_param = None
+
+    def __init__(self, next_key: str = None, cursor_param: str = None, **kwargs):
+        super().__init__(**kwargs)
+        self.next_key = next_key or self.next_key
+        self.cursor_param = cursor_param or self.cursor_param
+
+    def iter_results(self, session, url: str, params: dict = None, first_response=None, strict: bool = False):
+        params = params or {}
+        progress_bar = session.progress_bar()
+        try:
+            while url:
+                response = first_response or session.get(url, params=params)
+                first_response = None
+                if response.status_code >= 400:
+                    if strict:
+                        raise PageError(response)
+                    return
+
+                progress_bar.update()
+                content = response.json()
+                yield from self.page_results(content)
+                next_page = content.get(self.next_key) if isinstance(content, dict) else None
+                if not next_page:
+                    url = response.links.get('next', {}).get('url')
+                elif self.cursor_param:
+                    params = {**params, self.cursor_param: next_page}
+                else:
+                    url, params = next_page, {}
+        finally:
+            progress_bar.close()
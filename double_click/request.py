@@ -1,10 +1,20 @@
 import asyncio
 import concurrent.futures
+import threading
+import time
+from contextlib import AsyncExitStack, contextmanager
+from datetime import datetime as dt, timedelta
+from time import monotonic, perf_counter
 
 import requests
-from colored import fg, style
-from tqdm import tqdm
 
+from double_click.cache import MemoryCache
+from double_click.coalesce import RequestCoalescer
+from double_click.concurrency import ConcurrencyController
+from double_click.instrumentation import Instrumentation, add_timing, start_timings, stop_timings
+from double_click.retry import RetryPolicy
+from double_click.runtime import BulkRuntime
+from double_click.transport import AsyncTransport, ConnectionStats, PooledHTTPAdapter
 from double_click.user import User
 from double_click.utils import EventLoop, is_valid_url
 
@@ -29,22 +39,79 @@ class GeneralSession(requests.Session):
     disable_progress_bar = False
     progress_bar_color = 'green_3a'
     max_concurrency = 500
+    async_transport = False  # If True, bulk_* requests are made with aiohttp instead of a ThreadPoolExecutor
+    concurrency_controller: ConcurrencyController = None  # Adjusts bulk_* requests in flight e.g. AIMDConcurrency
+    max_connections_per_host: int = None  # Max open connections to a single host. Defaults to max_concurrency
+    retry_policy: RetryPolicy = None  # Retry failed requests with backoff. By default requests are not retried
+    auth_refresh_margin = 60  # Seconds before auth_expires_at that auth is refreshed before making a request
+    instrumentation: Instrumentation = None  # Records the timings of every request e.g. Instrumentation()
+    coalesce_requests = False  # If True, identical GET requests made by bulk calls at the same time are sent once
 
     def __init__(self, *args, **kwargs):
         self.raise_exception = kwargs.pop('raise_exception', self.raise_exception)
         self.disable_progress_bar = kwargs.pop('disable_progress_bar', self.disable_progress_bar)
         self.progress_bar_color = kwargs.pop('progress_bar_color', self.progress_bar_color)
         self.max_concurrency = kwargs.pop('max_concurrency', self.max_concurrency)
+        self.async_transport = kwargs.pop('async_transport', self.async_transport)
+        self.concurrency_controller = kwargs.pop('concurrency_controller', self.concurrency_controller)
+        self.max_connections_per_host = kwargs.pop('max_connections_per_host', self.max_connections_per_host)
+        self.retry_policy = kwargs.pop('retry_policy', self.retry_policy)
+        self.instrumentation = kwargs.pop('instrumentation', self.instrumentation)
+        self.coalesce_requests = kwargs.pop('coalesce_requests', self.coalesce_requests)
         super().__init__()
+        self._bulk_attempt = threading.local()
+        self._progress_bar_disabled = threading.local()
+        self._auth_lock = threading.Lock()
+        self._auth_refreshing = threading.local()  # Set while refresh_auth runs, it may use this session
+        self._auth_generation = 0
+        self._refreshed_expiry = None
+        self._runtime = None
+        self._runtime_lock = threading.Lock()
+        self.connection_stats = ConnectionStats()
+        self.coalescer = RequestCoalescer()
+        self.mount_adapters()
+
+    @property
+    def runtime(self) -> BulkRuntime:
+        """The event loop and worker pool reused by bulk calls, created on first use."""
+        with self._runtime_lock:
+            if self._runtime is None:
+                self._runtime = BulkRuntime(self, self.max_concurrency)
+            return self._runtime
+
+    def close(self):
+        """Shuts down the bulk runtime and closes all adapters. Called on exit when used as a context manager."""
+        with self._runtime_lock:
+            if self._runtime is not None:
+                self._runtime.close()
+                self._runtime = None
+        super().close()
+
+    def mount_adapters(self):
+        """Mounts http and https adapters with a connection pool sized for max_concurrency.
+
+        Called on init, call it again if max_concurrency or max_connections_per_host are changed on the instance.
+        """
+        for prefix in ('http://', 'https://'):
+            self.mount(prefix, PooledHTTPAdapter(
+                stats=self.connection_stats,
+                pool_maxsize=self.max_connections_per_host or self.max_concurrency,
+                pool_block=self.max_connections_per_host is not None
+            ))
 
     @staticmethod
-    def format_bulk_request(request_list) -> list:
-        formatted_requests = []
+    def iter_bulk_request(request_list):
+        """Lazily resolves each call in request_list to a RequestObject.
+
+        :param request_list: Iterable of str, list(url, dict), dict(url, **request_kwargs), or RequestObject
+        :return: generator(RequestObject)
+        """
         for call in request_list:
             request_kwargs = {}
 
             if isinstance(call, RequestObject):
-                formatted_requests.append(call)
+                yield call
+                continue
             elif isinstance(call, dict):
                 url = call.pop('url')
                 if not url:
@@ -62,9 +129,11 @@ class GeneralSession(requests.Session):
                 except TypeError:
                     raise ValueError(f'Unable to iterate {call} to set request')
 
-            formatted_requests.append(RequestObject(url=url, request_kwargs=request_kwargs))
+            yield RequestObject(url=url, request_kwargs=request_kwargs)
 
-        return formatted_requests
+    @classmethod
+    def format_bulk_request(cls, request_list) -> list:
+        return list(cls.iter_bulk_request(request_list))
 
     def refresh_auth(self):
         """Use this to add to verify auth is still valid or refresh if out of date.
@@ -73,66 +142,385 @@ class GeneralSession(requests.Session):
         """
         raise NotImplementedError
 
+    def auth_expires_at(self) -> dt:
+        """Override to return when the current auth expires so it is refreshed before a 401 is returned.
+
+        :return: datetime or None if unknown
+        """
+        return None
+
+    def _refresh_auth(self, generation: int):
+        """Calls refresh_auth once no matter how many threads request a refresh at the same time.
+
+        Every request captures _auth_generation before it is sent.
+        The first one to get a 401 refreshes auth and increments the generation, the others wait on the lock and,
+        seeing the generation has changed, retry with the new auth instead of refreshing again.
+
+        :param generation: The value of _auth_generation when the failed request was sent
+        """
+        start = perf_counter()
+        try:
+            with self._auth_lock:
+                if generation == self._auth_generation:
+                    self._auth_refreshing.value = True
+                    try:
+                        self.refresh_auth()
+                    finally:
+                        self._auth_refreshing.value = False
+                    self._auth_generation += 1
+        finally:
+            add_timing('auth', perf_counter() - start)
+
+    def _in_auth_refresh(self) -> bool:
+        """True if called by refresh_auth e.g. a request for a new token made with this session"""
+        return getattr(self._auth_refreshing, 'value', False)
+
+    def _auth_expiring(self) -> bool:
+        if self._in_auth_refresh():
+            return False
+        expires_at = self.auth_expires_at()
+        if expires_at is None or expires_at == self._refreshed_expiry:
+            return False
+        return dt.now(expires_at.tzinfo) + timedelta(seconds=self.auth_refresh_margin) >= expires_at
+
+    def _ensure_auth(self):
+        """Proactively refreshes auth if it expires within auth_refresh_margin seconds."""
+        if self._auth_expiring():
+            expires_at = self.auth_expires_at()
+            generation = self._auth_generation
+            try:
+                self._refresh_auth(generation)
+            except NotImplementedError:
+                pass
+            if self.auth_expires_at() == expires_at:  # Avoid refreshing on every request if the expiry didn't change
+                self._refreshed_expiry = expires_at
+
+    @staticmethod
+    def _error_response(url, request_kwargs, exception) -> requests.Response:
+        """Normalizes an exception raised while making a request to a Response with a 666 status code.
+
+        :param url:
+        :param request_kwargs:
+        :param exception:
+        :return: Response
+        """
+        response = requests.Response()
+        response.url = url
+        response.status_code = 666
+        response.request_kwargs = request_kwargs
+        response._content = str(exception).encode('utf-8')
+        return response
+
+    def _send_request(self, request_call, url, retry=True, **request_kwargs) -> requests.Response:
+        """Makes a single http request, calling refresh_auth and trying once more on a 401.
+
+        :param request_call: The requests.Session method used to make the request.
+        :param url: URL the request will be made to.
+        :return: Response
+        """
+        self._ensure_auth()
+        generation = self._auth_generation
+        response = request_call(url, **request_kwargs)
+        # Fingers crossed the API has proper status codes
+        if response.status_code == 401 and not self._in_auth_refresh():
+            try:
+                self._refresh_auth(generation)
+                if retry:
+                    return self._send_request(request_call, url, retry=False, **request_kwargs)
+            except NotImplementedError:
+                return response
+
+        return response
+
     def _make_request(self, request_call, url, retry=True, **request_kwargs) -> requests.Response:
         """Makes an http request, suppress errors and include content.
 
-        :param session_call: URL the POST request will be made.
+        Failed requests are retried as defined by retry_policy.
+        When called by a bulk worker only a single attempt is made, the worker sets the attempt number and
+        response.retry_delay is set so the retry is scheduled by the bulk engine instead of sleeping in the thread.
+
+        :param request_call: The requests.Session method used to make the request.
+        :param url: URL the request will be made to.
         :return: Response
         """
-        try:
-            response = request_call(url, **request_kwargs)
-            if response.status_code == 401:  # Fingers crossed the API has proper status codes
-                try:
-                    self.refresh_auth()
-                    if retry:
-                        return self._make_request(request_call, url, retry=False, **request_kwargs)
-                except NotImplementedError:
-                    return response
+        method = request_call.__name__.upper()
+        attempt = getattr(self._bulk_attempt, 'value', None)
+        deferred = attempt is not None
+        attempt = attempt or 0
+        instrumentation = self.instrumentation
+        queue_wait = getattr(self._bulk_attempt, 'queue_wait', None) if deferred else None
+
+        while True:
+            exception = None
+            if instrumentation is not None:
+                request_timings = start_timings(queue_wait)
+                start = perf_counter()
+            try:
+                response = self._send_request(request_call, url, retry, **request_kwargs)
+            except Exception as e:
+                exception = e
+                response = self._error_response(url, request_kwargs, e)
+            if instrumentation is not None:
+                stop_timings()
+                self._record(method, url, response, attempt, request_timings, perf_counter() - start, exception)
+
+            delay = self.retry_policy.get_delay(method, attempt, response, exception) if self.retry_policy else None
+            if delay is None:
+                if exception is not None and self.raise_exception:
+                    raise exception
+                return response
+            elif deferred:
+                response.retry_delay = delay
+                return response
 
+            time.sleep(delay)
+            attempt += 1
+
+    def _record(self, method: str, url: str, response, attempt: int, request_timings: dict, total: float,
+                exception: Exception = None):
+        """Splits the time of a request made by _make_request into phases and records it to instrumentation"""
+        elapsed = response.elapsed.total_seconds()  # requests measures from sending the request to the headers
+        if elapsed:
+            request_timings['ttfb'] = max(elapsed - request_timings.get('connect', 0), 0)
+            request_timings['download'] = max(total - elapsed - request_timings.get('auth', 0), 0)
+        request_timings['total'] = total
+        self.instrumentation.record(method, url, response, attempt, request_timings, exception)
+
+    def _bulk_call(self, call, request_obj, attempt: int, queued_at: float = None,
+                   coalesced: tuple = None) -> requests.Response:
+        """Runs in a bulk worker thread. Makes a single attempt of the request, see _make_request
+
+        :param coalesced: tuple(key, shared future) if identical requests are waiting on the response, see coalescer
+        """
+        self._bulk_attempt.value = attempt
+        self._bulk_attempt.queue_wait = None if queued_at is None else perf_counter() - queued_at
+        response = None
+        try:
+            response = call(None, request_obj)
             return response
+        finally:
+            self._bulk_attempt.value = None
+            if coalesced:
+                self.coalescer.release(*coalesced, response)
 
-        except Exception as e:
-            if self.raise_exception:
-                raise
-            else:
-                response = requests.Response()
-                response.url = url
-                response.status_code = 666
-                response.request_kwargs = request_kwargs
-                response._content = str(e).encode('utf-8')
-                return response
+    def progress_bar(self, total: int = None, disable: bool = None):
+        """The progress bar displayed by bulk calls
+
+        :param total: Number of expected updates, None if unknown
+        :param disable: Defaults to disable_progress_bar, always True within progress_bar_disabled
+        :return: tqdm
+        """
+        from colored import fg, style
+        from tqdm import tqdm
+
+        bar_format = '{l_bar}%s{bar}%s| {n_fmt}/{total_fmt} [{elapsed}<{remaining},' \
+                     ' {rate_fmt}{postfix}]' % (fg(self.progress_bar_color), style.RESET)
+        if getattr(self._progress_bar_disabled, 'value', False):
+            disable = True
+        return tqdm(total=total, bar_format=bar_format,
+                    disable=self.disable_progress_bar if disable is None else disable)
+
+    @contextmanager
+    def progress_bar_disabled(self):
+        """Disables the progress bar of calls made by the current thread e.g. a refresh in a background thread"""
+        previous = getattr(self._progress_bar_disabled, 'value', False)
+        self._progress_bar_disabled.value = True
+        try:
+            yield self
+        finally:
+            self._progress_bar_disabled.value = previous
 
     def _bulk(self, call, request_list: list, loop: EventLoop = None, **kwargs) -> list:
-        """Makes multiple GET requests in a ThreadPoolExecutor.
+        """Makes multiple requests in a ThreadPoolExecutor or with aiohttp if async_transport is set.
 
         :param request_list: list(dict(url, params-optional, data-optional, stream-optional)).
         :param max_concurrency: int - Number of post requests that can be made in parallel.
         :param disable_progress: bool - Disable progress bar. Default False
+        :param async_transport: bool - Make the requests with aiohttp instead of threads.
         :param loop: Advanced: pass an event loop
         :return: list(Response)
         """
+        return list(self._bulk_iter(call, request_list, loop, **kwargs))
 
-        async def request_pool(thread_concurrency):
-            bar_format = '{l_bar}%s{bar}%s| {n_fmt}/{total_fmt} [{elapsed}<{remaining},' \
-                         ' {rate_fmt}{postfix}]' % (fg(self.progress_bar_color), style.RESET)
-            with concurrent.futures.ThreadPoolExecutor(max_workers=thread_concurrency) as executor:
-                futures = [
-                    loop.run_in_executor(
-                        executor,
-                        call,
-                        None,
-                        request_obj
-                    ) for request_obj in self.format_bulk_request(request_list)]
-
-                return [await f for f in tqdm(asyncio.as_completed(futures),
-                                              total=len(futures),
-                                              disable=kwargs.get('disable_progress_bar', self.disable_progress_bar),
-                                              bar_format=bar_format)]
+    def _bulk_iter(self, call, request_list, loop: EventLoop = None, with_index: bool = False, **kwargs):
+        """Generator that makes multiple requests, yielding each Response as it completes.
+
+        At most `window` requests are in flight at a time and request_list is consumed lazily,
+        so request_list can be a generator and memory stays constant regardless of the number of requests.
+
+        :param request_list: Any iterable supported by format_bulk_request
+        :param with_index: bool - Yield tuple(index of the request in request_list, Response). Default False
+        :param window: int - Max number of requests in flight. Default max_concurrency
+        :param concurrency_controller: ConcurrencyController - Adjust the requests in flight based on responses
+        :param coalesce_requests: bool - Send identical GET requests once. Default coalesce_requests
+        :param loop: Advanced: pass an event loop
+        :return: generator(Response)
+        """
+        self._ensure_auth()
+        total = len(request_list) if hasattr(request_list, '__len__') else None
+        concurrency = kwargs.get('max_concurrency', self.max_concurrency)
+        if total is not None:
+            concurrency = max(min(total, concurrency), 1)
+
+        runtime = None
+        temporary_loop = False
         if loop is None:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        concurrency = min(len(request_list), kwargs.get('max_concurrency', self.max_concurrency))
-        return loop.run_until_complete(request_pool(concurrency))
+            if self.runtime.acquire():
+                runtime = self.runtime
+                loop = runtime.loop
+            else:
+                loop = asyncio.new_event_loop()
+                temporary_loop = True
+
+        responses = self._request_pool(call, request_list, concurrency, kwargs.get('window', concurrency),
+                                       kwargs.get('async_transport', self.async_transport),
+                                       kwargs.get('concurrency_controller', self.concurrency_controller),
+                                       runtime, kwargs.get('coalesce_requests', self.coalesce_requests))
+        progress_bar = self.progress_bar(total, kwargs.get('disable_progress_bar', self.disable_progress_bar))
+        try:
+            while True:
+                try:
+                    idx, response = loop.run_until_complete(responses.__anext__())
+                except StopAsyncIteration:
+                    return
+                progress_bar.update()
+                yield (idx, response) if with_index else response
+        finally:
+            progress_bar.close()
+            loop.run_until_complete(responses.aclose())
+            if runtime:
+                runtime.release()
+            elif temporary_loop:
+                loop.close()
+
+    async def _request_pool(self, call, request_list, concurrency: int, window: int, async_transport: bool,
+                            controller: ConcurrencyController = None, runtime: BulkRuntime = None,
+                            coalesce: bool = False):
+        """Async generator that runs the requests, yielding tuple(idx, Response) in completion order.
+
+        :param call: The session method used to make each request e.g. self.get
+        :param request_list:
+        :param concurrency: Number of worker threads or connections
+        :param window: Max number of requests in flight
+        :param async_transport: Use aiohttp instead of a ThreadPoolExecutor
+        :param controller: Adjusts the number of requests in flight based on the responses
+        :param runtime: Reuse the worker threads and aiohttp client of the runtime instead of creating new ones
+        :param coalesce: Send identical requests once, see RequestCoalescer
+        """
+        loop = asyncio.get_event_loop()
+        method = call.__name__.upper()
+        if runtime and concurrency > runtime.max_workers:
+            runtime = None  # The runtime pool is too small for this call
+
+        async with AsyncExitStack() as stack:
+            if async_transport:
+                if runtime:
+                    transport = await runtime.transport()
+                else:
+                    transport = await stack.enter_async_context(AsyncTransport(self, concurrency))
+
+                async def request(request_obj, coalesced):
+                    response = None
+                    try:
+                        response = await transport.request(method, request_obj)
+                        return response
+                    finally:
+                        if coalesced:
+                            self.coalescer.release(*coalesced, response)
+
+                def submit(request_obj, attempt=0, coalesced=None):
+                    return asyncio.ensure_future(request(request_obj, coalesced))
+            else:
+                if runtime:
+                    executor = runtime.executor
+                else:
+                    executor = stack.enter_context(concurrent.futures.ThreadPoolExecutor(max_workers=concurrency))
+
+                def submit(request_obj, attempt=0, coalesced=None):
+                    return loop.run_in_executor(executor, self._bulk_call, call, request_obj, attempt, perf_counter(),
+                                                coalesced)
+
+            async def retry_later(request_obj, attempt, delay, coalesced=None):
+                await asyncio.sleep(delay)
+                return await submit(request_obj, attempt, coalesced)
+
+            # key -> concurrent.futures.Future the response of the request is set on, see RequestCoalescer.join
+            memo = MemoryCache(maxsize=self.coalescer.batch_memo_size, ttl=None) if coalesce else None
+            leading = {}  # future -> tuple(key, shared future) of coalesced requests sent by this call
+
+            async def follow(request_obj, key, shared):
+                response = await self.coalescer.wait(shared, loop)
+                if response is None:  # The request failed, send this one
+                    return await send(request_obj, key)
+                return self.coalescer.fan_out(response)
+
+            def send(request_obj, key=None):
+                """Submits the request, unless an identical request is in flight or was already made"""
+                if key is None:
+                    return submit(request_obj)
+
+                shared = memo.get(key)
+                if shared is not None and shared.done() and shared.result() is not None:
+                    future = loop.create_future()
+                    future.set_result(self.coalescer.fan_out(shared.result()))
+                    return future
+                elif shared is None or shared.done():
+                    shared, leader = self.coalescer.join(key, loop, threaded=not async_transport)
+                    if shared is None:  # In flight on an event loop that may not be running
+                        return submit(request_obj)
+                    memo.set(key, shared)
+                    if leader:
+                        future = submit(request_obj, coalesced=(key, shared))
+                        leading[future] = (key, shared)
+                        return future
+                return asyncio.ensure_future(follow(request_obj, key, shared))
+
+            request_iter = enumerate(self.iter_bulk_request(request_list))
+            pending = {}
+            exhausted = False
+            try:
+                while True:
+                    wait_time = controller.wait_time() if controller else 0
+                    limit = min(window, controller.limit or window) if controller else window
+                    while not exhausted and not wait_time and len(pending) < limit:
+                        try:
+                            idx, request_obj = next(request_iter)
+                        except StopIteration:
+                            exhausted = True
+                        else:
+                            key = self.coalescer.key(method, request_obj) if coalesce else None
+                            pending[send(request_obj, key)] = (idx, monotonic(), request_obj, 0, key)
+
+                    if not pending:
+                        if exhausted:
+                            return
+                        await asyncio.sleep(wait_time)
+                        continue
+
+                    done, _ = await asyncio.wait(pending, timeout=wait_time or None,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        idx, started, request_obj, attempt, key = pending.pop(future)
+                        coalesced = leading.pop(future, None)
+                        response = future.result()
+                        if controller and not getattr(response, 'coalesced', False):
+                            controller.on_response(response, monotonic() - started)
+
+                        retry_delay = getattr(response, 'retry_delay', None)
+                        if retry_delay is not None:
+                            # Followers of a coalesced request keep waiting for the retry, see RequestCoalescer.release
+                            retry = asyncio.ensure_future(retry_later(request_obj, attempt + 1, retry_delay, coalesced))
+                            pending[retry] = (idx, monotonic() + retry_delay, request_obj, attempt + 1, key)
+                            if coalesced:
+                                leading[retry] = coalesced
+                            continue
+
+                        yield idx, response
+            finally:
+                for future in pending:
+                    future.cancel()
+                for key, shared in leading.values():  # Followers in other bulk calls send their own request
+                    self.coalescer.release(key, shared)
 
     def get(self, url: str = None, request_object: RequestObject = None, **kwargs):
         if request_object:
@@ -179,9 +567,24 @@ class GeneralSession(requests.Session):
     def bulk_delete(self, request_list: list, loop: EventLoop = None, **kwargs):
         return self._bulk(self.delete, request_list, loop, **kwargs)
 
+    def bulk_iter_get(self, request_list, loop: EventLoop = None, with_index: bool = False, **kwargs):
+        return self._bulk_iter(self.get, request_list, loop, with_index, **kwargs)
+
+    def bulk_iter_put(self, request_list, loop: EventLoop = None, with_index: bool = False, **kwargs):
+        return self._bulk_iter(self.put, request_list, loop, with_index, **kwargs)
+
+    def bulk_iter_patch(self, request_list, loop: EventLoop = None, with_index: bool = False, **kwargs):
+        return self._bulk_iter(self.patch, request_list, loop, with_index, **kwargs)
+
+    def bulk_iter_post(self, request_list, loop: EventLoop = None, with_index: bool = False, **kwargs):
+        return self._bulk_iter(self.post, request_list, loop, with_index, **kwargs)
+
+    def bulk_iter_delete(self, request_list, loop: EventLoop = None, with_index: bool = False, **kwargs):
+        return self._bulk_iter(self.delete, request_list, loop, with_index, **kwargs)
+
 
 class UserSession(GeneralSession):
-    user: User  # Define a class that inherits from UserSession to set a default active user
+    user: User = None  # Define a class that inherits from UserSession to set a default active user
 
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', self.user)
@@ -189,3 +592,6 @@ class UserSession(GeneralSession):
 
     def refresh_auth(self):
         self.headers.update(self.user.authenticate())
+
+    def auth_expires_at(self) -> dt:
+        return self.user.get('auth_expires_at')
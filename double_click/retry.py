@@ -0,0 +1,110 @@
+import asyncio
+import random
+import threading
+
+import requests
+
+from double_click import transport
+from double_click.concurrency import retry_after_seconds
+
+IDEMPOTENT_METHODS = frozenset(['DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT', 'TRACE'])
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, ConnectionError, asyncio.TimeoutError)
+
+
+def retry_exceptions() -> tuple:
+    """RETRY_EXCEPTIONS plus aiohttp connection errors once aiohttp has been imported by async_transport"""
+    if transport.aiohttp is not None:
+        return RETRY_EXCEPTIONS + (transport.aiohttp.ClientConnectionError, )
+    return RETRY_EXCEPTIONS
+
+
+class RetryBudget:
+    """Caps the number of retries across every request made with a RetryPolicy.
+
+    Each request deposits `ratio` of a retry and each retry withdraws one.
+    `min_retries` are always available so low traffic can still retry and
+    no more than `max_balance` retries are saved up by a long run of successful requests.
+    With the defaults at most 20% of requests plus 10 will be retries, preventing a failing API from
+    being hit with max_retries times the traffic.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, max_balance: float = 100):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.max_balance = max_balance
+        self._balance = 0.0
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._balance = min(self._balance + self.ratio, self.max_balance)
+
+    def withdraw(self) -> bool:
+        """Returns True if a retry is available, consuming it."""
+        with self._lock:
+            if self._balance + self.min_retries >= 1:
+                self._balance -= 1
+                return True
+            return False
+
+
+class RetryPolicy:
+    """Decides if and when a request made by a GeneralSession is retried.
+
+    :param max_retries: Max number of retries for a single request
+    :param statuses: Response status codes that are retried
+    :param methods: HTTP verbs that are retried. Defaults to idempotent verbs so a POST or PATCH is not sent twice.
+    :param backoff_factor: Seconds to wait before the first retry, doubling for each following retry
+    :param backoff_max: Max seconds to wait between retries, excluding Retry-After
+    :param jitter: If True, wait a random time between 0 and the backoff to spread out retries from many requests
+    :param respect_retry_after: Wait at least the time in the Retry-After response header
+    :param budget: RetryBudget shared by every request made with this policy. None for no global limit.
+    :param exceptions: Exception types raised while making a request that are retried e.g. connection errors.
+        Defaults to retry_exceptions()
+    """
+
+    def __init__(self, max_retries: int = 3, statuses=RETRY_STATUSES, methods=IDEMPOTENT_METHODS,
+                 backoff_factor: float = 0.5, backoff_max: float = 30, jitter: bool = True,
+                 respect_retry_after: bool = True, budget: RetryBudget = None, exceptions: tuple = None):
+        self.max_retries = max_retries
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+        self.budget = budget
+        self.exceptions = exceptions
+
+    def backoff(self, attempt: int) -> float:
+        backoff = min(self.backoff_factor * (2 ** attempt), self.backoff_max)
+        return random.uniform(0, backoff) if self.jitter else backoff
+
+    def get_delay(self, method: str, attempt: int, response=None, exception: Exception = None):
+        """Returns the seconds to wait before retrying or None if the request should not be retried.
+
+        :param method: HTTP verb of the request e.g. GET
+        :param attempt: Number of retries already made for the request
+        :param response: requests.Response of the attempt
+        :param exception: Exception raised by the attempt, if any
+        :return: float or None
+        """
+        if attempt == 0 and self.budget:
+            self.budget.deposit()
+
+        if attempt >= self.max_retries or method.upper() not in self.methods:
+            return None
+        elif exception is not None:
+            if not isinstance(exception, self.exceptions or retry_exceptions()):
+                return None
+        elif response is None or response.status_code not in self.statuses:
+            return None
+
+        if self.budget and not self.budget.withdraw():
+            return None
+
+        delay = self.backoff(attempt)
+        if self.respect_retry_after and response is not None:
+            delay = max(delay, retry_after_seconds(response))
+        return delay
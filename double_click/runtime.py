@@ -0,0 +1,76 @@
+import asyncio
+import atexit
+import concurrent.futures
+import threading
+import weakref
+
+from double_click.transport import AsyncTransport
+
+_RUNTIMES = weakref.WeakSet()
+
+
+@atexit.register
+def _close_runtimes():
+    """Closes the runtime of any session that wasn't closed so the aiohttp client shuts down cleanly"""
+    for runtime in list(_RUNTIMES):
+        if not runtime._in_use.locked():
+            runtime.close()
+
+
+class BulkRuntime:
+    """The event loop, worker threads, and aiohttp client shared by every bulk call of a GeneralSession.
+
+    Everything is created lazily on first use and reused by the following bulk calls
+    instead of building a new event loop and ThreadPoolExecutor each time.
+    Only one bulk call can use the runtime at a time, see acquire.
+    """
+
+    def __init__(self, session, max_workers: int):
+        self.session = session
+        self.max_workers = max_workers
+        self._loop = None
+        self._executor = None
+        self._transport = None
+        self._in_use = threading.Lock()
+        _RUNTIMES.add(self)
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop
+
+    @property
+    def executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def transport(self) -> AsyncTransport:
+        """Must be awaited on self.loop"""
+        if self._transport is None:
+            self._transport = await AsyncTransport(self.session, self.max_workers).__aenter__()
+        return self._transport
+
+    def acquire(self) -> bool:
+        """Reserve the runtime for a bulk call. Returns False if it is already in use by another bulk call.
+
+        A bulk call made while another one is running, e.g. from another thread or while iterating
+        over bulk_iter_*, uses a temporary event loop instead.
+        """
+        return self._in_use.acquire(blocking=False)
+
+    def release(self):
+        self._in_use.release()
+
+    def close(self):
+        """Shuts down the worker threads, closes the aiohttp client and the event loop."""
+        if self._transport is not None:
+            self.loop.run_until_complete(self._transport.__aexit__(None, None, None))
+            self._transport = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.close()
+        self._loop = None
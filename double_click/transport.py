@@ -0,0 +1,396 @@
+import asyncio
+import os
+import threading
+from datetime import timedelta
+from http.client import HTTPMessage
+from time import perf_counter
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import MockRequest, MockResponse, merge_cookies
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, requote_uri, select_proxy
+
+from double_click.cache import MemoryCache
+from double_click.instrumentation import active_timings
+
+# requests.Request kwargs prepared by AsyncTransport._prepare, requests with any other kwarg are made with requests
+PREPARE_KWARGS = frozenset(['headers', 'files', 'data', 'params', 'auth', 'cookies', 'json'])
+ENVIRONMENT_TTL = 60  # Seconds the proxy and CA bundle env vars read for a host are reused by AsyncTransport
+aiohttp = None  # Slow to import and only needed for async_transport, imported by load_aiohttp on first use
+
+
+def load_aiohttp():
+    """Imports aiohttp on first use. Returns None if it isn't installed."""
+    global aiohttp
+    if aiohttp is None:
+        try:
+            import aiohttp as aiohttp_module
+        except ImportError:
+            return None
+        aiohttp = aiohttp_module
+    return aiohttp
+
+
+class ConnectionStats:
+    """Thread safe counters of the connections used by a GeneralSession.
+
+    created: New connections, each one requiring a TCP (and TLS) handshake
+    reused: Requests sent over a connection that was already open
+    discarded: Connections closed because the pool was full
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self._lock = threading.Lock()
+
+    def increment(self, counter: str, value: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + value)
+
+    def as_dict(self) -> dict:
+        return dict(created=self.created, reused=self.reused, discarded=self.discarded)
+
+
+def _counting_pool_cls(pool_cls, stats: ConnectionStats):
+    """Creates a urllib3 connection pool class that records connection reuse to stats."""
+
+    class CountingConnection(pool_cls.ConnectionCls):
+        def connect(self):
+            stats.increment('created')
+            timings = active_timings()
+            if timings is None:
+                return super().connect()
+
+            start = perf_counter()
+            try:
+                return super().connect()
+            finally:
+                timings['connect'] = timings.get('connect', 0) + perf_counter() - start
+
+    class CountingPool(pool_cls):
+        ConnectionCls = CountingConnection
+
+        def _make_request(self, conn, *args, **kwargs):
+            if getattr(conn, 'sock', None) is not None:
+                stats.increment('reused')
+            return super()._make_request(conn, *args, **kwargs)
+
+        def _put_conn(self, conn):
+            if self.pool is not None and self.pool.full():
+                stats.increment('discarded')
+            return super()._put_conn(conn)
+
+    return CountingPool
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with connection pools sized by GeneralSession and that records connection reuse.
+
+    pool_maxsize is the number of keep-alive connections kept open per host.
+    If pool_block is True no more than pool_maxsize connections will be made to a host at once.
+    """
+
+    def __init__(self, stats: ConnectionStats = None, **kwargs):
+        self.connection_stats = stats or ConnectionStats()
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: _counting_pool_cls(pool_cls, self.connection_stats)
+            for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+    def __setstate__(self, state):
+        self.connection_stats = ConnectionStats()
+        super().__setstate__(state)
+
+
+class RequiresRequests(Exception):
+    """Raised by AsyncTransport for a request aiohttp can't make the way requests would"""
+
+
+class AsyncTransport:
+    """Non-blocking transport used by GeneralSession.bulk_* when async_transport is enabled.
+
+    Requests are made with aiohttp on the event loop instead of a ThreadPoolExecutor.
+    Every aiohttp response is normalized to a requests.Response so callers get the same objects back regardless of
+    the transport being used.
+    """
+
+    def __init__(self, session, concurrency: int):
+        if load_aiohttp() is None:
+            raise ImportError('async_transport requires aiohttp. Install it with: pip3 install double_click[async]')
+
+        self.session = session
+        self.concurrency = concurrency
+        self._client = None
+        self._semaphore = None
+        self._ssl_contexts = {}
+        self._environment = MemoryCache(maxsize=256, ttl=ENVIRONMENT_TTL)
+
+    async def __aenter__(self):
+        stats = self.session.connection_stats
+
+        async def on_connection_create_start(session, context, params):
+            context.connect_started = perf_counter()
+
+        async def on_connection_create_end(session, context, params):
+            stats.increment('created')
+            timings = context.trace_request_ctx  # Set by _send if the session is instrumented
+            if timings is not None:
+                timings['connect'] = timings.get('connect', 0) + perf_counter() - context.connect_started
+
+        async def on_connection_reuseconn(*args):
+            stats.increment('reused')
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._client = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency,
+                                           limit_per_host=self.session.max_connections_per_host or 0),
+            trace_configs=[trace_config],
+            cookie_jar=aiohttp.DummyCookieJar()  # Cookies are set on the prepared request by the requests session
+        )
+        return self
+
+    async def __aexit__(self, *args):
+        await self._client.close()
+
+    def _prepare(self, method: str, url: str, request_kwargs: dict):
+        """Prepares the request with requests.Session.prepare_request, the same way the thread transport does.
+
+        Session headers, params, auth, and cookies (scoped to the url) are merged and normalized by requests
+        so aiohttp sends the prepared url, headers, and body as is.
+
+        :param method:
+        :param url:
+        :param request_kwargs:
+        :return: tuple(PreparedRequest, dict(send settings))
+        :raises RequiresRequests: If aiohttp can't send it the way requests would
+        """
+        request_kwargs = dict(request_kwargs)
+        settings = dict(allow_redirects=request_kwargs.pop('allow_redirects', method != 'HEAD'),
+                        timeout=request_kwargs.pop('timeout', None))
+        proxies = request_kwargs.pop('proxies', None) or {}
+        verify = request_kwargs.pop('verify', None)
+        stream = request_kwargs.pop('stream', None)
+        if request_kwargs.keys() - PREPARE_KWARGS:
+            raise RequiresRequests('kwargs')  # e.g. cert or hooks
+
+        prepared = self.session.prepare_request(requests.Request(method, url, **request_kwargs))
+        settings.update(self._environment_settings(prepared.url, proxies, verify), stream=stream)
+        if settings['cert'] or any(prepared.hooks.values()):  # e.g. HTTPDigestAuth responds to a 401 with a hook
+            raise RequiresRequests('cert or hooks')
+        settings['proxy'] = select_proxy(prepared.url, settings['proxies'])
+        if settings['proxy'] and not settings['proxy'].startswith('http://'):  # aiohttp only supports http proxies
+            raise RequiresRequests('proxy')
+        return prepared, settings
+
+    def _environment_settings(self, url: str, proxies: dict, verify) -> dict:
+        """requests.Session.merge_environment_settings, cached by host for ENVIRONMENT_TTL seconds.
+
+        Reading the proxy env vars takes about as long as sending a request so it isn't done for every request.
+        """
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.netloc, tuple(sorted(proxies.items())), verify)
+        settings = self._environment.get(key)
+        if settings is None:
+            settings = self.session.merge_environment_settings(url, dict(proxies), None, verify, None)
+            self._environment.set(key, settings)
+        return dict(settings, proxies=dict(settings['proxies']))  # Copied, _redirect updates the proxies
+
+    def _aiohttp_kwargs(self, prepared: requests.PreparedRequest, settings: dict) -> dict:
+        """Translate the prepared request and send settings to their aiohttp equivalent.
+
+        :param prepared:
+        :param settings: See _prepare
+        :return: dict
+        """
+        body = prepared.body.encode('utf-8') if isinstance(prepared.body, str) else prepared.body
+        aiohttp_kwargs = dict(headers=dict(prepared.headers), data=body, allow_redirects=False,
+                              skip_auto_headers=('Content-Type', ), proxy=settings['proxy'] or None)
+
+        verify = settings['verify']
+        if verify is False:
+            aiohttp_kwargs['ssl'] = False
+        elif isinstance(verify, str) and prepared.url.startswith('https:'):  # A CA bundle e.g. REQUESTS_CA_BUNDLE
+            aiohttp_kwargs['ssl'] = self._ssl_context(verify)
+
+        timeout = settings['timeout']
+        if isinstance(timeout, tuple):
+            aiohttp_kwargs['timeout'] = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        elif timeout is not None:
+            aiohttp_kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+
+        return aiohttp_kwargs
+
+    def _ssl_context(self, verify: str):
+        """Returns the ssl context verifying with the CA bundle or directory of certificates, loaded once per path"""
+        context = self._ssl_contexts.get(verify)
+        if context is None:
+            import ssl
+
+            context = ssl.create_default_context(
+                **({'capath': verify} if os.path.isdir(verify) else {'cafile': verify})
+            )
+            self._ssl_contexts[verify] = context
+        return context
+
+    def _redirect(self, prepared: requests.PreparedRequest, response: requests.Response,
+                  settings: dict) -> requests.PreparedRequest:
+        """The request to follow the redirect response with, see requests.Session.resolve_redirects"""
+        url = self.session.get_redirect_target(response)
+        if url.startswith('//'):
+            url = f'{urlparse(response.url).scheme}:{url}'
+        url = requote_uri(url) if urlparse(url).netloc else urljoin(response.url, requote_uri(url))
+
+        prepared = prepared.copy()
+        prepared.url = url
+        self.session.rebuild_method(prepared, response)
+        if response.status_code not in (307, 308):
+            for header in ('Content-Length', 'Content-Type', 'Transfer-Encoding'):
+                prepared.headers.pop(header, None)
+            prepared.body = None
+
+        prepared.headers.pop('Cookie', None)  # Cookies are scoped to the new url
+        prepared.prepare_cookies(merge_cookies(prepared._cookies, self.session.cookies))
+        settings['proxies'] = self.session.rebuild_proxies(prepared, settings['proxies'])
+        settings['proxy'] = select_proxy(prepared.url, settings['proxies'])
+        self.session.rebuild_auth(prepared, response)  # Strips Authorization if the host changed
+        return prepared
+
+    async def _send_prepared(self, prepared: requests.PreparedRequest, settings: dict,
+                             timings: dict = None) -> requests.Response:
+        start = perf_counter()
+        import yarl  # An aiohttp dependency
+
+        aiohttp_kwargs = self._aiohttp_kwargs(prepared, settings)
+        if timings is not None:
+            aiohttp_kwargs['trace_request_ctx'] = timings
+        url = yarl.URL(prepared.url, encoded=True)  # Already quoted by requests
+        async with self._client.request(prepared.method, url, **aiohttp_kwargs) as client_response:
+            headers_received = perf_counter()
+            response = requests.Response()
+            response.status_code = client_response.status
+            response.reason = client_response.reason
+            response.url = prepared.url
+            response.request = prepared
+            response.headers = CaseInsensitiveDict(client_response.headers)
+            response.encoding = get_encoding_from_headers(response.headers)
+            response._content = await client_response.read()
+            response._content_consumed = True  # iter_content and iter_lines read _content instead of raw
+            response.elapsed = timedelta(seconds=perf_counter() - start)
+
+            set_cookies = HTTPMessage()
+            for value in client_response.headers.getall('Set-Cookie', ()):
+                set_cookies.add_header('Set-Cookie', value)
+            cookie_request, cookie_response = MockRequest(prepared), MockResponse(set_cookies)
+            response.cookies.extract_cookies(cookie_response, cookie_request)
+            self.session.cookies.extract_cookies(cookie_response, cookie_request)  # Like requests.Session.send
+
+            if timings is not None:
+                timings['ttfb'] = max(headers_received - start - timings.get('connect', 0), 0)
+                timings['download'] = perf_counter() - headers_received
+            return response
+
+    async def _send(self, method: str, url: str, request_kwargs: dict, timings: dict = None) -> requests.Response:
+        """
+        :param method:
+        :param url:
+        :param request_kwargs:
+        :param timings: If set, the queue_wait, connect, ttfb, and download phases are added to it
+        :return: Response
+        """
+        start = perf_counter()
+        async with self._semaphore:
+            if timings is not None:
+                timings['queue_wait'] = timings.get('queue_wait', 0) + perf_counter() - start
+            prepared, settings = self._prepare(method, url, request_kwargs)
+            response = await self._send_prepared(prepared, settings, timings)
+
+            history = []
+            while settings['allow_redirects'] and response.is_redirect:
+                if len(history) >= self.session.max_redirects:
+                    raise requests.TooManyRedirects(f'Exceeded {self.session.max_redirects} redirects.',
+                                                    response=response)
+                history.append(response)
+                prepared = self._redirect(prepared, response, settings)
+                response = await self._send_prepared(prepared, settings, timings)
+            response.history = history
+            response.elapsed = timedelta(seconds=perf_counter() - start)
+            return response
+
+    async def _run_auth(self, func, *args, timings: dict = None):
+        """Runs a blocking auth method of the session in a worker thread, adding the time to timings['auth']"""
+        start = perf_counter()
+        try:
+            return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+        finally:
+            if timings is not None:
+                timings['auth'] = timings.get('auth', 0) + perf_counter() - start
+
+    async def _send_request(self, method: str, request_obj, retry: bool = True,
+                            timings: dict = None) -> requests.Response:
+        if self.session._auth_expiring():
+            await self._run_auth(self.session._ensure_auth, timings=timings)
+
+        generation = self.session._auth_generation
+        response = await self._send(method, request_obj.url, request_obj.request_kwargs, timings)
+        if response.status_code == 401 and not self.session._in_auth_refresh():
+            try:
+                await self._run_auth(self.session._refresh_auth, generation, timings=timings)
+                if retry:
+                    return await self._send_request(method, request_obj, retry=False, timings=timings)
+            except NotImplementedError:
+                return response
+
+        return response
+
+    async def request(self, method: str, request_obj, retry: bool = True) -> requests.Response:
+        """Async counterpart of GeneralSession._make_request
+
+        Requests aiohttp can't make the same way requests would, e.g. with a client cert or response hooks,
+        are made by the session in a worker thread instead.
+
+        :param method: HTTP verb e.g. GET
+        :param request_obj: RequestObject
+        :param retry: Retry once after calling session.refresh_auth on a 401
+        :return: Response
+        """
+        retry_policy = self.session.retry_policy
+        instrumentation = self.session.instrumentation
+        attempt = 0
+        while True:
+            exception = None
+            timings = None if instrumentation is None else {}
+            start = perf_counter()
+            try:
+                response = await self._send_request(method, request_obj, retry, timings)
+            except RequiresRequests:
+                async with self._semaphore:
+                    call = getattr(self.session, method.lower())
+                    return await asyncio.get_event_loop().run_in_executor(None, call, None, request_obj)
+            except Exception as e:
+                exception = e
+                response = self.session._error_response(request_obj.url, request_obj.request_kwargs, e)
+            if instrumentation is not None:
+                timings['total'] = perf_counter() - start
+                instrumentation.record(method, request_obj.url, response, attempt, timings, exception)
+
+            delay = retry_policy.get_delay(method, attempt, response, exception) if retry_policy else None
+            if delay is None:
+                if exception is not None and self.session.raise_exception:
+                    raise exception
+                return response
+
+            await asyncio.sleep(delay)
+            attempt += 1
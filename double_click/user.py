@@ -1,4 +1,5 @@
 class User:
+    max_cached_results = 1024
 
     def __init__(self, username: str = None, access: dict = {}, **kwargs):
         """
@@ -29,6 +30,8 @@ class User:
     def access(self, access_dict):
         if isinstance(access_dict, dict):
             self._access_dict = access_dict
+            self._access_index = {}  # path -> everything granted at the path, see _auth_set
+            self._access_results = {}  # (requires, match_all, kwargs) -> has_access result
         else:
             raise ValueError(f'access attribute must be of type dict not {type(access_dict)}')
 
@@ -63,38 +66,125 @@ class User:
                     so if user permissions look like dict(service=dict(svc_name=dict(list(roles), list(permissions))))
                     the service name must be provided when passing a list of permissions, not just the permissions.
 
+        Results are cached until access is reassigned, changes made to the access dict in place are not picked up.
+
         :param requires: list of roles that a user must have one or more of represented
         :param match_all: (default: False) If true a user must have all roles passed in required_roles
         :return: bool
         """
-        access = self.access
-        if kwargs is None and requires is None:
+        if requires is not None:
+            requires = tuple(requires)
+        try:
+            result_key = (requires, match_all, frozenset(kwargs.items()))
+            result = self._access_results.get(result_key)
+        except TypeError:  # Unhashable requires or kwargs, don't cache
+            result_key = result = None
+        if result is not None:
+            return result
+
+        result = self._evaluate(requires, match_all, self._auth_set(kwargs))
+        if result_key is not None:
+            if len(self._access_results) >= self.max_cached_results:
+                self._access_results.clear()
+            self._access_results[result_key] = result
+        return result
+
+    def evaluate_many(self, checks) -> list:
+        """Evaluates has_access for many checks at once e.g. when building a click group with hundreds of commands.
+
+        Checks with the same kwargs share a single walk of access.
+        If has_access is overridden, has_access is called for each check instead.
+
+        :param checks: list of (requires, match_all, kwargs) tuples or dicts of has_access kwargs
+        :return: list(bool) in the same order as checks
+        """
+        normalized_checks = []
+        for check in checks:
+            if isinstance(check, dict):
+                kwargs = dict(check)
+                check = (kwargs.pop('requires', None), kwargs.pop('match_all', False), kwargs)
+            normalized_checks.append(check)
+        checks = normalized_checks
+
+        if type(self).has_access is not User.has_access:
+            return [self.has_access(requires, match_all, **kwargs) for requires, match_all, kwargs in checks]
+
+        auth_sets = {}
+        results = []
+        for requires, match_all, kwargs in checks:
+            try:
+                path_key = frozenset(kwargs.items())
+                if path_key not in auth_sets:
+                    auth_sets[path_key] = self._auth_set(kwargs)
+                auth_set = auth_sets[path_key]
+            except TypeError:  # Unhashable kwarg value
+                auth_set = self._auth_set(kwargs)
+            results.append(self._evaluate(None if requires is None else tuple(requires), match_all, auth_set))
+        return results
+
+    def hide_many(self, checks) -> list:
+        """The negation of evaluate_many, for click.command(hidden=...)
+
+        :param checks: list of (requires, match_all, kwargs) tuples or dicts of has_access kwargs
+        :return: list(bool) in the same order as checks
+        """
+        return [not result for result in self.evaluate_many(checks)]
+
+    @staticmethod
+    def _evaluate(requires: tuple, match_all: bool, auth_set) -> bool:
+        if auth_set is None:
+            return False
+        elif requires is None:
             return True
 
-        while kwargs:  # Walk user access by mapping kwarg keys to current depth of user.access
-            key_hits = [key for key in kwargs.keys() if key in access.keys()]
+        check = all if match_all else any
+        try:
+            return check(authed in auth_set for authed in requires)
+        except TypeError:  # Unhashable value in requires
+            return check(authed in tuple(auth_set) for authed in requires)
+
+    def _auth_set(self, kwargs: dict):
+        """Walks access by mapping kwarg keys to the current depth of access without modifying kwargs.
+
+        :param kwargs:
+        :return: A set of the keys and list items at the end of the path, or None if the path doesn't exist
+        """
+        access = self.access
+        path = []
+        remaining = dict(kwargs)
+        while remaining:
+            key_hits = [key for key in remaining.keys() if key in access.keys()]
             if len(key_hits) == 0:
-                return False
+                return None
             elif len(key_hits) == 1:
-                access = access[key_hits[0]].get(kwargs.pop(key_hits[0]))
+                value = remaining.pop(key_hits[0])
+                access = access[key_hits[0]].get(value)
                 if access is None:
-                    return False
+                    return None
+                path.append((key_hits[0], value))
             else:
                 raise ValueError(f'Invalid access structure. {self.username} hit on multiple keys {key_hits}')
 
-        auth_list = [k for k in access.keys()]
+        path = tuple(path)
+        try:
+            return self._access_index[path]
+        except KeyError:
+            pass
+        except TypeError:  # Unhashable kwarg value, compile without caching
+            path = None
 
-        if requires is None:
-            return True
-
-        for _, value in access.items():
+        auth_list = list(access.keys())
+        for value in access.values():
             if isinstance(value, list):
                 auth_list += value
-
-        if match_all:
-            return all(authed in auth_list for authed in requires)
-        else:
-            return any(authed in auth_list for authed in requires)
+        try:
+            auth_set = frozenset(auth_list)
+        except TypeError:  # Unhashable roles or permissions
+            auth_set = tuple(auth_list)
+
+        if path is not None:
+            self._access_index[path] = auth_set
+        return auth_set
 
     def authenticate(self, **kwargs) -> dict:
         raise NotImplementedError
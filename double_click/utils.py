@@ -1,29 +1,138 @@
-import asyncio
 import json
 import os
-import pkg_resources
 import re
 import subprocess
 import sys
 from configparser import ConfigParser
-from dateutil.parser import parse as date_parse
 from datetime import datetime as dt, timedelta
 from typing import NewType
 from pathlib import Path
 
-try:
-    from distutils import sysconfig_get_python_lib as get_python_lib
-except ImportError:
-    # There doesn't seem to be any consistency on this import so have to handle both import types.
-    from distutils.sysconfig import get_python_lib
+CLI_THEME = float(os.getenv('CLI_THEME', 1057.4342))
+URL_PATTERN = re.compile(r'^(http:\/\/|https:\/\/)([a-z0-9]+([\-\.]{1}[a-z0-9]+)*\.[a-z]{2,5}|localhost|'
+                         r'[0-9]{1,3}(\.[0-9]{1,3}){3})(:[0-9]{1,5})?(\/.*)?$')
 
-from mdv.markdownviewer import main as mdv
-from requests import Response
 
-CLI_THEME = float(os.getenv('CLI_THEME', 1057.4342))
-URL_PATTERN = re.compile('^(http:\/\/|https:\/\/)[a-z0-9]+([\-\.]{1}[a-z0-9]+)*\.[a-z]{2,5}(:[0-9]{1,5})?(\/.*)?$')
-EventLoop = NewType('Eventloop', asyncio.windows_events._WindowsSelectorEventLoop) \
-        if sys.platform == 'win32' else NewType('Eventloop', asyncio.unix_events._UnixSelectorEventLoop)
+def __getattr__(name: str):
+    if name == 'EventLoop':  # asyncio is only imported when EventLoop is, by double_click.request
+        import asyncio
+
+        global EventLoop
+        EventLoop = NewType('Eventloop', asyncio.windows_events._WindowsSelectorEventLoop) \
+            if sys.platform == 'win32' else NewType('Eventloop', asyncio.unix_events._UnixSelectorEventLoop)
+        return EventLoop
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def set_terminal_size_env():
+    """Sets the width and LINES env vars used by mdv to the terminal size, if they aren't already set."""
+    if 'width' in os.environ and 'LINES' in os.environ:
+        return
+
+    try:
+        width, height = os.get_terminal_size()
+    except OSError:
+        width, height = 0, 0
+    os.environ.setdefault('width', str(width))
+    os.environ.setdefault('LINES', str(height))
+
+
+def mdv(*args, **kwargs) -> str:
+    """Renders markdown for the terminal with mdv.markdownviewer.main, importing mdv on first use."""
+    set_terminal_size_env()  # mdv reads the terminal size when it is imported
+    from mdv.markdownviewer import main
+
+    return main(*args, **kwargs)
+
+
+MD_CACHE_SIZE = 128
+MD_CACHE_DIR = '~/.double_click/md_cache'
+MD_DISK_CACHE_SIZE = 64  # Max files in MD_CACHE_DIR, the least recently used are removed when exceeded
+MD_DISK_CACHE = os.getenv('DOUBLE_CLICK_MD_DISK_CACHE', '').lower() in ('1', 'true', 'yes')
+_md_memo = None
+
+
+def render_md(md: str, disk_cache: bool = None, **kwargs) -> str:
+    """Renders markdown with mdv, memoized by the markdown, mdv kwargs, and terminal width.
+
+    Rendered output is kept in an in-process LRU cache of MD_CACHE_SIZE entries.
+    With disk_cache it is also saved under MD_CACHE_DIR so static messages render instantly in the next process.
+    The MD_DISK_CACHE_SIZE least recently used files are kept. Only pass disk_cache for static messages.
+
+    :param md: Markdown str
+    :param disk_cache: Defaults to MD_DISK_CACHE, set with the DOUBLE_CLICK_MD_DISK_CACHE env var
+    :param kwargs: Passed to mdv. Default: theme=CLI_THEME, c_theme=CLI_THEME
+    :return: str
+    """
+    global _md_memo
+    from double_click.cache import FileCache, MemoryCache
+
+    kwargs.setdefault('theme', CLI_THEME)
+    kwargs.setdefault('c_theme', CLI_THEME)
+    set_terminal_size_env()
+    key = (md, tuple(sorted(kwargs.items())), os.environ['width'])
+    if _md_memo is None:
+        _md_memo = MemoryCache(maxsize=MD_CACHE_SIZE, ttl=None)
+    rendered = _md_memo.get(key)
+    if rendered is not None:
+        return rendered
+
+    disk_cache = MD_DISK_CACHE if disk_cache is None else disk_cache
+    if disk_cache:
+        import hashlib
+
+        cache_key = os.path.join(MD_CACHE_DIR, hashlib.sha256(repr(key).encode('utf-8')).hexdigest())
+        rendered = FileCache().get(cache_key)
+        if rendered is not None:
+            FileCache().touch(cache_key)
+    if rendered is None:
+        rendered = mdv(md=md, **kwargs)
+        if disk_cache:
+            FileCache().set(cache_key, rendered)
+            _evict_md_disk_cache()
+
+    _md_memo.set(key, rendered)
+    return rendered
+
+
+def _evict_md_disk_cache():
+    """Removes the least recently used files in MD_CACHE_DIR past MD_DISK_CACHE_SIZE"""
+    cache_dir = os.path.expanduser(MD_CACHE_DIR)
+    try:
+        entries = [entry for entry in os.scandir(cache_dir) if entry.is_file()]
+    except FileNotFoundError:
+        return
+    if len(entries) <= MD_DISK_CACHE_SIZE:
+        return
+
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - MD_DISK_CACHE_SIZE]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:  # Removed by another process
+            pass
+
+
+def get_python_lib() -> str:
+    try:
+        from distutils import sysconfig_get_python_lib as _get_python_lib
+    except ImportError:
+        try:
+            # There doesn't seem to be any consistency on this import so have to handle both import types.
+            from distutils.sysconfig import get_python_lib as _get_python_lib
+        except ImportError:  # distutils was removed in python 3.12
+            import sysconfig
+            return sysconfig.get_paths()['purelib']
+    return _get_python_lib()
+
+
+def date_parse(timestamp: str) -> dt:
+    try:
+        return dt.fromisoformat(timestamp)
+    except ValueError:
+        from dateutil.parser import parse
+
+        return parse(timestamp)
 
 
 def is_valid_url(url: str, raises=True) -> bool:
@@ -55,47 +164,141 @@ class Config(ConfigParser):
             self.write(fout)
 
 
-def echo(output):
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+def _write_stream(chunks, end: str = '\n'):
+    """Writes an iterable of str to stdout, buffering small chunks into writes of about STREAM_BUFFER_SIZE"""
+    buffer, size = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= STREAM_BUFFER_SIZE:
+            sys.stdout.write(''.join(buffer))
+            buffer, size = [], 0
+    buffer.append(end)
+    sys.stdout.write(''.join(buffer))
+    sys.stdout.flush()
+
+
+def _iter_ndjson(output):
+    encoder = json.JSONEncoder(separators=(',', ':'), default=str)
+    for item in output:
+        yield encoder.encode(item)
+        yield '\n'
+
+
+def _iter_text(response):
+    """Decodes the body of response as it's received.
+
+    response.apparent_encoding isn't used for bodies without a charset, it reads the whole body into memory.
+    """
+    import codecs
+
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')('replace')
+    for chunk in response.iter_content(STREAM_BUFFER_SIZE):
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+def _echo_stream(output, ndjson: bool = False):
+    """echo for stream=True, see echo"""
+    requests = sys.modules.get('requests')
+    indent = 2
+    if requests is not None and isinstance(output, requests.Response):
+        content_type = output.headers.get('Content-Type', '')
+        if output.status_code in [200, 201] and 'json' in content_type and 'ndjson' not in content_type:
+            try:
+                output, indent = output.json(), 4
+            except ValueError:
+                _write_stream(_iter_text(output))
+                return
+        elif output.status_code in [200, 201] or (output.status_code is not None and output.status_code < 500
+                                                   and output.status_code not in [401, 403, 404]):
+            _write_stream(_iter_text(output))  # Nothing to reformat, pass the body through as it's received
+            return
+
+    if ndjson and not isinstance(output, (dict, str, bytes)) and hasattr(output, '__iter__'):
+        _write_stream(_iter_ndjson(output), end='')
+    elif isinstance(output, (dict, list)):
+        _write_stream(json.JSONEncoder(indent=indent, default=str).iterencode(output))
+    else:
+        echo(output)
+
+
+def echo(output, stream: bool = False, ndjson: bool = False):
     """Formats and displays the provided output
 
+    With stream=True output is written to stdout as it is encoded instead of being built into a single str first,
+    keeping memory flat for large output:
+        dict and list output is encoded incrementally, values json can't encode are written with str()
+        A Response with a non-JSON body e.g. text or NDJSON is passed through in chunks using Response.iter_content.
+        Make the request with stream=True so the body isn't loaded into memory before echo is called.
+
     :param output: Supports int, str, dict, list(dict()), list, & Response
+    :param stream: Write the output incrementally
+    :param ndjson: Write each item of a list (or any iterable e.g. a generator) as a single line of compact JSON.
+        Implies stream.
     :return:
     """
+    if stream or ndjson:
+        _echo_stream(output, ndjson)
+        return
+
+    requests = sys.modules.get('requests')  # If requests was never imported output can't be a Response
+
     if isinstance(output, dict) or isinstance(output, list):
         try:
             print(json.dumps(output, indent=2))
         except (TypeError, ValueError):
             print(str(output))
-    elif isinstance(output, Response):
+    elif requests is not None and isinstance(output, requests.Response):
         if output.status_code is None:
             err = f"#Server Error \n" \
                 f"> {output.url} - {output.text}"
-            print(mdv(md=err, theme=CLI_THEME, c_theme=CLI_THEME))
+            print(render_md(err, disk_cache=False))
         elif output.status_code in [200, 201]:
             try:
                 print(json.dumps(output.json(), indent=4))
             except json.decoder.JSONDecodeError:
                 print(output.text)
         elif output.status_code in [401, 403]:
-            print(mdv(md="#You do not have permissions to view this resource", theme=CLI_THEME, c_theme=CLI_THEME))
+            print(render_md("#You do not have permissions to view this resource"))
         elif output.status_code == 404:
-            print(mdv(md="#Unable to find the requested resource", theme=CLI_THEME, c_theme=CLI_THEME))
+            print(render_md("#Unable to find the requested resource"))
         elif output.status_code >= 500:
             err = f"#Server Error \n" \
                 f"> {output.url} - {output.status_code} - {output.text}"
-            print(mdv(md=err, theme=CLI_THEME, c_theme=CLI_THEME))
+            print(render_md(err, disk_cache=False))  # Specific to the response, only memoized in process
         else:
             print(output.text)
     elif isinstance(output, str) and output.startswith('#'):
-        print(mdv(md=output, theme=CLI_THEME, c_theme=CLI_THEME))
+        print(render_md(output))
     else:
         print(str(output))
 
 
+def echo_table(row_list, headers: list, sample_size: int = None, max_width: int = None):
+    """Displays a table with aligned columns, writing each row as it is formatted.
+
+    Use instead of echo(generate_md_table_str(...)) for large tables, rendering a markdown table with mdv
+    takes seconds for thousands of rows.
+    See double_click.markdown.iter_table_lines for the parameters.
+    """
+    from double_click.markdown import iter_table_lines
+
+    _write_stream((f'{line}\n' for line in iter_table_lines(row_list, headers, sample_size, max_width)), end='')
+
+
 def display_version(package_name: str, md_file: str = 'VERSION.md'):
     md_path = Path(os.path.join(os.path.join(get_python_lib(), package_name), md_file))
     if os.path.exists(md_path):
-        echo(mdv(filename=md_path))
+        with open(md_path) as f:
+            echo(render_md(f.read(), theme=None, c_theme=None))
 
 
 def update_package(package_name: str, force: bool = False, pip_args: list = []):
@@ -126,7 +329,8 @@ def update_package(package_name: str, force: bool = False, pip_args: list = []):
     return f"{stdout}\n{stderr}" if stdout else stderr
 
 
-def ensure_latest_package(package_name: str, pip_args=[], md_file: str = 'VERSION.md', update_pkg_pip_args=[]):
+def ensure_latest_package(package_name: str, pip_args=[], md_file: str = 'VERSION.md', update_pkg_pip_args=[],
+                          background: bool = True, config_path: str = '~/.double_click/package_versions.ini'):
     """Toss this in main to perform a check that the user is always running latest
 
     pip_args will be passed as a list to add things like trusted-host or extra-index-url.
@@ -135,45 +339,54 @@ def ensure_latest_package(package_name: str, pip_args=[], md_file: str = 'VERSIO
         pip_args = ['--extra-index-url', 'https://artifactory.com/api/pypi/eg/simple',
                     '--trusted-host', 'artifactory.com']
 
+    At most once an hour the latest version is looked up from the package index (see double_click.versions)
+    and saved to config_path. By default the lookup runs in a detached process so the command never waits on it,
+    a newer version is installed the next time the command is run.
+
     :param package_name:
     :param pip_args:
     :param md_file: Display this file if the package was updated
     :param update_pkg_pip_args: pip args pass to update_package on out of date package e.g. --extra-index-url
+    :param background: Set to False to look up the latest version before the command runs
+    :param config_path: Where the latest version and when it was last checked are saved
     :return:
     """
-    config = Config('~/.double_click/package_versions.ini')
+    from double_click import versions
+
+    current_version = versions.installed_version(package_name)
+    if current_version is None:
+        # This should only occur during testing
+        echo(f'{package_name} not found')
+        return
 
+    update_pkg_pip_args = update_pkg_pip_args if update_pkg_pip_args else pip_args
+    config = Config(config_path)
     if not config.has_section(package_name):
         config.add_section(package_name)
-        last_checked = None
-    else:
-        last_checked = config.get(package_name, 'last_checked')
 
+    last_checked = config.get(package_name, 'last_checked', fallback=None)
     if not last_checked or date_parse(last_checked) < dt.utcnow() - timedelta(hours=1):
-        try:
-            latest_version = None
-            current_version = pkg_resources.get_distribution(package_name).version
-            version_output = update_package(f'{package_name}==DoesNotExist', pip_args=update_pkg_pip_args)
-            version_output = [line for line in version_output.split('\n') if 'DoesNotExist (from versions:' in line]
-            if version_output:
-                versions = re.findall(r'([0-9][^,)]+)', version_output[0])
-                latest_version = versions[-1]
-
-            if latest_version and current_version != latest_version:
-                update_pkg_pip_args = update_pkg_pip_args if update_pkg_pip_args else pip_args
-                update_package(package_name, pip_args=update_pkg_pip_args)
-                config.set(package_name, 'last_checked', str(dt.utcnow()))
-                update_msg = f'#An update to {package_name} was retrieved that prevented your command from running.'
-                if md_file:
-                    display_version(package_name, md_file)
-                    update_msg += f'\nPlease review changes and re-run your command.'
-                else:
-                    update_msg += f'\nPlease re-run your command.'
-                echo(update_msg)
-                sys.exit(0)
-        except pkg_resources.DistributionNotFound:
-            # This should only occur during testing
-            echo(f'{package_name} not found')
-
-        config.set(package_name, 'last_checked', str(dt.utcnow()))
+        index_urls = versions.index_urls_from_pip_args(update_pkg_pip_args)
+        if background:
+            # Saved now so commands run while the lookup is in progress don't start another one
+            config.set(package_name, 'last_checked', str(dt.utcnow()))
+            config.save()
+            versions.save_latest_version_in_background(package_name, config.path, index_urls)
+        else:
+            versions.save_latest_version(package_name, config.path, index_urls)
+            config = Config(config_path)
+
+    latest_version = config.get(package_name, 'latest_version', fallback=None)
+    if latest_version and versions.is_newer(latest_version, current_version):
+        update_package(package_name, pip_args=update_pkg_pip_args)
+        # Don't update again until the next look up, even if the install failed
+        config.remove_option(package_name, 'latest_version')
         config.save()
+        update_msg = f'#An update to {package_name} was retrieved that prevented your command from running.'
+        if md_file:
+            display_version(package_name, md_file)
+            update_msg += f'\nPlease review changes and re-run your command.'
+        else:
+            update_msg += f'\nPlease re-run your command.'
+        echo(update_msg)
+        sys.exit(0)
@@ -0,0 +1,183 @@
+"""Looks up the latest version of a package from a package index without running pip.
+
+Used by double_click.utils.ensure_latest_package. Can also be run as a detached process that saves the result:
+    python -m double_click.versions <package_name> <config_path> [<index_url> ...]
+"""
+import os
+import re
+import sys
+from datetime import datetime as dt
+from html.parser import HTMLParser
+from pathlib import Path
+
+DEFAULT_INDEX_URL = 'https://pypi.org/simple'
+SIMPLE_JSON = 'application/vnd.pypi.simple.v1+json'
+RELEASE_PATTERN = re.compile(r'^[0-9]+(\.[0-9]+)*$')
+DIST_EXTENSIONS = ('.whl', '.tar.gz', '.zip', '.tar.bz2', '.egg')
+
+
+def normalize_name(package_name: str) -> str:
+    """PEP 503 name normalization e.g. Double_Click -> double-click"""
+    return re.sub(r'[-_.]+', '-', package_name).lower()
+
+
+def index_urls_from_pip_args(pip_args: list) -> list:
+    """Returns the index URLs pip would use with pip_args, including PIP_INDEX_URL and PIP_EXTRA_INDEX_URL
+
+    :param pip_args: e.g. ['--extra-index-url', 'https://artifactory.com/api/pypi/eg/simple']
+    :return: list(str)
+    """
+    index_url = os.getenv('PIP_INDEX_URL', DEFAULT_INDEX_URL)
+    extra_index_urls = os.getenv('PIP_EXTRA_INDEX_URL', '').split()
+    args = iter(pip_args or [])
+    for arg in args:
+        option, _, value = arg.partition('=')
+        if option not in ('-i', '--index-url', '--extra-index-url'):
+            continue
+
+        value = value or next(args, '')
+        if option == '--extra-index-url':
+            extra_index_urls.append(value)
+        else:
+            index_url = value
+    return [index_url] + extra_index_urls
+
+
+def release_key(version: str) -> tuple:
+    return tuple(int(part) for part in version.split('.'))
+
+
+def is_newer(version: str, current_version: str) -> bool:
+    """True if version is a later release than current_version.
+
+    A current_version that isn't a plain release e.g. 1.2.0.dev1 is only compared by equality.
+    """
+    if RELEASE_PATTERN.match(version) and RELEASE_PATTERN.match(current_version):
+        return release_key(version) > release_key(current_version)
+    return version != current_version
+
+
+class _LinkParser(HTMLParser):
+    """Collects the text of every link on a PEP 503 simple index page"""
+
+    def __init__(self):
+        super().__init__()
+        self.filenames = []
+        self._in_link = False
+
+    def handle_starttag(self, tag, attrs):
+        self._in_link = tag == 'a' and 'data-yanked' not in dict(attrs)
+
+    def handle_endtag(self, tag):
+        self._in_link = False
+
+    def handle_data(self, data):
+        if self._in_link:
+            self.filenames.append(data.strip())
+
+
+def versions_from_filenames(package_name: str, filenames: list) -> set:
+    """Parses the release versions from the distribution file names of a package, ignoring pre and dev releases"""
+    prefix = normalize_name(package_name)
+    versions = set()
+    for filename in filenames:
+        extension = next((extension for extension in DIST_EXTENSIONS if filename.endswith(extension)), None)
+        if extension is None:
+            continue
+
+        stem = filename[:-len(extension)]
+        if extension in ('.whl', '.egg'):  # name-version-python-abi-platform, the name can't contain -
+            name, _, version = stem.partition('-')
+            version = version.split('-')[0]
+        else:  # name-version, the name may contain -
+            name, _, version = stem.rpartition('-')
+        if normalize_name(name) == prefix and RELEASE_PATTERN.match(version):
+            versions.add(version)
+    return versions
+
+
+def latest_version(package_name: str, index_urls: list = None, timeout: float = 5):
+    """Returns the latest release version of the package across index_urls from the simple API (PEP 503/691)
+
+    :param package_name:
+    :param index_urls: Defaults to PyPI
+    :param timeout: Seconds to wait for each index
+    :return: str or None if the package wasn't found
+    """
+    import requests
+
+    versions = set()
+    for index_url in index_urls or [DEFAULT_INDEX_URL]:
+        url = f'{index_url.rstrip("/")}/{normalize_name(package_name)}/'
+        try:
+            response = requests.get(url, timeout=timeout, headers={'Accept': f'{SIMPLE_JSON}, text/html;q=0.1'})
+        except requests.RequestException:
+            continue
+        if response.status_code != 200:
+            continue
+
+        if response.headers.get('Content-Type', '').startswith(SIMPLE_JSON):
+            content = response.json()
+            filenames = [file['filename'] for file in content.get('files', []) if not file.get('yanked')]
+        else:
+            parser = _LinkParser()
+            parser.feed(response.text)
+            filenames = parser.filenames
+        versions.update(versions_from_filenames(package_name, filenames))
+
+    return max(versions, key=release_key) if versions else None
+
+
+def save_latest_version(package_name: str, config_path: str, index_urls: list = None):
+    """Looks up the latest version of package_name and saves it to the package_versions.ini at config_path"""
+    from double_click.utils import Config
+
+    version = latest_version(package_name, index_urls)
+    config = Config(config_path)  # Read after the lookup so changes made in the meantime aren't lost
+    if not config.has_section(package_name):
+        config.add_section(package_name)
+    if version:
+        config.set(package_name, 'latest_version', version)
+    config.set(package_name, 'last_checked', str(dt.utcnow()))
+    config.save()
+
+
+def save_latest_version_in_background(package_name: str, config_path: str, index_urls: list = None):
+    """Runs save_latest_version in a detached process so the current command never waits on the index
+
+    :return: subprocess.Popen
+    """
+    import subprocess
+
+    kwargs = dict(stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, close_fds=True)
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+
+    package_root = str(Path(__file__).parent.parent)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_root, os.getenv('PYTHONPATH')])))
+    args = [sys.executable, '-m', 'double_click.versions', package_name, str(config_path)] + list(index_urls or [])
+    return subprocess.Popen(args, env=env, **kwargs)
+
+
+def installed_version(package_name: str):
+    """Returns the installed version of package_name or None if it isn't installed"""
+    try:
+        from importlib import metadata
+    except ImportError:  # python 3.7
+        import pkg_resources
+
+        try:
+            return pkg_resources.get_distribution(package_name).version
+        except pkg_resources.DistributionNotFound:
+            return None
+
+    try:
+        return metadata.version(package_name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+if __name__ == '__main__':
+    save_latest_version(sys.argv[1], sys.argv[2], sys.argv[3:])
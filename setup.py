@@ -11,6 +11,7 @@ setup(
     url='https://github.com/WillNye/double_click',
     python_requires='>=3.7',
     install_requires=install_requires,
+    extras_require={'async': ['aiohttp<4.0.0,>=3.6.0'], 'numpy': ['numpy>=1.17']},
     packages=find_namespace_packages(include=['double_click', 'double_click.*']),
     package_data={'': ['*.md']},
     include_package_data=True,
@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Responds to every request with a JSON echo of the request.
+
+    A few query params change the response:
+        status: The status code to respond with
+        delay: Seconds to sleep before responding
+    Custom responses can be registered on StandInServer.routes as path -> callable(handler) -> (status, headers, body)
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # Headers and body are separate writes, avoid delayed ACK stalls on keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self.server.record(self.command, url.path)
+
+        if url.path in self.server.routes:
+            status, headers, content = self.server.routes[url.path](self, query, body)
+        else:
+            if 'delay' in query:
+                time.sleep(float(query['delay']))
+            status = int(query.get('status', 200))
+            headers = {'Content-Type': 'application/json'}
+            content = dict(method=self.command, path=url.path, query=query, body=body.decode('utf-8'))
+
+        if not isinstance(content, bytes):
+            content = json.dumps(content).encode('utf-8')
+
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_PUT = do_PATCH = do_POST = do_DELETE = do_HEAD = _respond
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Local in-process HTTP server used in place of a real API for tests and benchmarks.
+
+    Example:
+        with StandInServer() as server:
+            GeneralSession().get(f'{server.url}/users', params=dict(page=1))
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, routes: dict = None):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.routes = routes or {}
+        self.hits = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def handle_error(self, request, client_address):
+        pass  # Clients closing connections mid request is expected when a bulk iterator is closed early
+
+    def record(self, method: str, path: str):
+        with self._lock:
+            self.hits.append((method, path))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from collections import OrderedDict
+
+from double_click.cache import FileCache
+
+CONTENT = [dict(id=idx, name=f'device_{idx}', commands=['on', 'off'], score=idx / 2, parent=None) for idx in range(10)]
+
+
+class TestFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.key = os.path.join(self.cache_dir.name, 'nested', 'devices')
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_round_trip(self):
+        for cache in (FileCache(), FileCache(compress_level=1)):
+            cache.set(self.key, CONTENT)
+            self.assertEqual(cache.get(self.key, ttl=1), CONTENT)
+        self.assertEqual(os.listdir(os.path.dirname(self.key)), ['devices'])  # No temp files left behind
+
+        FileCache().set(self.key, [OrderedDict(id=1)])  # Not supported by marshal, falls back to json
+        self.assertEqual(FileCache().get(self.key), [dict(id=1)])
+
+    def test_ttl(self):
+        cache = FileCache()
+        self.assertIsNone(cache.get(self.key, ttl=1))
+        cache.set(self.key, CONTENT)
+        self.assertEqual(cache.get(self.key, ttl=1), CONTENT)
+
+        two_minutes_ago = time.time() - 120
+        os.utime(self.key, (two_minutes_ago, two_minutes_ago))
+        self.assertIsNone(cache.get(self.key, ttl=1))
+        self.assertEqual(cache.get(self.key, ttl=3), CONTENT)
+        self.assertEqual(cache.get(self.key), CONTENT)
+
+    def test_legacy_format(self):
+        os.makedirs(os.path.dirname(self.key))
+        with open(self.key, 'w') as f:
+            f.write(json.dumps(CONTENT, indent=2))
+        self.assertEqual(FileCache().get(self.key, ttl=1), CONTENT)
+
+        with open(self.key, 'w') as f:
+            f.write('{"truncated": ')
+        self.assertIsNone(FileCache().get(self.key, ttl=1))
+
+    def test_index(self):
+        cache = FileCache(compress_level=1)
+        cache.set(self.key, CONTENT + [dict(id=3, name='replaced')], index_key='id')
+        with cache.index(self.key, ttl=1) as index:
+            self.assertEqual(index.identifiers(), list(range(10)))
+            self.assertEqual(index.get(4), CONTENT[4])
+            self.assertEqual(index.get(3), dict(id=3, name='replaced'))
+            self.assertIsNone(index.get('4'))
+
+        two_minutes_ago = time.time() - 120
+        os.utime(self.key, (two_minutes_ago, two_minutes_ago))
+        self.assertIsNone(cache.index(self.key, ttl=1))
+        self.assertIsNotNone(cache.index(self.key, ttl=3))
+
+        cache.set(self.key, CONTENT)  # The index belongs to the replaced cache
+        self.assertIsNone(cache.index(self.key))
+        cache.set(self.key, CONTENT + [dict(id=None)], index_key='id')
+        self.assertIsNone(cache.index(self.key))
+        self.assertEqual(os.listdir(os.path.dirname(self.key)), ['devices'])
+
+    def test_lock(self):
+        cache = FileCache()
+        self.assertTrue(cache.lock(self.key))
+        self.assertFalse(cache.lock(self.key))
+        cache.unlock(self.key)
+        self.assertTrue(cache.lock(self.key))
+
+        lock_path = f'{self.key}.lock'
+        twenty_minutes_ago = time.time() - 1200
+        os.utime(lock_path, (twenty_minutes_ago, twenty_minutes_ago))  # Abandoned lock
+        self.assertTrue(cache.lock(self.key))
+        self.assertFalse(cache.lock(self.key))
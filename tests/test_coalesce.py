@@ -0,0 +1,90 @@
+import threading
+import unittest
+
+from double_click.coalesce import RequestCoalescer
+from double_click.request import GeneralSession
+from double_click.retry import RetryPolicy
+from double_click.transport import load_aiohttp
+from tests.server import StandInServer
+
+
+class TestRequestCoalescer(unittest.TestCase):
+
+    def test_key(self):
+        session = GeneralSession()
+        coalescer = RequestCoalescer()
+        get, other_get = session.iter_bulk_request([dict(url='https://a.io/x', params=dict(page=1)),
+                                                    dict(url='https://a.io/x', params=dict(page=2))])
+        self.assertEqual(coalescer.key('GET', get), coalescer.key('GET', get))
+        self.assertNotEqual(coalescer.key('GET', get), coalescer.key('GET', other_get))
+        self.assertIsNone(coalescer.key('POST', get))
+        stream, = session.iter_bulk_request([dict(url='https://a.io/x', stream=True)])
+        self.assertIsNone(coalescer.key('GET', stream))
+
+
+class TestCoalesceRequests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer().__enter__()
+        self.session = GeneralSession(disable_progress_bar=True, coalesce_requests=True, max_concurrency=5)
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+
+    def request_list(self, copies: int = 10, **params) -> list:
+        return [dict(url=f'{self.server.url}/item/{idx % 3}', params=params) for idx in range(copies * 3)]
+
+    def test_bulk_get(self):
+        responses = self.session.bulk_get(self.request_list(delay=0.05))
+        self.assertEqual(len(self.server.hits), 3)
+        self.assertEqual(self.session.coalescer.as_dict(), dict(hits=27, misses=3))
+        for idx, response in self.session.bulk_iter_get(self.request_list(), with_index=True):
+            self.assertEqual(response.json()['path'], f'/item/{idx % 3}')
+        self.assertEqual(sum(getattr(response, 'coalesced', False) for response in responses), 27)
+
+    def test_bulk_post(self):
+        self.session.bulk_post(self.request_list(copies=2))
+        self.assertEqual(len(self.server.hits), 6)
+        self.assertEqual(self.session.coalescer.as_dict(), dict(hits=0, misses=0))
+
+    def test_disabled(self):
+        self.session.bulk_get(self.request_list(copies=2), coalesce_requests=False)
+        self.assertEqual(len(self.server.hits), 6)
+
+    def test_failed_request(self):
+        responses = self.session.bulk_get([dict(url=f'{self.server.url}/item', params=dict(status=500))
+                                           for _ in range(4)])
+        self.assertEqual([response.status_code for response in responses], [500] * 4)
+
+    def test_retried_request(self):
+        def unavailable_once(handler, query, body):
+            if len(self.server.hits) == 1:
+                return 503, {}, b''
+            return 200, {'Content-Type': 'application/json'}, b'{"path": "/flaky"}'
+
+        self.server.routes['/flaky'] = unavailable_once
+        self.session.retry_policy = RetryPolicy(backoff_factor=0.2, jitter=False)
+        responses = self.session.bulk_get([dict(url=f'{self.server.url}/flaky') for _ in range(10)])
+        self.assertEqual([response.status_code for response in responses], [200] * 10)
+        self.assertEqual(len(self.server.hits), 2)
+        self.assertEqual(self.session.coalescer.as_dict(), dict(hits=9, misses=1))
+
+    def test_concurrent_bulk_calls(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.session.bulk_get(self.request_list(delay=0.2))))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(self.server.hits), 3)
+        self.assertEqual(self.session.coalescer.hits, 57)
+
+    @unittest.skipIf(load_aiohttp() is None, 'aiohttp is not installed')
+    def test_async_transport(self):
+        responses = self.session.bulk_get(self.request_list(delay=0.05), async_transport=True)
+        self.assertEqual(len(self.server.hits), 3)
+        self.assertEqual(len(responses), 30)
+        self.assertEqual(sorted(response.json()['path'] for response in responses),
+                         sorted(f'/item/{idx % 3}' for idx in range(30)))
@@ -0,0 +1,54 @@
+import unittest
+
+import requests
+
+from double_click.concurrency import AIMDConcurrency, ConcurrencyController, retry_after_seconds
+from double_click.request import GeneralSession
+from tests.server import StandInServer
+
+
+def make_response(status_code: int, headers: dict = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return response
+
+
+class TestConcurrencyController(unittest.TestCase):
+
+    def test_retry_after(self):
+        self.assertEqual(retry_after_seconds(make_response(429, {'Retry-After': '3'})), 3)
+        self.assertEqual(retry_after_seconds(make_response(429, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})), 0)
+        self.assertEqual(retry_after_seconds(make_response(200)), 0)
+
+        controller = ConcurrencyController()
+        controller.on_response(make_response(503, {'Retry-After': '30'}), 0.1)
+        self.assertGreater(controller.wait_time(), 29)
+        self.assertIsNone(controller.limit)
+
+    def test_aimd(self):
+        controller = AIMDConcurrency(initial=4, max_limit=6)
+        for _ in range(4):
+            controller.on_response(make_response(200), 0.1)
+        self.assertEqual(controller.limit, 5)
+        for _ in range(20):
+            controller.on_response(make_response(200), 0.1)
+        self.assertEqual(controller.limit, 6)  # Capped at max_limit
+
+        controller.on_response(make_response(429), 0.1)
+        self.assertEqual(controller.limit, 3)
+        controller.on_response(make_response(502), 0.1)
+        self.assertEqual(controller.limit, 3)  # Only one decrease per smoothed latency
+        self.assertGreater(controller.throughput, 0)
+
+    def test_bulk_with_controller(self):
+        with StandInServer() as server:
+            controller = AIMDConcurrency(initial=2, max_limit=20)
+            basic_session = GeneralSession(disable_progress_bar=True, concurrency_controller=controller)
+            responses = basic_session.bulk_get([f'{server.url}/item'] * 200)
+            self.assertEqual(len(responses), 200)
+            self.assertGreater(controller.limit, 2)
+
+            responses = basic_session.bulk_get([f'{server.url}/item?status=429'] * 20)
+            self.assertEqual(len(responses), 20)
+            self.assertLess(controller.limit, 20)
@@ -0,0 +1,26 @@
+import json
+import subprocess
+import sys
+import unittest
+
+HEAVY_MODULES = ['aiohttp', 'colored', 'dateutil', 'distutils', 'markdown', 'mdv', 'numpy', 'pkg_resources',
+                 'pygments', 'sqlite3', 'tqdm']
+
+
+def imported_modules(statement: str) -> set:
+    """Runs statement in a new interpreter and returns the top level modules it imported"""
+    code = f'import sys, json; {statement}; print(json.dumps(sorted(sys.modules)))'
+    output = subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.PIPE).stdout
+    return {module.split('.')[0] for module in json.loads(output)}
+
+
+class TestImports(unittest.TestCase):
+
+    def test_import_is_lazy(self):
+        modules = imported_modules('import double_click')
+        self.assertEqual([module for module in HEAVY_MODULES + ['requests', 'asyncio'] if module in modules], [])
+
+    def test_heavy_modules_not_imported(self):
+        statement = 'from double_click import display_version, echo, GeneralSession, Model, User'
+        modules = imported_modules(statement)
+        self.assertEqual([module for module in HEAVY_MODULES if module in modules], [])
@@ -0,0 +1,118 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from double_click.instrumentation import Histogram, Instrumentation
+from double_click.request import GeneralSession, UserSession
+from double_click.transport import load_aiohttp
+from tests.server import StandInServer
+from tests.test_request import TokenUser, token_server
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = Histogram()
+        for ms in range(1, 1001):
+            histogram.add(ms / 1000)
+        stats = histogram.as_dict()
+        self.assertEqual(stats['count'], 1000)
+        self.assertEqual(stats['max'], 1.0)
+        for percent in (50, 95, 99):
+            self.assertAlmostEqual(stats[f'p{percent}'], percent / 100, delta=percent / 100 * 0.03)
+        self.assertEqual(Histogram().percentile(99), 0.0)
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        self.instrumentation = Instrumentation(callbacks=[self.events.append])
+        self.server = StandInServer().__enter__()
+        self.host = self.server.url.split('://')[1]
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+
+    def summary(self, method: str = 'GET') -> dict:
+        return next(stats for stats in self.instrumentation.summary()['requests']
+                    if stats['host'] == self.host and stats['method'] == method)
+
+    def test_request(self):
+        session = GeneralSession(instrumentation=self.instrumentation)
+        for _ in range(3):
+            response = session.get(f'{self.server.url}/item')
+        response.json()
+        session.get(f'{self.server.url}/item', params=dict(status=404))
+
+        self.assertEqual(len(self.events), 4)
+        self.assertEqual([event.status_code for event in self.events], [200, 200, 200, 404])
+        self.assertIn('connect', self.events[0].timings)
+        self.assertNotIn('connect', self.events[1].timings)  # Reused the connection
+        for event in self.events:
+            self.assertEqual(event.method, 'GET')
+            self.assertEqual(event.host, self.host)
+            self.assertLessEqual(event.timings['ttfb'] + event.timings['download'], event.timings['total'])
+
+        stats = self.summary()
+        self.assertEqual(stats['count'], 4)
+        self.assertEqual(stats['statuses'], {'200': 3, '404': 1})
+        self.assertEqual(stats['phases']['total']['count'], 4)
+        self.assertEqual(stats['phases']['json_decode']['count'], 1)
+        self.assertLessEqual(stats['phases']['total']['p50'], stats['phases']['total']['p99'])
+
+    def test_bulk(self):
+        session = GeneralSession(instrumentation=self.instrumentation, disable_progress_bar=True, max_concurrency=2)
+        session.bulk_post([dict(url=f'{self.server.url}/item', json=dict(idx=idx)) for idx in range(10)])
+        stats = self.summary('POST')
+        self.assertEqual(stats['count'], 10)
+        self.assertEqual(stats['phases']['queue_wait']['count'], 10)
+        self.assertLessEqual(stats['phases']['connect']['count'], 2)
+
+    def test_error(self):
+        session = GeneralSession(instrumentation=self.instrumentation)
+        session.get('http://127.0.0.1:1/down')
+        self.assertEqual(self.events[0].status_code, 666)
+        self.assertIsNotNone(self.events[0].exception)
+        self.assertNotIn('ttfb', self.events[0].timings)
+
+    def test_auth(self):
+        user = TokenUser(username='TestUser')
+        with token_server(user) as server:
+            user_session = UserSession(user=user, instrumentation=self.instrumentation)
+            user_session.headers.update({'Authorization': 'Bearer expired'})
+            self.assertEqual(user_session.get(f'{server.url}/secure').status_code, 200)
+        self.assertGreaterEqual(self.events[0].timings['auth'], 0.1)
+        self.assertGreaterEqual(self.events[0].timings['total'], self.events[0].timings['auth'])
+
+    @unittest.skipIf(load_aiohttp() is None, 'aiohttp is not installed')
+    def test_async_transport(self):
+        session = GeneralSession(instrumentation=self.instrumentation, disable_progress_bar=True,
+                                 async_transport=True)
+        responses = session.bulk_get([f'{self.server.url}/item'] * 10)
+        responses[0].json()
+        stats = self.summary()
+        self.assertEqual(stats['count'], 10)
+        for phase in ('queue_wait', 'connect', 'ttfb', 'download', 'total', 'json_decode'):
+            self.assertIn(phase, stats['phases'])
+
+    def test_export(self):
+        GeneralSession(instrumentation=self.instrumentation).get(f'{self.server.url}/item')
+        with tempfile.TemporaryDirectory() as export_dir:
+            path = os.path.join(export_dir, 'metrics.json')
+            self.instrumentation.export(path)
+            with open(path) as f:
+                self.assertEqual(json.loads(f.read()), self.instrumentation.summary())
+
+    def test_export_at_exit(self):
+        with tempfile.TemporaryDirectory() as export_dir:
+            path = os.path.join(export_dir, 'metrics.json')
+            script = 'import sys; from double_click.instrumentation import Instrumentation; ' \
+                     'from double_click.request import GeneralSession; ' \
+                     'GeneralSession(instrumentation=Instrumentation(export_path=sys.argv[1])).get(sys.argv[2])'
+            subprocess.run([sys.executable, '-c', script, path, f'{self.server.url}/item'], check=True)
+            with open(path) as f:
+                self.assertEqual(json.loads(f.read())['requests'][0]['count'], 1)
@@ -0,0 +1,47 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from double_click.markdown import generate_md_table_str, generate_table_str, iter_table_lines
+from double_click.utils import echo_table
+
+HEADERS = ['name', 'room', 'brightness']
+ROWS = [[f'device_{idx}', f'room_{idx % 3}', idx * 10] for idx in range(12)]
+
+
+class TestTable(unittest.TestCase):
+
+    def test_generate_md_table_str(self):
+        self.assertEqual(generate_md_table_str([[1, 'a']], ['id', 'name']),
+                         '\n\n| Id | Name | \n| --- | --- | \n| 1 | a | \n\n')
+
+    def test_alignment(self):
+        lines = generate_table_str(ROWS, HEADERS, max_width=0).splitlines()
+        self.assertEqual(lines[0], '| Name      | Room   | Brightness |')
+        self.assertEqual(lines[1], '| --------- | ------ | ---------- |')
+        self.assertEqual(lines[2], '| device_0  | room_0 |          0 |')
+        self.assertEqual(lines[-1], '| device_11 | room_2 |        110 |')
+        self.assertEqual(len(lines), len(ROWS) + 2)
+
+    def test_truncate(self):
+        rows = [['a' * 100, 'short', 'multi\nline']]
+        lines = list(iter_table_lines(rows, ['long', 'b', 'c'], max_width=40))
+        self.assertTrue(all(len(line) == 40 for line in lines))
+        self.assertEqual(lines[2], '| aaaaaaaaaaaaaa… | short | multi line |')
+
+    def test_stream(self):
+        consumed = []
+
+        def rows():
+            for row in ROWS:
+                consumed.append(row)
+                yield row
+
+        lines = iter_table_lines(rows(), HEADERS, sample_size=2, max_width=0)
+        self.assertEqual(next(lines), '| Name     | Room   | Brightness |')  # Widths from the first 2 rows
+        self.assertEqual(len(consumed), 2)
+        self.assertEqual(list(lines)[-1], '| device_… | room_2 |        110 |')
+
+        with redirect_stdout(io.StringIO()) as stdout:
+            echo_table(rows(), HEADERS, sample_size=2, max_width=0)
+        self.assertEqual(stdout.getvalue(), generate_table_str(ROWS, HEADERS, sample_size=2, max_width=0))
@@ -0,0 +1,344 @@
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stderr
+from unittest import mock
+
+from double_click.cache import FileCache, MemoryCache
+from double_click import models
+from double_click.models import Model, ModelCollection
+from double_click.pagination import CursorPaginator, PageNumberPaginator
+from double_click.request import GeneralSession
+from tests.server import StandInServer
+
+DEVICES = [dict(id=idx, name=f'device_{idx}') for idx in range(95)]
+
+
+def paginated(handler, query, body, page_size=10):
+    page = int(query.get('page', 1))
+    return 200, {}, dict(count=len(DEVICES), results=DEVICES[(page - 1) * page_size:page * page_size])
+
+
+def cursor_paginated(handler, query, body, page_size=10):
+    cursor = int(query.get('cursor', 0))
+    next_cursor = cursor + page_size if cursor + page_size < len(DEVICES) else None
+    return 200, {}, dict(next=next_cursor, results=DEVICES[cursor:cursor + page_size])
+
+
+def versioned(handler, query, body, etag='"v1"'):
+    if handler.headers.get('If-None-Match') == etag:
+        return 304, {'ETag': etag}, b''
+    status, headers, content = paginated(handler, query, body)
+    return status, {'ETag': etag}, content
+
+
+def delta(handler, query, body):
+    if 'updated_since' not in query:
+        return paginated(handler, query, body)
+    changes = [dict(id=3, name='device_3', room='kitchen'), dict(id=4, name='device_4', is_deleted=True),
+               dict(id=95, name='device_95')]
+    return 200, {}, dict(count=len(changes), results=changes)
+
+
+class SmartDevice(Model):
+    _obj_identifier = 'name'
+    _paginator = PageNumberPaginator(window=3)
+
+
+class CursorDevice(SmartDevice):
+    _paginator = CursorPaginator(cursor_param='cursor')
+
+
+class ProcessDevice(SmartDevice):
+    """Refreshed in a detached process, which imports it from this module"""
+    _ttl = 1
+    _max_stale = 10
+
+
+class TestModel(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(routes={'/devices': paginated, '/cursor': cursor_paginated,
+                                             '/versioned': versioned, '/delta': delta}).__enter__()
+        self.session = GeneralSession(disable_progress_bar=True)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.__exit__()
+
+    def test_page_number_pagination(self):
+        devices = SmartDevice.objects_all(url=f'{self.server.url}/devices', session=self.session)
+        self.assertEqual([device.id for device in devices], list(range(95)))
+        self.assertEqual(len(self.server.hits), 10)  # No pages past the count are requested
+
+    def test_cursor_pagination(self):
+        devices = CursorDevice.objects_all(url=f'{self.server.url}/cursor', session=self.session)
+        self.assertEqual([device.id for device in devices], list(range(95)))
+
+    def test_objects_iter(self):
+        devices = SmartDevice.objects_iter(url=f'{self.server.url}/devices', session=self.session)
+        self.assertEqual(next(devices).name, 'device_0')
+        self.assertEqual([device.id for device in devices], list(range(1, 95)))
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            class CachedDevice(SmartDevice):
+                _cache_key = os.path.join(cache_dir, 'devices')
+                _memo = None
+
+            devices = CachedDevice.objects_all(url=f'{self.server.url}/devices', session=self.session)
+            self.assertEqual(len(devices), 95)
+            self.assertEqual(len(self.server.hits), 10)
+
+            devices = CachedDevice.objects_all(url=f'{self.server.url}/devices', session=self.session)
+            self.assertEqual([device.id for device in devices], list(range(95)))
+            self.assertEqual(len(self.server.hits), 10)  # Served from the cache
+
+            kwargs = dict(url=f'{self.server.url}/devices', session=self.session)
+            with mock.patch.object(FileCache, 'get', side_effect=AssertionError('Full cache loaded')):
+                self.assertEqual(CachedDevice.objects_get('device_42', **kwargs).id, 42)
+                self.assertEqual(CachedDevice.objects_get('missing', **kwargs).as_dict, {})
+                self.assertEqual(CachedDevice.objects_identifier(**kwargs), [device['name'] for device in DEVICES])
+            self.assertEqual(len(self.server.hits), 10)
+
+    def test_stale_while_revalidate(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            class StaleDevice(SmartDevice):
+                _cache_key = os.path.join(cache_dir, 'devices')
+                _memo = None
+                _ttl = 1
+                _max_stale = 10
+
+            kwargs = dict(url=f'{self.server.url}/devices', session=self.session)
+            stale_content = [dict(id=0, name='stale')]
+
+            def set_cache(minutes_old):
+                FileCache().set(StaleDevice._cache_key, stale_content)
+                modified = time.time() - minutes_old * 60
+                os.utime(StaleDevice._cache_key, (modified, modified))
+
+            set_cache(minutes_old=5)
+            FileCache().lock(StaleDevice._cache_key)  # Another process is refreshing the cache
+            self.assertEqual([device.name for device in StaleDevice.objects_all(**kwargs)], ['stale'])
+            FileCache().unlock(StaleDevice._cache_key)
+
+            self.assertEqual([device.name for device in StaleDevice.objects_all(**kwargs)], ['stale'])
+            for thread in threading.enumerate():
+                if thread.name == 'double_click-refresh-StaleDevice':
+                    thread.join()
+            self.assertEqual(len(self.server.hits), 10)
+            self.assertEqual(len(StaleDevice.objects_all(**kwargs)), 95)
+            self.assertFalse(os.path.exists(f'{StaleDevice._cache_key}.lock'))
+
+            set_cache(minutes_old=20)  # Past _max_stale, blocks on refresh
+            self.assertEqual(len(StaleDevice.objects_all(**kwargs)), 95)
+            self.assertEqual(len(self.server.hits), 20)
+
+    def test_stale_while_revalidate_memo(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            class StaleDevice(SmartDevice):
+                _cache_key = os.path.join(cache_dir, 'devices')
+                _ttl = 1
+                _max_stale = 10
+                _refresh_process = False
+
+            session = GeneralSession(disable_progress_bar=False)
+            kwargs = dict(url=f'{self.server.url}/devices', session=session)
+            FileCache().set(StaleDevice._cache_key, [dict(id=0, name='stale')])
+            modified = time.time() - 5 * 60
+            os.utime(StaleDevice._cache_key, (modified, modified))
+
+            with redirect_stderr(io.StringIO()) as stderr:
+                self.assertEqual([device.name for device in StaleDevice.objects_all(**kwargs)], ['stale'])
+                for thread in threading.enumerate():
+                    if thread.name == 'double_click-refresh-StaleDevice':
+                        thread.join()
+            self.assertEqual(stderr.getvalue(), '')  # No progress bar from the background refresh
+            self.assertEqual(len(StaleDevice.objects_all(**kwargs)), 95)
+            self.assertEqual(len(self.server.hits), 10)
+
+    def test_stale_while_revalidate_process(self):
+        def keyed(handler, query, body):
+            if handler.headers.get('X-Api-Key') != 'key':
+                return 401, {}, b''
+            return paginated(handler, query, body)
+
+        self.server.routes['/keyed'] = keyed
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(ProcessDevice, '_cache_key', os.path.join(cache_dir, 'devices')):
+            self.session.headers['X-Api-Key'] = 'key'
+            kwargs = dict(url=f'{self.server.url}/keyed', session=self.session)
+            FileCache().set(ProcessDevice._cache_key, [dict(id=0, name='stale')])
+            modified = time.time() - 5 * 60
+            os.utime(ProcessDevice._cache_key, (modified, modified))
+
+            self.assertEqual([device.name for device in ProcessDevice.objects_all(**kwargs)], ['stale'])
+            self.assertFalse([thread for thread in threading.enumerate()
+                              if thread.name == 'double_click-refresh-ProcessDevice'])
+            for _ in range(200):  # The detached process releases the lock once the cache is refreshed
+                if not os.path.exists(f'{ProcessDevice._cache_key}.lock'):
+                    break
+                time.sleep(0.05)
+            self.assertEqual(len(self.server.hits), 10)
+            self.assertEqual(len(ProcessDevice.objects_all(**kwargs)), 95)
+
+    def test_conditional_refresh(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            class VersionedDevice(SmartDevice):
+                _cache_key = os.path.join(cache_dir, 'devices')
+                _memo = None
+
+            model = VersionedDevice(url=f'{self.server.url}/versioned', session=self.session)
+            self.assertEqual(len(model.refresh()), 95)
+            self.assertEqual(FileCache().get_meta(model._cache_key)['etag'], '"v1"')
+            self.assertEqual(len(self.server.hits), 10)
+
+            self.assertEqual(len(model.refresh()), 95)
+            self.assertEqual(len(self.server.hits), 20)  # The first page's ETag may not cover every page
+
+            VersionedDevice._validate_collection = True
+            self.assertEqual(len(model.refresh()), 95)
+            self.assertEqual(len(self.server.hits), 21)  # 304 Not Modified for the first page
+
+    def test_delta_refresh(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            class DeltaDevice(SmartDevice):
+                _cache_key = os.path.join(cache_dir, 'devices')
+                _memo = None
+                _delta_param = 'updated_since'
+                _deleted_key = 'is_deleted'
+
+            model = DeltaDevice(url=f'{self.server.url}/delta', session=self.session)
+            self.assertEqual(len(model.refresh()), 95)
+            self.assertEqual(len(self.server.hits), 10)
+
+            content = model.refresh()
+            self.assertEqual(len(self.server.hits), 11)
+            self.assertEqual([item['id'] for item in content], [0, 1, 2, 3] + list(range(5, 96)))
+            self.assertEqual(content[3], dict(id=3, name='device_3', room='kitchen'))
+            self.assertEqual(DeltaDevice.objects_get('device_3', url=model._url, session=self.session).room,
+                             'kitchen')
+
+    def test_delta_refresh_failed_page(self):
+        def failing_delta(handler, query, body):
+            if 'updated_since' in query and query.get('page') == '2':
+                return 503, {}, b''
+            elif 'updated_since' in query:
+                return 200, {}, dict(count=2, results=[dict(id=3, name='device_3', room='kitchen')])
+            return paginated(handler, query, body)
+
+        self.server.routes['/failing_delta'] = failing_delta
+        with tempfile.TemporaryDirectory() as cache_dir:
+            class DeltaDevice(SmartDevice):
+                _cache_key = os.path.join(cache_dir, 'devices')
+                _memo = None
+                _delta_param = 'updated_since'
+
+            model = DeltaDevice(url=f'{self.server.url}/failing_delta', session=self.session)
+            model.refresh()
+            synced_at = FileCache().get_meta(model._cache_key)['synced_at']
+            self.server.hits.clear()
+
+            content = model.refresh()
+            self.assertEqual(len(content), 95)
+            self.assertNotIn('room', content[3])  # The delta was discarded
+            self.assertEqual(len(self.server.hits), 12)  # 2 delta pages then a full refresh
+            self.assertGreater(FileCache().get_meta(model._cache_key)['synced_at'], synced_at)
+
+    def test_lazy_collection(self):
+        devices = SmartDevice.objects_all(lazy=True, url=f'{self.server.url}/devices', session=self.session)
+        self.assertIsInstance(devices, ModelCollection)
+        self.assertEqual(len(devices), 95)
+        self.assertEqual(devices[-1].name, 'device_94')
+        self.assertIs(devices[3]._session, self.session)
+
+        page = devices[10:20]
+        self.assertEqual([device.id for device in page], list(range(10, 20)))
+        self.assertEqual(page.identifiers()[0], 'device_10')
+        self.assertEqual(page.get_record('device_12'), dict(id=12, name='device_12'))
+        self.assertIsNone(page.get_record('device_42'))
+
+    def test_collection_records(self):
+        records = [dict(id=1, name='tv'), dict(id=2, name='lamp', room='kitchen'), dict(id=3, name='tv')]
+        devices = ModelCollection(SmartDevice, records)
+        self.assertEqual(list(devices.records()), records)
+        self.assertEqual(devices.values('room'), [None, 'kitchen', None])
+        self.assertEqual(devices.identifiers(), ['tv', 'lamp'])
+        self.assertEqual(devices.by_identifier(), dict(tv=records[2], lamp=records[1]))
+        self.assertFalse(hasattr(devices[0], 'room'))
+        self.assertIs(devices[0]._session, devices[1]._session)
+
+    def test_objects_filter(self):
+        devices = SmartDevice.objects_filter(id__gte=90, url=f'{self.server.url}/devices', session=self.session)
+        self.assertEqual(devices.values_list('id', flat=True), [90, 91, 92, 93, 94])
+        self.assertIs(devices[0]._session, self.session)
+
+    def test_collection_query(self):
+        records = [dict(id=1, name='tv', room='den', brightness=0.5),
+                   dict(id=2, name='lamp', room='kitchen', brightness=1.0),
+                   dict(id=3, name='fan', room='den'),
+                   dict(id=4, name='light', room='Kitchen', brightness=0.2)]
+        for numpy in (models.load_numpy(), False):
+            with self.subTest(numpy=bool(numpy)), mock.patch.object(models, 'numpy', numpy):
+                devices = ModelCollection(SmartDevice, records)
+                self.assertEqual(devices.filter(id__gt=1, room='den').values_list('name', flat=True), ['fan'])
+                self.assertEqual(devices.filter(id__in=(x for x in [1, 4])).values_list('id', flat=True), [1, 4])
+                self.assertEqual(devices.filter(id__ne=2, id__lte=3).values_list('id', flat=True), [1, 3])
+                self.assertEqual(devices.filter(room__icontains='KITCHEN').values_list('id', flat=True), [2, 4])
+                self.assertEqual(devices.filter(brightness=None).values_list('id', flat=True), [3])
+                self.assertEqual(devices.filter(brightness__gte=0.5).values_list('id', flat=True), [1, 2])
+                self.assertEqual(devices.filter(name__startswith='l', id=4)[0].name, 'light')
+                self.assertEqual(len(devices.filter(missing='value')), 0)
+
+                self.assertEqual(devices.order_by('-id').values_list('id', flat=True), [4, 3, 2, 1])
+                self.assertEqual(devices.order_by('brightness').values_list('id', flat=True), [3, 4, 1, 2])
+                self.assertEqual(devices.order_by('room', '-id').values_list('room', 'id'),
+                                 [('Kitchen', 4), ('den', 3), ('den', 1), ('kitchen', 2)])
+                self.assertEqual(devices.filter(id__lt=4).order_by('-id').filter(room='den').get_record('tv'),
+                                 records[0])
+                with self.assertRaises(ValueError):
+                    devices.values_list('id', 'name', flat=True)
+
+    def test_memo(self):
+        class MemoDevice(SmartDevice):
+            _memo = MemoryCache(maxsize=2, ttl=60)
+
+        kwargs = dict(url=f'{self.server.url}/devices', session=self.session)
+        self.assertEqual(len(MemoDevice.objects_all(**kwargs)), 95)
+        self.assertEqual(MemoDevice.objects_get('device_3', **kwargs).id, 3)
+        self.assertEqual(MemoDevice.objects_identifier(**kwargs)[:2], ['device_0', 'device_1'])
+        self.assertEqual(len(self.server.hits), 10)
+        self.assertEqual(MemoDevice._memo.stats, dict(hits=2, misses=1, evictions=0, size=1))
+
+        with GeneralSession(disable_progress_bar=True) as session:  # Memoized per session
+            MemoDevice.objects_all(url=f'{self.server.url}/devices', session=session)
+        self.assertEqual(len(self.server.hits), 20)
+
+        MemoDevice(**kwargs).refresh()
+        self.assertEqual(len(MemoDevice._memo), 0)
+        MemoDevice.objects_all(**kwargs)
+        self.assertEqual(len(self.server.hits), 40)
+
+        MemoDevice._memo.ttl = 0
+        MemoDevice._memo.clear()
+        MemoDevice.objects_all(**kwargs)
+        MemoDevice.objects_all(**kwargs)
+        self.assertEqual(len(self.server.hits), 60)
+
+
+class TestMemoryCache(unittest.TestCase):
+
+    def test_lru(self):
+        memo = MemoryCache(maxsize=2, ttl=None)
+        memo.set('a', 1)
+        memo.set('b', 2)
+        self.assertEqual(memo.get('a'), 1)
+        memo.set('c', 3)  # b is the least recently used
+        self.assertIsNone(memo.get('b'))
+        self.assertEqual(memo.get('c'), 3)
+        memo.set('d', 4, ttl=0)
+        self.assertIsNone(memo.get('d'))
+        self.assertEqual(memo.stats, dict(hits=2, misses=2, evictions=2, size=1))
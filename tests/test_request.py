@@ -1,6 +1,15 @@
+import threading
+import time
 import unittest
+from unittest import mock
+from datetime import datetime as dt, timedelta
 
-from double_click.request import is_valid_url, GeneralSession, RequestObject
+from requests.auth import HTTPBasicAuth
+
+from double_click import User, request
+from double_click.request import is_valid_url, GeneralSession, RequestObject, UserSession
+from double_click.transport import load_aiohttp
+from tests.server import StandInServer
 
 
 class TestValidateURL(unittest.TestCase):
@@ -11,6 +20,8 @@ class TestValidateURL(unittest.TestCase):
         self.assertTrue(is_valid_url('http://www.google.com', raises=False))
         self.assertTrue(is_valid_url('https://www.google.com', raises=False))
         self.assertTrue(is_valid_url('https://wikipedia.org', raises=False))
+        self.assertTrue(is_valid_url('http://localhost:8000/api', raises=False))
+        self.assertTrue(is_valid_url('http://127.0.0.1:8000/api', raises=False))
 
     def test_invalid_url(self):
         self.assertFalse(is_valid_url('google.com', raises=False))
@@ -76,3 +87,221 @@ class TestGeneralSession(unittest.TestCase):
         response = basic_session.get('https://fakeendpointadspfaisdjfpodsaijfadspoijasdf.com')
         self.assertEqual(response.status_code, 666)
         self.assertIn('Failed to establish a new connection', response.text)
+
+    def test_bulk_get(self):
+        with StandInServer() as server:
+            basic_session = GeneralSession(disable_progress_bar=True)
+            responses = basic_session.bulk_get([(f'{server.url}/item', dict(params=dict(idx=idx))) for idx in range(20)])
+            self.assertEqual(sorted(int(response.json()['query']['idx']) for response in responses), list(range(20)))
+
+    def test_bulk_iter_get(self):
+        with StandInServer() as server:
+            basic_session = GeneralSession(disable_progress_bar=True)
+            request_list = ((f'{server.url}/item', dict(params=dict(idx=idx))) for idx in range(50))
+            seen = []
+            for idx, response in basic_session.bulk_iter_get(request_list, with_index=True, window=5):
+                self.assertEqual(int(response.json()['query']['idx']), idx)
+                seen.append(idx)
+            self.assertEqual(sorted(seen), list(range(50)))
+
+            # Stopping early only sends the requests within the window
+            responses = basic_session.bulk_iter_get([f'{server.url}/early'] * 50, window=5)
+            next(responses)
+            responses.close()
+            self.assertLessEqual(len([hit for hit in server.hits if hit[1] == '/early']), 10)
+
+    def test_connection_pool(self):
+        with StandInServer() as server:
+            basic_session = GeneralSession(disable_progress_bar=True, max_concurrency=10)
+            basic_session.bulk_get([f'{server.url}/item'] * 100)
+            stats = basic_session.connection_stats.as_dict()
+            self.assertLessEqual(stats['created'], 10)
+            self.assertEqual(stats['created'] + stats['reused'], 100)
+            self.assertEqual(stats['discarded'], 0)
+
+            basic_session = GeneralSession(disable_progress_bar=True, max_concurrency=10, max_connections_per_host=2)
+            basic_session.bulk_get([f'{server.url}/item'] * 100)
+            self.assertLessEqual(basic_session.connection_stats.created, 2)
+
+    def test_runtime(self):
+        with StandInServer() as server:
+            with GeneralSession(disable_progress_bar=True, max_concurrency=5) as basic_session:
+                basic_session.bulk_get([f'{server.url}/item'] * 10)
+                runtime = basic_session.runtime
+                loop, executor = runtime.loop, runtime.executor
+                basic_session.bulk_get([f'{server.url}/item'] * 10)
+                self.assertIs(basic_session.runtime.loop, loop)
+                self.assertIs(basic_session.runtime.executor, executor)
+
+                # A bulk call while iterating another uses a temporary loop
+                for response in basic_session.bulk_iter_get([f'{server.url}/item'] * 2):
+                    self.assertEqual(len(basic_session.bulk_get([f'{server.url}/nested'] * 2)), 2)
+
+            self.assertTrue(loop.is_closed())
+            self.assertIsNone(basic_session._runtime)
+
+    @unittest.skipIf(load_aiohttp() is None, 'aiohttp is not installed')
+    def test_bulk_async_transport(self):
+        with StandInServer() as server:
+            basic_session = GeneralSession(disable_progress_bar=True, async_transport=True)
+            basic_session.headers.update({'X-Test': 'double_click'})
+            responses = basic_session.bulk_post(
+                [dict(url=f'{server.url}/item', json=dict(idx=idx)) for idx in range(20)] + ['http://127.0.0.1:1/down']
+            )
+            succeeded = [response for response in responses if response.status_code == 200]
+            self.assertEqual(len(succeeded), 20)
+            self.assertEqual([response.status_code for response in responses if response.status_code != 200], [666])
+            self.assertTrue(all(response.json()['method'] == 'POST' for response in succeeded))
+
+    @unittest.skipIf(load_aiohttp() is None, 'aiohttp is not installed')
+    def test_async_transport_settings(self):
+        def echo_request(handler, query, body):
+            content_type = handler.headers.get('Content-Type', '').split(';')[0] if body else None
+            return 200, {}, dict(query=query, authorization=handler.headers.get('Authorization'),
+                                 content_type=content_type, path=handler.path, cookie=handler.headers.get('Cookie'),
+                                 headers=sorted(key for key in handler.headers.keys() if key.startswith('X-')))
+
+        def redirect(handler, query, body):
+            return 302, {'Location': '/echo?redirected=1', 'Set-Cookie': 'visited=1; Path=/'}, b''
+
+        with StandInServer(routes={'/echo': echo_request, '/redirect': redirect}) as server:
+            request_list = [f'{server.url}/echo', dict(url=f'{server.url}/echo', params=dict(page=2, flag=True)),
+                            dict(url=f'{server.url}/echo', files=dict(upload=b'content')),
+                            dict(url='http://proxied.test/echo', proxies=dict(http=server.url)),
+                            dict(url=f'{server.url}/echo', headers={'X-None': None, 'X-Set': 'set'}),
+                            dict(url=f'{server.url}/redirect')]
+            results = []
+            for async_transport in (False, True):
+                basic_session = GeneralSession(disable_progress_bar=True, async_transport=async_transport)
+                basic_session.params = dict(api_version='2')
+                basic_session.auth = HTTPBasicAuth('u', 'p')
+                basic_session.cookies.set('session_id', 'SECRET', domain='auth.example.com')
+                basic_session.cookies.set('local', 'yes', domain='127.0.0.1')
+                responses = basic_session.bulk_post([dict(request) if isinstance(request, dict) else request
+                                                     for request in request_list], with_index=True)
+                results.append([response.json() for _, response in sorted(responses, key=lambda item: item[0])])
+
+            self.assertEqual(results[0], results[1])
+            self.assertEqual(results[1][0]['authorization'], 'Basic dTpw')
+            self.assertEqual(results[1][0]['cookie'], 'local=yes')  # session_id is only sent to auth.example.com
+            self.assertEqual(results[1][1]['query'], dict(api_version='2', page='2', flag='True'))
+            self.assertEqual(results[1][2]['content_type'], 'multipart/form-data')
+            self.assertEqual(results[1][3]['path'], 'http://proxied.test/echo?api_version=2')
+            self.assertIsNone(results[1][3]['cookie'])
+            self.assertEqual(results[1][4]['headers'], ['X-Set'])
+            self.assertEqual(results[1][5]['query'], dict(redirected='1'))  # 302 after a POST is followed with a GET
+            self.assertEqual(results[1][5]['cookie'], 'local=yes; visited=1')
+
+    @unittest.skipIf(load_aiohttp() is None, 'aiohttp is not installed')
+    def test_async_transport_response(self):
+        cookie = lambda handler, query, body: (200, {'Set-Cookie': 'token=abc', 'Content-Type': 'text/plain'},
+                                               b'line 1\nline 2')
+        with StandInServer(routes={'/cookie': cookie}) as server:
+            basic_session = GeneralSession(disable_progress_bar=True, async_transport=True)
+            response, = basic_session.bulk_get([f'{server.url}/cookie'])
+            self.assertEqual(list(response.iter_lines(decode_unicode=True)), ['line 1', 'line 2'])
+            self.assertEqual(b''.join(response.iter_content(4)), b'line 1\nline 2')
+            self.assertEqual(response.cookies.get('token'), 'abc')
+            self.assertEqual(basic_session.cookies.get('token'), 'abc')
+            self.assertEqual(response.request.method, 'GET')
+            self.assertEqual(response.request.url, f'{server.url}/cookie')
+
+
+class TokenUser(User):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def authenticate(self, **kwargs):
+        time.sleep(0.1)  # Give every in-flight request a chance to get a 401 while auth is refreshing
+        with self._lock:
+            self.tokens += 1
+            self.auth_expires_at = dt.now() + timedelta(hours=1)
+            return {'Authorization': f'Bearer {self.tokens}'}
+
+
+def token_server(user: TokenUser) -> StandInServer:
+    """Responds with a 401 unless the request has the user's latest token"""
+
+    def secure(handler, query, body):
+        authorized = handler.headers.get('Authorization') == f'Bearer {user.tokens}'
+        return (200 if authorized else 401), {}, dict(authorized=authorized)
+
+    return StandInServer(routes={'/secure': secure})
+
+
+class TokenSession(GeneralSession):
+    """Gets a token from its own token endpoint with the session, expiring after 90 seconds"""
+    token_url = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.expires_at = dt.now() + timedelta(seconds=10)
+        self.refreshes = 0
+
+    def refresh_auth(self):
+        response = self.post(self.token_url)
+        self.refreshes += 1
+        self.headers.update({'Authorization': f'Bearer {response.json()["method"]}'})
+        self.expires_at = dt.now() + timedelta(seconds=90)
+
+    def auth_expires_at(self) -> dt:
+        return self.expires_at
+
+
+class TestGeneralSessionAuth(unittest.TestCase):
+
+    def test_refresh_auth_with_session(self):
+        with StandInServer() as server:
+            session = TokenSession()
+            session.token_url = f'{server.url}/token'
+            thread = threading.Thread(target=session.get, args=(f'{server.url}/item', ), daemon=True)
+            thread.start()
+            thread.join(timeout=10)
+            self.assertFalse(thread.is_alive())  # refresh_auth requesting with the session doesn't deadlock
+            self.assertEqual(session.refreshes, 1)
+            self.assertEqual(server.hits, [('POST', '/token'), ('GET', '/item')])
+
+    def test_repeated_proactive_refresh(self):
+        class Later(dt):
+            offset = timedelta()
+
+            @classmethod
+            def now(cls, tz=None):
+                return dt.now(tz) + cls.offset
+
+        with StandInServer() as server, mock.patch.object(request, 'dt', Later):
+            session = TokenSession()
+            session.token_url = f'{server.url}/token'
+            session.get(f'{server.url}/item')
+            session.get(f'{server.url}/item')
+            self.assertEqual(session.refreshes, 1)
+
+            Later.offset = timedelta(seconds=60)  # The new token expires within auth_refresh_margin
+            session.get(f'{server.url}/item')
+            self.assertEqual(session.refreshes, 2)
+
+
+class TestUserSession(unittest.TestCase):
+
+    def test_single_flight_refresh(self):
+        user = TokenUser(username='TestUser')
+        with token_server(user) as server:
+            user_session = UserSession(user=user, disable_progress_bar=True)
+            user_session.headers.update({'Authorization': 'Bearer expired'})
+            responses = user_session.bulk_get([f'{server.url}/secure'] * 50)
+            self.assertEqual([response.status_code for response in responses], [200] * 50)
+            self.assertEqual(user.tokens, 1)
+
+    def test_proactive_refresh(self):
+        user = TokenUser(username='TestUser')
+        with token_server(user) as server:
+            user_session = UserSession(user=user, disable_progress_bar=True)
+            user_session.headers.update(user.authenticate())
+            user.auth_expires_at = dt.now() + timedelta(seconds=30)  # Within auth_refresh_margin
+            responses = user_session.bulk_get([f'{server.url}/secure'] * 20)
+            self.assertEqual([response.status_code for response in responses], [200] * 20)
+            self.assertEqual(user.tokens, 2)
+            self.assertEqual(len(server.hits), 20)  # No request got a 401
@@ -0,0 +1,70 @@
+import unittest
+from collections import Counter
+
+import requests
+
+from double_click.request import GeneralSession
+from double_click.retry import RetryBudget, RetryPolicy
+from double_click.transport import load_aiohttp
+from tests.server import StandInServer
+
+
+def make_response(status_code: int) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    return response
+
+
+def flaky_server() -> StandInServer:
+    """Responds with a 503 the first time each idx is requested"""
+    attempts = Counter()
+
+    def flaky(handler, query, body):
+        attempts[query['idx']] += 1
+        status = 503 if attempts[query['idx']] == 1 else 200
+        return status, {'Content-Type': 'application/json'}, dict(idx=query['idx'])
+
+    return StandInServer(routes={'/flaky': flaky})
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_get_delay(self):
+        policy = RetryPolicy(max_retries=2, backoff_factor=1, jitter=False)
+        self.assertEqual(policy.get_delay('GET', 0, make_response(503)), 1)
+        self.assertEqual(policy.get_delay('GET', 1, make_response(503)), 2)
+        self.assertIsNone(policy.get_delay('GET', 2, make_response(503)))  # Out of retries
+        self.assertIsNone(policy.get_delay('GET', 0, make_response(404)))
+        self.assertIsNone(policy.get_delay('POST', 0, make_response(503)))  # Not idempotent
+        self.assertEqual(policy.get_delay('GET', 0, make_response(666), requests.ConnectionError()), 1)
+        self.assertIsNone(policy.get_delay('GET', 0, make_response(666), ValueError()))
+
+        response = make_response(429)
+        response.headers['Retry-After'] = '5'
+        self.assertEqual(policy.get_delay('GET', 0, response), 5)
+
+    def test_budget(self):
+        policy = RetryPolicy(backoff_factor=0, budget=RetryBudget(ratio=0.5, min_retries=1))
+        delays = [policy.get_delay('GET', 0, make_response(503)) for _ in range(4)]
+        self.assertEqual(len([delay for delay in delays if delay is not None]), 3)
+
+    def test_retry(self):
+        with flaky_server() as server:
+            basic_session = GeneralSession(retry_policy=RetryPolicy(backoff_factor=0.01))
+            self.assertEqual(basic_session.get(f'{server.url}/flaky', params=dict(idx=1)).status_code, 200)
+            self.assertEqual(basic_session.post(f'{server.url}/flaky?idx=2').status_code, 503)
+
+    def test_bulk_retry(self):
+        with flaky_server() as server:
+            basic_session = GeneralSession(disable_progress_bar=True, retry_policy=RetryPolicy(backoff_factor=0.01))
+            responses = basic_session.bulk_get([(f'{server.url}/flaky', dict(params=dict(idx=idx))) for idx in range(20)])
+            self.assertEqual([response.status_code for response in responses], [200] * 20)
+            self.assertEqual(len(server.hits), 40)
+
+    @unittest.skipIf(load_aiohttp() is None, 'aiohttp is not installed')
+    def test_async_transport_retry(self):
+        with flaky_server() as server:
+            basic_session = GeneralSession(disable_progress_bar=True, async_transport=True,
+                                           retry_policy=RetryPolicy(backoff_factor=0.01))
+            responses = basic_session.bulk_get([(f'{server.url}/flaky', dict(params=dict(idx=idx))) for idx in range(20)])
+            self.assertEqual([response.status_code for response in responses], [200] * 20)
@@ -41,6 +41,44 @@ class TestUser(unittest.TestCase):
         self.assertFalse(google_user.has_access(requires=['Manager']))
         self.assertFalse(google_user.has_access(requires=['View'], service='Home'))
 
+    def test_has_access_cache(self):
+        access = dict(service=dict(Photos=dict(permissions=['Create', 'View', 'List'], roles=['Manager'])))
+        google_user = GoogleUser(username='TestUser', access=access)
+        kwargs = dict(service='Photos')
+
+        self.assertTrue(google_user.has_access(requires=['View'], **kwargs))
+        self.assertTrue(google_user.has_access(requires=['View'], **kwargs))
+        self.assertEqual(kwargs, dict(service='Photos'))
+        self.assertEqual(len(google_user._access_results), 1)
+        self.assertTrue(google_user.has_access(requires=(role for role in ['Manager']), **kwargs))
+
+        google_user.access = dict(service=dict(Photos=dict(permissions=['List'])))
+        self.assertFalse(google_user.has_access(requires=['View'], **kwargs))
+        self.assertTrue(google_user.has_access(requires=[['unhashable'], 'List'], **kwargs))
+
+        google_user.access = dict(service=dict(Photos=dict()), team=dict(Photos=dict()))
+        with pytest.raises(ValueError):
+            google_user.has_access(service='Photos', team='Photos')
+
+    def test_evaluate_many(self):
+        access = dict(service=dict(Photos=dict(permissions=['Create', 'View', 'List'], roles=['Manager'])))
+        google_user = GoogleUser(username='TestUser', access=access)
+        checks = [
+            (['View'], False, dict(service='Photos')),
+            (['View', 'Update'], True, dict(service='Photos')),
+            (None, False, dict(service='Home')),
+            dict(requires=['Manager'], service='Photos'),
+            dict(),
+        ]
+        self.assertEqual(google_user.evaluate_many(checks), [True, False, False, True, True])
+        self.assertEqual(google_user.hide_many(checks), [False, True, True, False, False])
+
+        class CustomUser(GoogleUser):
+            def has_access(self, requires: list = None, match_all: bool = False, **kwargs) -> bool:
+                return kwargs.get('service') == 'Home'
+
+        self.assertEqual(CustomUser(access=access).evaluate_many(checks), [False, False, True, False, False])
+
     def test_hide(self):
         access = dict(service=dict(Photos=dict(permissions=['Create', 'View', 'List'], roles=['Manager'])))
         google_user = GoogleUser(username='TestUser', access=access)
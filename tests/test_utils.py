@@ -0,0 +1,127 @@
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+import requests
+
+from double_click import utils
+from double_click.utils import echo
+from tests.server import StandInServer
+
+CONTENT = [dict(id=idx, name=f'device_{idx}', commands=['on', 'off'], score=idx / 2, parent=None) for idx in range(50)]
+TEXT = ''.join(f'line {idx}\n' for idx in range(10000))
+NDJSON = ''.join(json.dumps(dict(id=idx, name=f'dévice_{idx}'), ensure_ascii=False) + '\n' for idx in range(20000))
+
+
+def capture(*args, **kwargs) -> str:
+    with redirect_stdout(io.StringIO()) as stdout:
+        echo(*args, **kwargs)
+    return stdout.getvalue()
+
+
+class TestEcho(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer({
+            '/devices': lambda handler, query, body: (200, {'Content-Type': 'application/json'}, CONTENT),
+            '/log': lambda handler, query, body: (200, {'Content-Type': 'text/plain'}, TEXT.encode('utf-8')),
+            '/events': lambda handler, query, body: (200, {'Content-Type': 'application/x-ndjson'},
+                                                     NDJSON.encode('utf-8')),
+        }).__enter__()
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+
+    def test_stream(self):
+        self.assertEqual(capture(CONTENT, stream=True), capture(CONTENT))
+        self.assertEqual(capture(dict(devices=CONTENT), stream=True), capture(dict(devices=CONTENT)))
+        self.assertEqual(capture('plain', stream=True), 'plain\n')
+
+        with mock.patch.object(utils, 'STREAM_BUFFER_SIZE', 16):  # Flushed in many writes
+            self.assertEqual(json.loads(capture(CONTENT, stream=True)), CONTENT)
+
+    def test_ndjson(self):
+        output = capture((item for item in CONTENT), ndjson=True)
+        self.assertEqual([json.loads(line) for line in output.splitlines()], CONTENT)
+        self.assertEqual(capture([], ndjson=True), '')
+
+    def test_stream_response(self):
+        response = requests.get(f'{self.server.url}/devices')
+        self.assertEqual(capture(response, stream=True), capture(response))
+        response = requests.get(f'{self.server.url}/devices', stream=True)
+        output = capture(response, ndjson=True)
+        self.assertEqual([json.loads(line) for line in output.splitlines()], CONTENT)
+
+        response = requests.get(f'{self.server.url}/log', stream=True)
+        self.assertEqual(capture(response, stream=True), f'{TEXT}\n')
+
+    def test_stream_response_without_charset(self):
+        response = requests.get(f'{self.server.url}/events', stream=True)
+        self.assertGreater(len(NDJSON.encode('utf-8')), utils.STREAM_BUFFER_SIZE)
+        self.assertEqual(capture(response, stream=True), f'{NDJSON}\n')
+
+
+class TestRenderMd(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.patches = [mock.patch.object(utils, '_md_memo', None),
+                        mock.patch.object(utils, 'MD_CACHE_DIR', self.cache_dir.name),
+                        mock.patch.dict(os.environ, dict(width='80', LINES='24'))]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.cache_dir.cleanup()
+
+    def test_memoized(self):
+        with mock.patch.object(utils, 'mdv', wraps=utils.mdv) as mdv:
+            rendered = utils.render_md('#Unable to find the requested resource')
+            self.assertIn('Unable to find the requested resource', rendered)
+            self.assertEqual(utils.render_md('#Unable to find the requested resource'), rendered)
+            self.assertEqual(mdv.call_count, 1)
+
+            utils.render_md('#Unable to find the requested resource', theme=None)
+            with mock.patch.dict(os.environ, dict(width='120')):
+                utils.render_md('#Unable to find the requested resource')
+            self.assertEqual(mdv.call_count, 3)
+        self.assertEqual(os.listdir(self.cache_dir.name), [])
+
+    def test_disk_cache(self):
+        with mock.patch.object(utils, 'mdv', wraps=utils.mdv) as mdv:
+            rendered = utils.render_md('#Static', disk_cache=True)
+            utils._md_memo.clear()  # As if in a new process
+            self.assertEqual(utils.render_md('#Static', disk_cache=True), rendered)
+            self.assertEqual(mdv.call_count, 1)
+        self.assertEqual(len(os.listdir(self.cache_dir.name)), 1)
+
+    def test_disk_cache_size(self):
+        with mock.patch.object(utils, 'MD_DISK_CACHE_SIZE', 3), mock.patch.object(utils, 'mdv', return_value='md'):
+            for idx in range(5):
+                utils.render_md(f'#Message {idx}', disk_cache=True)
+                time.sleep(0.01)
+            self.assertEqual(len(os.listdir(self.cache_dir.name)), 3)
+
+            utils._md_memo.clear()
+            utils.render_md('#Message 2', disk_cache=True)  # Most recently used, kept
+            utils.render_md('#Message 5', disk_cache=True)
+            utils._md_memo.clear()
+            with mock.patch.object(utils, 'mdv', return_value='md') as mdv:
+                for idx in (2, 4, 5):
+                    utils.render_md(f'#Message {idx}', disk_cache=True)
+                self.assertEqual(mdv.call_count, 0)
+
+    def test_dynamic_messages_not_on_disk(self):
+        response = requests.Response()
+        response.status_code, response.url, response._content = 503, 'https://api.test/items', b'Unavailable'
+        with mock.patch.object(utils, 'mdv', return_value='md'), mock.patch.object(utils, 'MD_DISK_CACHE', True):
+            capture(response)
+            utils.render_md('#Static', disk_cache=True)
+        self.assertEqual(len(os.listdir(self.cache_dir.name)), 1)
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime as dt, timedelta
+from unittest import mock
+
+from double_click import utils, versions
+from double_click.utils import Config
+from tests.server import StandInServer
+
+FILES = ['my_cli-0.9.0-py3-none-any.whl', 'my-cli-0.10.0.tar.gz', 'my_cli-0.11.0rc1-py3-none-any.whl',
+         'my-cli-tools-9.0.0.tar.gz']
+
+
+def json_index(handler, query, body):
+    files = [dict(filename=filename, url=f'/files/{filename}') for filename in FILES]
+    files.append(dict(filename='my_cli-1.0.0-py3-none-any.whl', url='/files/', yanked='Broken'))
+    return 200, {'Content-Type': versions.SIMPLE_JSON}, dict(name='my-cli', files=files)
+
+
+def html_index(handler, query, body):
+    links = ''.join(f'<a href="/files/{filename}#sha256=abc">{filename}</a><br/>' for filename in FILES)
+    links += '<a href="/files/my-cli-0.12.0.tar.gz" data-yanked="">my-cli-0.12.0.tar.gz</a>'
+    return 200, {'Content-Type': 'text/html'}, f'<html><body>{links}</body></html>'.encode('utf-8')
+
+
+class TestVersions(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer({'/json/my-cli/': json_index, '/html/my-cli/': html_index}).__enter__()
+        self.config_dir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.config_dir.name, 'package_versions.ini')
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        self.config_dir.cleanup()
+
+    def test_latest_version(self):
+        self.assertEqual(versions.latest_version('My_CLI', [f'{self.server.url}/json']), '0.10.0')
+        self.assertEqual(versions.latest_version('my-cli', [f'{self.server.url}/html/']), '0.10.0')
+        self.assertIsNone(versions.latest_version('my-cli', [f'{self.server.url}/missing']))
+        self.assertIn(('GET', '/json/my-cli/'), self.server.hits)
+
+    def test_index_urls_from_pip_args(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(versions.index_urls_from_pip_args([]), [versions.DEFAULT_INDEX_URL])
+            pip_args = ['--trusted-host', 'a.com', '-i', 'https://a.com/simple', '--extra-index-url=https://b.com']
+            self.assertEqual(versions.index_urls_from_pip_args(pip_args), ['https://a.com/simple', 'https://b.com'])
+
+    def test_is_newer(self):
+        self.assertTrue(versions.is_newer('0.10.0', '0.9.1'))
+        self.assertFalse(versions.is_newer('0.9.1', '0.10.0'))
+        self.assertFalse(versions.is_newer('1.0', '1.0'))
+        self.assertTrue(versions.is_newer('1.0', '1.0.dev1'))
+
+    def test_save_latest_version_in_background(self):
+        process = versions.save_latest_version_in_background('my-cli', self.config_path, [f'{self.server.url}/json'])
+        self.assertEqual(process.wait(timeout=30), 0)
+        self.assertEqual(Config(self.config_path).get('my-cli', 'latest_version'), '0.10.0')
+
+    @mock.patch.object(versions, 'installed_version', return_value='0.9.0')
+    @mock.patch.object(utils, 'update_package')
+    def test_ensure_latest_package(self, update_package, installed_version):
+        pip_args = ['--index-url', f'{self.server.url}/json']
+        with mock.patch.object(versions, 'save_latest_version_in_background') as save_in_background:
+            utils.ensure_latest_package('my-cli', pip_args, md_file=None, config_path=self.config_path)
+            save_in_background.assert_called_once()
+            # Already checked in the last hour
+            utils.ensure_latest_package('my-cli', pip_args, md_file=None, config_path=self.config_path)
+            save_in_background.assert_called_once()
+        update_package.assert_not_called()
+
+        config = Config(self.config_path)
+        config.set('my-cli', 'last_checked', str(dt.utcnow() - timedelta(hours=2)))
+        config.save()
+        with self.assertRaises(SystemExit):
+            utils.ensure_latest_package('my-cli', pip_args, md_file=None, background=False,
+                                        config_path=self.config_path)
+        update_package.assert_called_once_with('my-cli', pip_args=pip_args)
+        self.assertFalse(Config(self.config_path).has_option('my-cli', 'latest_version'))
+
+        installed_version.return_value = '0.10.0'
+        config = Config(self.config_path)
+        config.set('my-cli', 'last_checked', str(dt.utcnow() - timedelta(hours=2)))
+        config.save()
+        utils.ensure_latest_package('my-cli', pip_args, md_file=None, background=False, config_path=self.config_path)
+        update_package.assert_called_once()